@@ -62,13 +62,27 @@ added to JSON.
 
 from jsonstruct.pickler import Pickler
 from jsonstruct.unpickler import Unpickler
-from jsonstruct.backend import JSONBackend
+import jsonstruct.unpickler as unpickler
+from jsonstruct.backend import EncoderProfile, JSONBackend
+from jsonstruct.fragments import FragmentCache, immutable
+from jsonstruct.rawjson import RawJSON
+from jsonstruct.patch import diff, apply_patch
+from jsonstruct.columns import decode_columns, encode_columns
+from jsonstruct.schemacache import freeze, warmup
+from jsonstruct.instrument import stats
+import jsonstruct.instrument as instrument
+from jsonstruct.tracing import set_tracer
+import jsonstruct.tracing as tracing
 from jsonstruct.version import VERSION
+import jsonstruct.fragments as fragments
 
 # ensure built-in handlers are loaded
 __import__('jsonstruct._handlers')
 
-__all__ = ('encode', 'decode')
+__all__ = ('encode', 'decode', 'decode_into',
+           'EncoderProfile', 'FragmentCache', 'immutable', 'RawJSON',
+           'diff', 'apply_patch', 'decode_columns', 'encode_columns',
+           'warmup', 'freeze', 'stats', 'set_tracer')
 __version__ = VERSION
 
 json = JSONBackend()
@@ -79,8 +93,29 @@ set_encoder_options = json.set_encoder_options
 load_backend = json.load_backend
 remove_backend = json.remove_backend
 
+# The fragment cache used by encode() for classes marked @immutable
+fragment_cache = fragments.default_cache
 
-def encode(value, max_depth=None, is_filter_none_attr=True):
+# Picklers and unpicklers shared by the calls to encode() and decode(),
+# by their options.  Each call runs on its own context, see Pickler.
+_picklers = {}
+_unpicklers = {}
+
+# The classes of the shared instances, swapped by jsonstruct.instrument
+_pickler_class = Pickler
+_unpickler_class = Unpickler
+
+
+def _unpickler(codegen):
+    j = _unpicklers.get(codegen)
+    if j is None:
+        j = _unpicklers.setdefault(
+            codegen, _unpickler_class(reuse_containers=True, codegen=codegen))
+    return j
+
+
+def encode(value, max_depth=None, is_filter_none_attr=True,
+        fragment_cache=None, iso8601=False, codegen=False, profile=None):
     """
     Return a JSON formatted representation of value, a Python object.
 
@@ -93,6 +128,26 @@ def encode(value, max_depth=None, is_filter_none_attr=True):
     deeper than 'max_depth' steps into the object.  Anything deeper
     than 'max_depth' is represented using a Python repr() of the object.
 
+    The keyword argument 'fragment_cache' selects the FragmentCache used
+    for objects marked immutable; it defaults to jsonstruct.fragment_cache.
+
+    The keyword argument 'iso8601' defaults to False.  If set to True,
+    dates, times and timedeltas are encoded in their ISO 8601 form.
+
+    The keyword argument 'codegen' defaults to False.  If set to True,
+    instances are flattened by encoders generated for their class, see
+    jsonstruct.codegen.
+
+    The keyword argument 'profile' takes a jsonstruct.EncoderProfile.
+    If given, its max_depth, is_filter_none_attr and backend options are
+    used instead of the 'max_depth' and 'is_filter_none_attr' arguments
+    and of the options set with set_encoder_options().
+
+    >>> from jsonstruct._samples import Thing
+    >>> debug = EncoderProfile(sort_keys=True, is_filter_none_attr=False)
+    >>> encode(Thing('A String'), profile=debug)
+    '{"child": null, "name": "A String"}'
+
     >>> encode('my string')
     '"my string"'
     >>> encode(36)
@@ -109,12 +164,32 @@ def encode(value, max_depth=None, is_filter_none_attr=True):
 
 
     """
-    j = Pickler(unpicklable=False,
-                max_depth=max_depth,
-                is_filter_none_attr=is_filter_none_attr)
-    return json.encode(j.flatten(value))
-
-def decode(string, cls=None):
+    if fragment_cache is None:
+        fragment_cache = fragments.default_cache
+    if profile is not None:
+        max_depth = profile.max_depth
+        is_filter_none_attr = profile.is_filter_none_attr
+    options = (max_depth, is_filter_none_attr, fragment_cache, iso8601,
+               codegen)
+    j = _picklers.get(options)
+    if j is None:
+        j = _pickler_class(unpicklable=False,
+                           max_depth=max_depth,
+                           is_filter_none_attr=is_filter_none_attr,
+                           fragment_cache=fragment_cache,
+                           iso8601=iso8601,
+                           reuse_containers=True,
+                           plain_dicts=True,
+                           codegen=codegen)
+        if fragment_cache is fragments.default_cache:
+            # other caches may be created per call
+            j = _picklers.setdefault(options, j)
+    encode_flat = json.encode if profile is None else profile.encode
+    if instrument.recorder is not None or tracing.active is not None:
+        return instrument.encode(j, encode_flat, value)
+    return j.splice_raw_json(encode_flat(j.flatten(value)))
+
+def decode(string, cls=None, codegen=False):
     """
     Convert a JSON string into a Python object.
 
@@ -122,6 +197,37 @@ def decode(string, cls=None):
     'my string'
     >>> decode('36')
     36
+
+    Attributes of cls declared with a RawJSON prototype are kept as
+    unparsed slices of string, see jsonstruct.rawjson.
+
+    The keyword argument 'codegen' defaults to False.  If set to True,
+    instances are restored by decoders generated for their class, see
+    jsonstruct.codegen.
     """
-    j = Unpickler()
+    j = _unpickler(bool(codegen))
+    raw = cls is not None and unpickler.has_raw_attrs(cls)
+    if instrument.recorder is not None or tracing.active is not None:
+        return instrument.decode(j, json.decode, string, cls, raw)
+    if raw:
+        return j.restore_raw(string, cls, json.decode)
     return j.restore(json.decode(string), cls)
+
+
+def decode_into(obj, string, cls=None):
+    """
+    Update the existing object obj in place from a JSON string and return it.
+
+    Only attributes present in the JSON are assigned, and nested objects,
+    lists and dicts are updated in place rather than reallocated, so
+    references to them stay valid.  See Unpickler.restore_into().
+
+    >>> from jsonstruct._samples import Thing
+    >>> thing = Thing('old')
+    >>> decode_into(thing, '{"name": "new"}') is thing
+    True
+    >>> str(thing.name)
+    'new'
+    """
+    j = _unpickler(False)
+    return j.restore_into(obj, json.decode(string), cls)
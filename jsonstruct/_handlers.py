@@ -1,27 +1,96 @@
 import sys
+import array
+import base64
+import binascii
 import datetime
 import collections
 
 import jsonstruct
+import jsonstruct.isodate as isodate
+import jsonstruct.tags as tags
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+try:
+    binascii.b2a_base64(b'', newline=False)
+except TypeError:
+    def b64encode(buf):
+        """base64-encode an object supporting the buffer protocol without
+        copying its contents first."""
+        return binascii.b2a_base64(buf)[:-1]
+else:
+    def b64encode(buf):
+        """base64-encode an object supporting the buffer protocol without
+        copying its contents first."""
+        return binascii.b2a_base64(buf, newline=False).decode('ascii')
+
+b64decode = base64.b64decode
+
+def _restore_iso8601(obj, default):
+    """Restores a dict flattened with the iso8601 option."""
+    cls = jsonstruct.unpickler.loadclass(obj.get(tags.OBJECT, '')) or default
+    return isodate.parse(obj['iso8601'], cls)
+
+
+def _flatten_many_iso8601(handler, objs):
+    """Batch flatten for handlers writing ISO 8601 strings."""
+    if handler._base.iso8601:
+        isoformat = isodate.isoformat
+        return [isoformat(obj) for obj in objs]
+    return [unicode(obj) for obj in objs]
+
+
+def _restore_typed_iso8601(handler, obj, cls_def):
+    """Typed decode for handlers reading ISO 8601 strings, which also
+    accepts the str() of the value.  Unparsable strings are a type mismatch.
+    """
+    if type(obj) is dict:
+        if not handler.is_payload(obj):
+            return None
+        if 'iso8601' not in obj:
+            return handler.restore(obj)
+        obj = obj['iso8601']
+    if not isinstance(cls_def, type):
+        cls_def = type(cls_def)
+    try:
+        return isodate.parse(obj, cls_def)
+    except ValueError:
+        return None
+
 
 class DatetimeHandler(jsonstruct.handlers.BaseHandler):
     """
     Datetime objects use __reduce__, and they generate binary strings encoding
     the payload. This handler encodes that payload to reconstruct the
     object.
+
+    When the pickler's iso8601 option is set, the payload is the ISO 8601
+    form instead, and typed decode parses either form of the string.
     """
     _handles = datetime.datetime, datetime.date, datetime.time
+    _payload_keys = '__reduce__', 'iso8601'
 
     def flatten(self, obj, data):
         pickler = self._base
         if not pickler.unpicklable:
+            if pickler.iso8601:
+                return isodate.isoformat(obj)
             return unicode(obj)
+        if pickler.iso8601:
+            data['iso8601'] = isodate.isoformat(obj)
+            return data
         cls, args = obj.__reduce__()
         args = [args[0].encode('base64')] + map(pickler.flatten, args[1:])
         data['__reduce__'] = (pickler.flatten(cls), args)
         return data
 
     def restore(self, obj):
+        if 'iso8601' in obj:
+            return _restore_iso8601(obj, datetime.datetime)
         cls, args = obj['__reduce__']
         value = args[0].decode('base64')
         unpickler = self._base
@@ -30,15 +99,27 @@ class DatetimeHandler(jsonstruct.handlers.BaseHandler):
         params = (value,) + tuple(params)
         return cls.__new__(cls, *params)
 
+    def restore_typed(self, obj, cls_def):
+        return _restore_typed_iso8601(self, obj, cls_def)
+
+    def flatten_many(self, objs):
+        return _flatten_many_iso8601(self, objs)
+
+    def restore_many(self, objs, cls_def):
+        if not isinstance(cls_def, type):
+            cls_def = type(cls_def)
+        return isodate.parse_many(objs, cls_def)
+
 class SimpleReduceHandler(jsonstruct.handlers.BaseHandler):
     """
     Follow the __reduce__ protocol to pickle an object. As long as the factory
     and its arguments are pickleable, this should pickle any object that
     implements the reduce protocol.
     """
-    _handles = [datetime.timedelta]
+    _handles = []
     if sys.version_info >= (2, 7):
         _handles.append(collections.OrderedDict)
+    _payload_keys = '__reduce__',
 
     def flatten(self, obj, data):
         pickler = self._base
@@ -51,3 +132,196 @@ class SimpleReduceHandler(jsonstruct.handlers.BaseHandler):
         unpickler = self._base
         factory, args = map(unpickler.restore, obj['__reduce__'])
         return factory(*args)
+
+    def flatten_many(self, objs):
+        return [unicode(obj) for obj in objs]
+
+
+class TimedeltaHandler(SimpleReduceHandler):
+    """
+    Timedeltas follow the __reduce__ protocol, or are ISO 8601 durations
+    when the pickler's iso8601 option is set.  Typed decode parses both
+    durations and the output of str().
+    """
+    _handles = [datetime.timedelta]
+    _payload_keys = '__reduce__', 'iso8601'
+
+    def flatten(self, obj, data):
+        pickler = self._base
+        if not pickler.iso8601:
+            return SimpleReduceHandler.flatten(self, obj, data)
+        if not pickler.unpicklable:
+            return isodate.isoformat(obj)
+        data['iso8601'] = isodate.isoformat(obj)
+        return data
+
+    def restore(self, obj):
+        if 'iso8601' in obj:
+            return _restore_iso8601(obj, datetime.timedelta)
+        return SimpleReduceHandler.restore(self, obj)
+
+    def restore_typed(self, obj, cls_def):
+        return _restore_typed_iso8601(self, obj, cls_def)
+
+    def flatten_many(self, objs):
+        return _flatten_many_iso8601(self, objs)
+
+    def restore_many(self, objs, cls_def):
+        if not isinstance(cls_def, type):
+            cls_def = type(cls_def)
+        return isodate.parse_many(objs, cls_def)
+
+
+class BinaryHandler(jsonstruct.handlers.BaseHandler):
+    """
+    Flattens binary payloads into base64, read straight from their buffer
+    without an intermediate copy.  Handles bytearray and memoryview, and
+    bytes on Python 3 (on Python 2 bytes is str).  Typed decode restores
+    the type of the prototype, e.g. ``thumbnail = bytearray()``.
+    """
+    _handles = [bytearray, memoryview]
+    if bytes is not str:
+        _handles.append(bytes)
+    _payload_keys = 'base64',
+
+    def flatten(self, obj, data):
+        try:
+            encoded = b64encode(obj)
+        except (TypeError, ValueError, BufferError):
+            # non-contiguous memoryviews
+            encoded = b64encode(obj.tobytes())
+        if not self._base.unpicklable:
+            return encoded
+        data['base64'] = encoded
+        return data
+
+    def restore(self, obj):
+        return self.restore_typed(obj, bytearray)
+
+    def restore_typed(self, obj, cls_def):
+        if type(obj) is dict:
+            obj = obj.get('base64')
+        try:
+            value = binascii.a2b_base64(obj)
+        except (binascii.Error, TypeError, ValueError):
+            return None
+        if cls_def is bytearray or type(cls_def) is bytearray:
+            return bytearray(value)
+        if cls_def is memoryview or type(cls_def) is memoryview:
+            return memoryview(value)
+        return value
+
+
+class ArrayHandler(jsonstruct.handlers.BaseHandler):
+    """
+    Flattens array.array instances in bulk: into a list of their items
+    when unpicklable is False, otherwise into the base64 encoding of their
+    machine representation.  Typed decode reads the list back with the
+    typecode of the prototype, e.g. ``samples = array('d')``.
+    """
+    _handles = array.array,
+    _payload_keys = 'typecode',
+
+    def flatten(self, obj, data):
+        if not self._base.unpicklable:
+            return obj.tolist()
+        data['typecode'] = obj.typecode
+        data['byteorder'] = sys.byteorder
+        data['base64'] = b64encode(obj)
+        return data
+
+    def restore(self, obj):
+        value = array.array(str(obj['typecode']))
+        if hasattr(value, 'frombytes'):
+            value.frombytes(b64decode(obj['base64']))
+        else:
+            value.fromstring(b64decode(obj['base64']))
+        if obj.get('byteorder', sys.byteorder) != sys.byteorder:
+            value.byteswap()
+        return value
+
+    def restore_typed(self, obj, cls_def):
+        if type(obj) is not list:
+            return super(ArrayHandler, self).restore_typed(obj, cls_def)
+        typecode = 'd'
+        if isinstance(cls_def, array.array):
+            typecode = cls_def.typecode
+        try:
+            return array.array(str(typecode), obj)
+        except (TypeError, ValueError, OverflowError):
+            return None
+
+
+if numpy is not None:
+    class NumpyArrayHandler(jsonstruct.handlers.BaseHandler):
+        """
+        Flattens NumPy arrays in bulk: into nested lists when unpicklable is
+        False, otherwise into their dtype, shape and the base64 encoding of
+        their buffer.  Typed decode uses the dtype of the prototype, e.g.
+        ``samples = numpy.zeros(0)``.
+        """
+        _handles = numpy.ndarray,
+        _payload_keys = 'dtype',
+
+        def flatten(self, obj, data):
+            if not self._base.unpicklable:
+                return obj.tolist()
+            data['dtype'] = obj.dtype.str
+            data['shape'] = list(obj.shape)
+            if obj.dtype.hasobject:
+                data['values'] = self._base.flatten(obj.tolist())
+            else:
+                data['base64'] = b64encode(numpy.ascontiguousarray(obj))
+            return data
+
+        def restore(self, obj):
+            dtype = numpy.dtype(str(obj['dtype']))
+            if 'values' in obj:
+                return numpy.array(self._base.restore(obj['values']),
+                                   dtype=dtype)
+            value = numpy.frombuffer(b64decode(obj['base64']), dtype=dtype)
+            return value.reshape(obj['shape']).copy()
+
+        def restore_typed(self, obj, cls_def):
+            if type(obj) is not list:
+                return super(NumpyArrayHandler, self).restore_typed(obj,
+                                                                    cls_def)
+            dtype = None
+            if isinstance(cls_def, numpy.ndarray):
+                dtype = cls_def.dtype
+            try:
+                return numpy.array(obj, dtype=dtype)
+            except (TypeError, ValueError, OverflowError):
+                return None
+
+    class NumpyScalarHandler(jsonstruct.handlers.BaseHandler):
+        """
+        Flattens NumPy scalars into the equivalent Python value.
+        """
+        _handles = set(numpy.sctypeDict.values())
+        _payload_keys = 'dtype',
+
+        def flatten(self, obj, data):
+            if not self._base.unpicklable:
+                return self._base.flatten(obj.item())
+            data['dtype'] = obj.dtype.str
+            data['value'] = self._base.flatten(obj.item())
+            return data
+
+        def restore(self, obj):
+            dtype = numpy.dtype(str(obj['dtype']))
+            return dtype.type(self._base.restore(obj['value']))
+
+        def restore_typed(self, obj, cls_def):
+            if type(obj) is dict:
+                if not self.is_payload(obj):
+                    return None
+                return self.restore(obj)
+            if isinstance(cls_def, numpy.generic):
+                scalar_type = type(cls_def)
+            else:
+                scalar_type = cls_def
+            try:
+                return scalar_type(obj)
+            except (TypeError, ValueError, OverflowError):
+                return None
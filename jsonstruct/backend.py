@@ -1,3 +1,8 @@
+import functools
+import sys
+import threading
+
+
 class JSONBackend(object):
     """Manages encoding and decoding using various backends.
 
@@ -8,8 +13,19 @@ class JSONBackend(object):
     json comes with python2.6 and is tried second.
     demjson is the most permissive backend and is tried last.
 
+    Loading, removing and configuring backends is thread-safe: each change
+    publishes a new snapshot of the backends, which encode() and decode()
+    read once per call.
+
     """
     def __init__(self):
+        ## Serializes changes to the backends
+        self._lock = threading.RLock()
+
+        ## The (name, encode, decode, decode exception, encoder args,
+        ## encoder kwargs) of the backends in order, replaced as a whole
+        self._backends = ()
+
         ## The names of backends that have been successfully imported
         self._backend_names = []
 
@@ -68,6 +84,11 @@ class JSONBackend(object):
           can be found in the backend module's namespace.
 
         """
+        with self._lock:
+            self._load_backend(name, encode_name, decode_name, decode_exc)
+            self._update()
+
+    def _load_backend(self, name, encode_name, decode_name, decode_exc):
         try:
             ## Load the JSON backend
             mod = __import__(name)
@@ -112,13 +133,32 @@ class JSONBackend(object):
 
     def remove_backend(self, name):
         """Remove all entries for a particular backend."""
-        self._encoders.pop(name, None)
-        self._decoders.pop(name, None)
-        self._decoder_exceptions.pop(name, None)
-        self._encoder_options.pop(name, None)
-        if name in self._backend_names:
-            self._backend_names.remove(name)
-        self._verified = bool(self._backend_names)
+        with self._lock:
+            self._encoders.pop(name, None)
+            self._decoders.pop(name, None)
+            self._decoder_exceptions.pop(name, None)
+            self._encoder_options.pop(name, None)
+            if name in self._backend_names:
+                self._backend_names.remove(name)
+            self._verified = bool(self._backend_names)
+            self._update()
+
+    def _update(self):
+        """Publishes the snapshot of the backends encode() and decode()
+        use.  Called with the lock held.
+        """
+        backends = []
+        for name in self._backend_names:
+            try:
+                args, kwargs = self._encoder_options[name]
+                backends.append((name, self._encoders[name],
+                                 self._decoders[name],
+                                 self._decoder_exceptions[name],
+                                 tuple(args), kwargs))
+            except KeyError:
+                # partially loaded or removed
+                continue
+        self._backends = tuple(backends)
 
     def encode(self, obj):
         """
@@ -129,14 +169,13 @@ class JSONBackend(object):
 
         """
         self._verify()
-        for idx, name in enumerate(self._backend_names):
+        backends = self._backends
+        for idx, (name, encoder, decoder, decoder_exc, optargs,
+                  optkwargs) in enumerate(backends):
             try:
-                optargs, optkwargs = self._encoder_options[name]
-                encoder_kwargs = optkwargs.copy()
-                encoder_args = (obj,) + tuple(optargs)
-                return self._encoders[name](*encoder_args, **encoder_kwargs)
+                return encoder(obj, *optargs, **optkwargs)
             except Exception:
-                if idx == len(self._backend_names) - 1:
+                if idx == len(backends) - 1:
                     raise
 
     def decode(self, string):
@@ -148,15 +187,28 @@ class JSONBackend(object):
 
         """
         self._verify()
-        for idx, name in enumerate(self._backend_names):
+        backends = self._backends
+        for idx, (name, encoder, decoder, decoder_exc, optargs,
+                  optkwargs) in enumerate(backends):
             try:
-                return self._decoders[name](string)
-            except self._decoder_exceptions[name] as e:
-                if idx == len(self._backend_names) - 1:
+                return decoder(string)
+            except decoder_exc as e:
+                if idx == len(backends) - 1:
                     raise e
                 else:
                     pass # and try a more forgiving encoder, e.g. demjson
 
+    def _find(self, name=None):
+        """Returns the snapshot entry of the backend name, or of the
+        preferred backend if name is None.
+        """
+        self._verify()
+        for entry in self._backends:
+            if name is None or entry[0] == name:
+                return entry
+        errmsg = 'The "%s" backend has not been loaded.' % name
+        raise AssertionError(errmsg)
+
     def set_preferred_backend(self, name):
         """
         Set the preferred json backend.
@@ -175,12 +227,14 @@ class JSONBackend(object):
         AssertionError is raised if the backend has not been loaded.
 
         """
-        if name in self._backend_names:
-            self._backend_names.remove(name)
-            self._backend_names.insert(0, name)
-        else:
-            errmsg = 'The "%s" backend has not been loaded.' % name
-            raise AssertionError(errmsg)
+        with self._lock:
+            if name in self._backend_names:
+                self._backend_names.remove(name)
+                self._backend_names.insert(0, name)
+                self._update()
+            else:
+                errmsg = 'The "%s" backend has not been loaded.' % name
+                raise AssertionError(errmsg)
 
     def set_encoder_options(self, name, *args, **kwargs):
         """
@@ -199,5 +253,86 @@ class JSONBackend(object):
         the supported arguments and keyword arguments.
 
         """
-        self._encoder_options[name] = (args, kwargs)
+        with self._lock:
+            self._encoder_options[name] = (args, kwargs)
+            self._update()
+
+
+class EncoderProfile(object):
+    """A fixed set of encoding options, resolved against a backend once.
+
+    jsonstruct.encode(obj, profile=profile) flattens obj with the
+    profile's is_filter_none_attr and max_depth, and encodes it with the
+    profile's backend, indent, separators and key order.  The options set
+    with set_encoder_options() do not apply, and no other backend is tried
+    if the profile's one fails.  Profiles are immutable, so that they can
+    be shared, e.g. one compact profile for RPC and an indented one for
+    logs.
+
+    backend defaults to the preferred backend of `backends`, which
+    defaults to jsonstruct.json.
+
+    >>> compact = EncoderProfile('json', separators=(',', ':'),
+    ...                          sort_keys=True)
+    >>> compact.encode({'b': [1, 2], 'a': None})
+    '{"a":null,"b":[1,2]}'
+    >>> compact.sort_keys = False
+    Traceback (most recent call last):
+    ...
+    AttributeError: EncoderProfile is immutable
+    """
 
+    __slots__ = ('backend', 'indent', 'separators', 'sort_keys',
+                 'is_filter_none_attr', 'max_depth', 'encode')
+
+    def __init__(self, backend=None, indent=None, separators=None,
+                 sort_keys=False, is_filter_none_attr=True, max_depth=None,
+                 backends=None):
+        if backends is None:
+            import jsonstruct
+            backends = jsonstruct.json
+        entry = backends._find(backend)
+        name, encoder = entry[0], entry[1]
+        if separators is not None:
+            separators = tuple(separators)
+        init = super(EncoderProfile, self).__setattr__
+        init('backend', name)
+        init('indent', indent)
+        init('separators', separators)
+        init('sort_keys', sort_keys)
+        init('is_filter_none_attr', is_filter_none_attr)
+        init('max_depth', max_depth)
+        ## The backend's encode function with the options bound
+        init('encode', _bind_encoder(name, encoder, indent, separators,
+                                     sort_keys))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('EncoderProfile is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('EncoderProfile is immutable')
+
+    def __repr__(self):
+        return ('EncoderProfile(%r, indent=%r, separators=%r, sort_keys=%r, '
+                'is_filter_none_attr=%r, max_depth=%r)' % (
+                    self.backend, self.indent, self.separators,
+                    self.sort_keys, self.is_filter_none_attr,
+                    self.max_depth))
+
+
+def _bind_encoder(name, encoder, indent, separators, sort_keys):
+    """Returns a function encoding a value with the given options."""
+    kwargs = {}
+    if indent is not None:
+        kwargs['indent'] = indent
+    if separators is not None:
+        kwargs['separators'] = separators
+    if sort_keys:
+        kwargs['sort_keys'] = True
+    module = sys.modules.get(name)
+    if name in ('json', 'simplejson') and hasattr(module, 'JSONEncoder'):
+        # dumps() builds this encoder on every call with options
+        return module.JSONEncoder(**kwargs).encode
+    if not kwargs:
+        return encoder
+    return functools.partial(encoder, **kwargs)
@@ -0,0 +1,573 @@
+"""Specialized encoders generated per class.
+
+The generic Pickler inspects every instance it flattens: its class, its
+__dict__, __slots__, __getstate__, handlers and so on.  With codegen
+enabled, the first instance of a class is inspected once, and a function
+reading the attributes of that instance straight from __dict__ is generated
+and compiled for the class.  Instances which do not match, e.g. with an
+extra attribute, fall back to the generic path.
+
+    >>> import jsonstruct
+    >>> class Address(object):
+    ...     def __init__(self, city, province):
+    ...         self.city, self.province = city, province
+    >>> jsonstruct.encode(Address('Toronto', None), codegen=True)
+    '{"city": "Toronto"}'
+    >>> print(encoder_source(Address).strip())
+    def encode_Address(obj, data, pickler):
+        d = obj.__dict__
+        if len(d) != 2:
+            return None
+        try:
+            v0 = d['city']
+            v1 = d['province']
+        except KeyError:
+            return None
+        if v0 is not None:
+            if type(v0) in primitive_types:
+                data['city'] = v0
+            else:
+                pickler._flatten_key_value_pair('city', v0, data)
+        if v1 is not None:
+            if type(v1) in primitive_types:
+                data['province'] = v1
+            else:
+                pickler._flatten_key_value_pair('province', v1, data)
+        return data
+
+The Unpickler does the same on the decode side.  From the prototype of a
+class, e.g. ``city = City()`` or ``cities = [City()]``, it
+generates a decoder which assigns the attributes straight into __dict__
+and calls the decoders of the nested classes.  Inputs carrying tags or
+references are left to the generic path.
+
+    >>> class City(object):
+    ...     name = ""
+    >>> class Developer(object):
+    ...     name = ""
+    ...     city = City()
+    >>> developer = jsonstruct.decode(
+    ...     '{"name": "Bob", "city": {"name": "Toronto"}}', Developer,
+    ...     codegen=True)
+    >>> print(developer.city.name)
+    Toronto
+    >>> print(decoder_source(Developer).strip())
+    def decode_Developer(unpickler, obj):
+        instance = new(cls_Developer)
+        unpickler._mkref(instance)
+        d = instance.__dict__
+        names = unpickler._namestack
+        restore = unpickler.restore
+        if 'city' in obj:
+            v = obj['city']
+            if type(v) is dict and special_keys.isdisjoint(v):
+                names.append('city')
+                d['city'] = decode_City(unpickler, v)
+                names.pop()
+            elif type(v) is dict:
+                names.append('city')
+                d['city'] = restore(v, cls_City)
+                names.pop()
+            else:
+                d['city'] = None
+        else:
+            d['city'] = None
+        if 'name' in obj:
+            v = obj['name']
+            if type(v) in primitive_types:
+                d['name'] = v
+            else:
+                names.append('name')
+                d['name'] = restore(v, None)
+                names.pop()
+        else:
+            d['name'] = None
+        return instance
+"""
+
+import linecache
+import re
+import threading
+import types
+
+import jsonstruct.handlers as handlers
+import jsonstruct.tags as tags
+import jsonstruct.util as util
+from jsonstruct.rawjson import RawJSON
+from jsonstruct.unpickler import SPECIAL_KEYS, get_attr_cls_def
+from jsonstruct.unpickler import get_collection_item_type
+from jsonstruct.unpickler import get_dictionary_item_type
+
+
+class EncoderCache(object):
+    """Generated encoders by class and pickler options.
+
+    An encoder is called as encoder(obj, data, pickler) and returns data
+    filled with the flattened attributes of obj, or None if obj does not
+    have the attributes the encoder was generated for.  A cache may be
+    shared by threads.
+    """
+
+    def __init__(self):
+        ## Maps (class, is_filter_none_attr, unpicklable) to an encoder,
+        ## or to None for classes the generic path has to handle
+        self._encoders = {}
+        ## Maps the same keys to the source of the encoders
+        self._sources = {}
+        ## Keys of the encoders generated by prepare(), replaced by one
+        ## generated from the first instance they do not match
+        self._prepared = set()
+        ## Guards the generation; lookups of generated encoders need not
+        self._lock = threading.RLock()
+
+    def get(self, obj, is_filter_none_attr, unpicklable):
+        """Returns the encoder for instances of the class of obj, generating
+        it from obj if needed, or None.
+        """
+        cls = type(obj)
+        key = (cls, is_filter_none_attr, unpicklable)
+        try:
+            encoder = self._encoders[key]
+        except KeyError:
+            with self._lock:
+                try:
+                    # generated by another thread meanwhile
+                    encoder = self._encoders[key]
+                except KeyError:
+                    encoder = self._generate(obj, key)
+        if encoder is not None and handlers.get(cls) is not None:
+            # a handler has been registered since
+            return None
+        return encoder
+
+    def prepare(self, cls, is_filter_none_attr=True, unpicklable=False):
+        """Generates the encoder of cls from the public variables of the
+        class, i.e. its prototype, rather than from its first instance.
+
+        Class constants are public variables too, which instances do not
+        have in their __dict__.  The first instance the prepared encoder
+        does not match has the encoder generated again from it, see
+        regenerate().
+        """
+        key = (cls, is_filter_none_attr, unpicklable)
+        with self._lock:
+            if _is_supported_class(cls):
+                # properties and other data descriptors are not in __dict__
+                names = [k for k in util.get_public_variables(cls)
+                         if not hasattr(type(getattr(cls, k)), '__set__')]
+                self._encoders[key] = self._compile(key, names)
+                self._prepared.add(key)
+            else:
+                self._encoders[key] = None
+            return self._encoders[key]
+
+    def regenerate(self, obj, is_filter_none_attr, unpicklable):
+        """Called when the encoder of the class of obj returned None for
+        obj.  Returns an encoder generated from obj in place of a prepared
+        one, or None if the encoder was generated from an instance already.
+        """
+        key = (type(obj), is_filter_none_attr, unpicklable)
+        if key not in self._prepared:
+            return None
+        with self._lock:
+            if key not in self._prepared:
+                return None
+            self._prepared.discard(key)
+            return self._generate(obj, key)
+
+    def source(self, cls, is_filter_none_attr=True, unpicklable=False):
+        """Returns the source of the encoder of cls, or None."""
+        return self._sources.get((cls, is_filter_none_attr, unpicklable))
+
+    def clear(self):
+        with self._lock:
+            self._encoders.clear()
+            self._sources.clear()
+            self._prepared.clear()
+
+    def __len__(self):
+        return len(self._encoders)
+
+    def _generate(self, obj, key):
+        encoder = None
+        if _is_supported(obj):
+            encoder = self._compile(key, obj.__dict__.keys())
+        self._encoders[key] = encoder
+        return encoder
+
+    def _compile(self, key, names):
+        cls, is_filter_none_attr, unpicklable = key
+        source = _encoder_source(cls, sorted(names), is_filter_none_attr,
+                                 unpicklable)
+        namespace = {'primitive_types': util.PRIMITIVE_TYPES}
+        exec(_compile_source(source, cls, 'encoder %d%d' % (
+                is_filter_none_attr, unpicklable)), namespace)
+        self._sources[key] = source
+        return namespace[_function_name(cls)]
+
+
+def _is_supported_class(cls):
+    return (isinstance(cls, type) and
+            cls is not RawJSON and
+            handlers.get(cls) is None and
+            not issubclass(cls, (dict, list, set, tuple, types.ModuleType)) and
+            not hasattr(cls, '__slots__') and
+            not (hasattr(cls, '__getstate__') and
+                 hasattr(cls, '__setstate__')))
+
+
+def _is_supported(obj):
+    """Returns True if obj is flattened from its __dict__ alone."""
+    return (hasattr(obj, '__dict__') and
+            not util.is_collection_subclass(obj) and
+            not (hasattr(obj, '__getstate__') and
+                 hasattr(obj, '__setstate__')) and
+            _is_supported_class(type(obj)))
+
+
+def _function_name(cls):
+    return 'encode_' + re.sub(r'\W', '_', cls.__name__)
+
+
+def _encoder_source(cls, names, is_filter_none_attr, unpicklable):
+    lines = [
+        'def %s(obj, data, pickler):' % _function_name(cls),
+        '    d = obj.__dict__',
+        '    if len(d) != %d:' % len(names),
+        '        return None',
+    ]
+    if names:
+        lines.append('    try:')
+        for i, name in enumerate(names):
+            lines.append('        v%d = d[%r]' % (i, name))
+        lines.extend([
+            '    except KeyError:',
+            '        return None',
+        ])
+    if unpicklable:
+        lines.append('    data[%r] = %r' % (
+                tags.OBJECT, '%s.%s' % (cls.__module__, cls.__name__)))
+    for i, name in enumerate(names):
+        if name in tags.RESERVED:
+            continue
+        indent = '    '
+        if is_filter_none_attr:
+            lines.append('    if v%d is not None:' % i)
+            indent = '        '
+        lines.extend([
+            indent + 'if type(v%d) in primitive_types:' % i,
+            indent + '    data[%r] = v%d' % (name, i),
+            indent + 'else:',
+            indent + '    pickler._flatten_key_value_pair(%r, v%d, data)' % (
+                    name, i),
+        ])
+    lines.append('    return data')
+    return '\n'.join(lines) + '\n'
+
+
+class DecoderCache(object):
+    """Generated decoders by class.
+
+    A decoder is called as decoder(unpickler, obj) for a dict obj without
+    any of the SPECIAL_KEYS, and returns the restored instance.  The
+    decoders assume that the prototypes of a class do not change after
+    its decoder has been generated.  A cache may be shared by threads.
+    """
+
+    def __init__(self):
+        ## Maps classes to their decoder, or to None for classes the
+        ## generic path has to handle
+        self._decoders = {}
+        ## Maps classes to the name of their decoder function
+        self._names = {}
+        ## Maps classes to the source of their decoder
+        self._sources = {}
+        ## Globals of the generated functions, shared so that decoders
+        ## call each other by name, including in cycles
+        self._namespace = _decoder_namespace()
+        ## The handlers.generation the decoders were generated at
+        self._generation = handlers.generation
+        ## Classes whose decoders are being generated, outermost first
+        self._pending = []
+        ## Guards the generation; lookups of generated decoders need not
+        self._lock = threading.RLock()
+
+    def get(self, cls):
+        """Returns the decoder of cls, generating it if needed, or None."""
+        if self._generation != handlers.generation:
+            with self._lock:
+                if self._generation != handlers.generation:
+                    # decoders call each other directly, so a handler
+                    # registered for any class invalidates all of them
+                    self.clear()
+                    self._generation = handlers.generation
+        try:
+            return self._decoders[cls]
+        except KeyError:
+            with self._lock:
+                if cls not in self._decoders:
+                    self._generate(cls)
+                return self._decoders[cls]
+
+    def source(self, cls):
+        """Returns the source of the decoder of cls, or None."""
+        return self._sources.get(cls)
+
+    def clear(self):
+        with self._lock:
+            self._decoders.clear()
+            self._names.clear()
+            self._sources.clear()
+            # the same names are generated again; decoders still running
+            # keep the namespace they were defined in
+            self._namespace = _decoder_namespace()
+
+    def __len__(self):
+        return len(self._decoders)
+
+    def _name(self, cls):
+        """Returns the name of the decoder function of cls, generating it
+        first, or None if cls is not supported.
+        """
+        # classes in _names without a decoder are in progress, their
+        # prototypes referring back
+        if cls not in self._decoders and cls not in self._names:
+            self._generate(cls)
+        return self._names.get(cls)
+
+    def _generate(self, cls):
+        """Generates the decoder of cls and of the classes it refers to.
+        Called with the lock held.  The decoders are published together
+        once all of them are defined, as they call each other by name.
+        """
+        if not _is_decodable_class(cls):
+            self._decoders[cls] = None
+            return
+        outermost = not self._pending
+        name = _unique_name(self._namespace, 'decode_' +
+                            re.sub(r'\W', '_', cls.__name__))
+        self._names[cls] = name
+        self._pending.append(cls)
+        try:
+            source = self._decoder_source(cls, name)
+            exec(_compile_source(source, cls, 'decoder'), self._namespace)
+            self._sources[cls] = source
+        except Exception:
+            if outermost:
+                # left to the generic path
+                for pending in self._pending:
+                    self._names.pop(pending, None)
+                    self._sources.pop(pending, None)
+                    self._decoders[pending] = None
+                self._pending = []
+            raise
+        if outermost:
+            for pending in self._pending:
+                self._decoders[pending] = \
+                    self._namespace[self._names[pending]]
+            self._pending = []
+
+    def _constant(self, prefix, value):
+        """Returns the name of a global of the generated code bound to
+        value.
+        """
+        for k, v in self._namespace.items():
+            if v is value and k.startswith(prefix):
+                return k
+        name = _unique_name(self._namespace, prefix)
+        self._namespace[name] = value
+        return name
+
+    def _decoder_source(self, cls, name):
+        probe = cls.__new__(cls)
+        use_dict = (hasattr(probe, '__dict__') and
+                    cls.__setattr__ is object.__setattr__)
+        lines = [
+            'def %s(unpickler, obj):' % name,
+            '    instance = new(%s)' % self._constant(
+                    'cls_' + re.sub(r'\W', '_', cls.__name__), cls),
+            '    unpickler._mkref(instance)',
+        ]
+        if use_dict:
+            lines.append('    d = instance.__dict__')
+        lines.extend([
+            '    names = unpickler._namestack',
+            '    restore = unpickler.restore',
+        ])
+        for k in util.get_public_variables(cls):
+            attr = getattr(cls, k)
+            if use_dict and not hasattr(type(attr), '__set__'):
+                assign = "d[%r] = %%s" % k
+            else:
+                # properties and other data descriptors
+                assign = "setattr(instance, %r, %%s)" % k
+            if k in tags.RESERVED:
+                # ignored when given, like the generic path does
+                lines.append('    if %r not in obj:' % k)
+                lines.append('        ' + assign % 'None')
+                continue
+            lines.append('    if %r in obj:' % k)
+            lines.append('        v = obj[%r]' % k)
+            lines.extend('        ' + line for line in
+                         self._attr_source(k, get_attr_cls_def(cls, k),
+                                           assign))
+            lines.append('    else:')
+            lines.append('        ' + assign % 'None')
+        lines.append('    return instance')
+        return '\n'.join(lines) + '\n'
+
+    def _attr_source(self, k, cls_def, assign):
+        """Returns the lines restoring v, the value of attribute k whose
+        prototype is cls_def.
+        """
+        if cls_def is None:
+            return [
+                'if type(v) in primitive_types:',
+                '    ' + assign % 'v',
+                'else:',
+                '    names.append(%r)' % k,
+                '    ' + assign % 'restore(v, None)',
+                '    names.pop()',
+            ]
+        if util.is_type(cls_def):
+            decoder = self._name(cls_def)
+            if decoder is not None:
+                return [
+                    'if type(v) is dict and special_keys.isdisjoint(v):',
+                    '    names.append(%r)' % k,
+                    '    ' + assign % ('%s(unpickler, v)' % decoder),
+                    '    names.pop()',
+                    'elif type(v) is dict:',
+                    '    names.append(%r)' % k,
+                    '    ' + assign % ('restore(v, %s)' % self._constant(
+                            'cls_' + re.sub(r'\W', '_', cls_def.__name__),
+                            cls_def)),
+                    '    names.pop()',
+                    'else:',
+                    '    ' + assign % 'None',
+                ]
+        prototype = self._constant('prototype_' + re.sub(r'\W', '_', k),
+                                   cls_def)
+        if type(cls_def) is list:
+            item_type = get_collection_item_type(cls_def)
+            decoder = util.is_type(item_type) and self._name(item_type)
+            if decoder:
+                item_cls = self._constant(
+                        'cls_' + re.sub(r'\W', '_', item_type.__name__),
+                        item_type)
+                return [
+                    'names.append(%r)' % k,
+                    'if type(v) is list:',
+                    '    items = []',
+                    '    unpickler._mkref(items)',
+                    '    for item in v:',
+                    '        if (type(item) is dict and',
+                    '                special_keys.isdisjoint(item)):',
+                    '            items.append(%s(unpickler, item))' % decoder,
+                    '        else:',
+                    '            items.append(restore(item, %s))' % item_cls,
+                    '    ' + assign % 'items',
+                    'else:',
+                    '    ' + assign % ('restore(v, %s)' % prototype),
+                    'names.pop()',
+                ]
+        if type(cls_def) is dict:
+            k_type, v_type = get_dictionary_item_type(cls_def)
+            decoder = (k_type is None and util.is_type(v_type) and
+                       self._name(v_type))
+            if decoder:
+                value_cls = self._constant(
+                        'cls_' + re.sub(r'\W', '_', v_type.__name__),
+                        v_type)
+                return [
+                    'names.append(%r)' % k,
+                    'if type(v) is dict and special_keys.isdisjoint(v):',
+                    '    items = {}',
+                    '    for key in sorted(v):',
+                    '        item = v[key]',
+                    '        names.append(key)',
+                    '        if (type(item) is dict and',
+                    '                special_keys.isdisjoint(item)):',
+                    '            items[key] = %s(unpickler, item)' % decoder,
+                    '        else:',
+                    '            items[key] = restore(item, %s)' % value_cls,
+                    '        names.pop()',
+                    '    ' + assign % 'items',
+                    'else:',
+                    '    ' + assign % ('restore(v, %s)' % prototype),
+                    'names.pop()',
+                ]
+        return [
+            'names.append(%r)' % k,
+            assign % ('restore(v, %s)' % prototype),
+            'names.pop()',
+        ]
+
+
+## A persistent cache of compiled code, see jsonstruct.schemacache
+code_cache = None
+
+
+def _compile_source(source, cls, kind):
+    """Compiles the generated source of the encoder or decoder of cls,
+    through the code_cache if one is set.
+    """
+    path = '%s.%s' % (cls.__module__, cls.__name__)
+    filename = '<jsonstruct.codegen %s>' % path
+    if code_cache is not None:
+        code = code_cache.compile(source, filename, '%s %s' % (path, kind))
+    else:
+        code = compile(source, filename, 'exec')
+    # show the generated source in tracebacks
+    linecache.cache[filename] = (len(source), None,
+                                 source.splitlines(True), filename)
+    return code
+
+
+def _decoder_namespace():
+    return {
+        'new': object.__new__,
+        'primitive_types': util.PRIMITIVE_TYPES,
+        'special_keys': SPECIAL_KEYS,
+    }
+
+
+def _is_decodable_class(cls):
+    if not (_is_supported_class(cls) and util.is_type(cls) and
+            cls.__new__ is object.__new__):
+        return False
+    try:
+        cls.__new__(cls)
+    except Exception:
+        return False
+    return True
+
+
+def _unique_name(namespace, name):
+    unique = name
+    i = 1
+    while unique in namespace:
+        i += 1
+        unique = '%s_%d' % (name, i)
+    return unique
+
+
+## The encoders shared by picklers created with codegen=True
+default_encoders = EncoderCache()
+
+## The decoders shared by unpicklers created with codegen=True
+default_decoders = DecoderCache()
+
+
+def encoder_source(cls, is_filter_none_attr=True, unpicklable=False):
+    """Returns the source of the generated encoder of cls, or None if none
+    has been generated, for debugging.
+    """
+    return default_encoders.source(cls, is_filter_none_attr, unpicklable)
+
+
+def decoder_source(cls):
+    """Returns the source of the generated decoder of cls, or None if none
+    has been generated, for debugging.
+    """
+    return default_decoders.source(cls)
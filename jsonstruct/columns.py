@@ -0,0 +1,213 @@
+"""Columnar conversion of homogeneous object arrays.
+
+decode_columns() turns a JSON array of objects into one column per public
+variable of a class, without creating an instance per row.
+
+    >>> class Address(object):
+    ...     city = ""
+    ...     floor = 0
+    >>> columns = decode_columns(
+    ...     '[{"city": "Toronto", "floor": 3}, {"city": "Markham"}]', Address)
+    >>> [str(city) for city in columns['city']]
+    ['Toronto', 'Markham']
+    >>> columns['floor']
+    [3, None]
+
+encode_columns() goes the other way and writes the row-oriented JSON
+directly from columns, without building an object or a dict per row.
+
+    >>> encode_columns({'city': ['Toronto', 'Markham'], 'floor': [3, None]})
+    '[{"city": "Toronto", "floor": 3}, {"city": "Markham"}]'
+
+"""
+
+import array
+from json.encoder import encode_basestring_ascii
+
+import jsonstruct.util as util
+from jsonstruct.compat import izip, long, unicode
+from jsonstruct.unpickler import Unpickler, get_attr_cls_def
+
+## array.array typecodes for numeric prototypes
+TYPECODES = {
+    int: 'l',
+    long: 'l',
+    float: 'd',
+}
+
+
+def decode_columns(string_or_fp, cls, numpy=False):
+    """Decodes a JSON array of objects into a dict mapping each public
+    variable of `cls` to a column of values.
+
+    Columns whose prototype is an int or a float are array.array instances
+    when every value fits, lists otherwise.  Attributes whose prototype is
+    an object or a collection are restored as usual, one value per row.
+    Missing attributes are None.
+
+    If numpy is True and NumPy is installed, numeric columns are NumPy
+    arrays instead.
+
+    >>> class Sample(object):
+    ...     value = 0.0
+    >>> decode_columns('[{"value": 1.5}, {"value": 2}]', Sample)['value']
+    array('d', [1.5, 2.0])
+    """
+    import jsonstruct
+    if hasattr(string_or_fp, 'read'):
+        string_or_fp = string_or_fp.read()
+    rows = jsonstruct.json.decode(string_or_fp)
+    if not util.is_list(rows):
+        raise ValueError('Expecting a JSON array of objects')
+    return columns_from_rows(rows, cls, numpy=numpy)
+
+
+def columns_from_rows(rows, cls, numpy=False):
+    """Pivots a list of decoded JSON objects into columns, see
+    decode_columns().
+    """
+    if numpy:
+        numpy = _import_numpy()
+    for row in rows:
+        if not util.is_dictionary(row):
+            # Type mismatch. Such rows have no attribute at all.
+            rows = [row if util.is_dictionary(row) else {} for row in rows]
+            break
+
+    unpickler = Unpickler()
+    columns = {}
+    for k in util.get_public_variables(cls):
+        values = [row.get(k) for row in rows]
+        attr_cls_def = get_attr_cls_def(cls, k)
+        if attr_cls_def is not None:
+            values = [unpickler.restore(v, attr_cls_def) for v in values]
+        else:
+            typecode = TYPECODES.get(type(getattr(cls, k)))
+            if typecode is not None:
+                values = _numeric_column(values, typecode, numpy)
+        columns[k] = values
+    return columns
+
+
+def _numeric_column(values, typecode, numpy):
+    try:
+        if numpy:
+            return numpy.array(values, dtype=typecode)
+        return array.array(typecode, values)
+    except (TypeError, ValueError, OverflowError):
+        # None, strings or out of range values
+        return values
+
+
+def _encode_float(value):
+    if value != value:
+        return 'NaN'
+    if value == float('inf'):
+        return 'Infinity'
+    if value == float('-inf'):
+        return '-Infinity'
+    return repr(value)
+
+
+def _encode_bool(value):
+    if value:
+        return 'true'
+    return 'false'
+
+
+## Encoders for primitive values, matching the output of the backends
+ENCODERS = {
+    str: encode_basestring_ascii,
+    unicode: encode_basestring_ascii,
+    int: str,
+    long: str,
+    float: _encode_float,
+    bool: _encode_bool,
+}
+
+
+def encode_columns(columns, cls=None, is_filter_none_attr=True, fp=None,
+                   rows_per_write=1024):
+    """Encodes a dict of equally long columns into a JSON array with one
+    object per row.
+
+    Keys are sorted and None values are left out unless is_filter_none_attr
+    is False, as jsonstruct.encode() does for objects.  If cls is given,
+    its public variables are the keys and missing columns are all None.
+    Primitive values are encoded directly; any other value goes through
+    jsonstruct.encode().
+
+    If fp is given, the output is written to it in chunks of rows_per_write
+    rows and None is returned.
+
+    >>> encode_columns({'a': [None]}, is_filter_none_attr=False)
+    '[{"a": null}]'
+    """
+    import jsonstruct
+    if cls is not None:
+        keys = util.get_public_variables(cls)
+    else:
+        keys = sorted(columns)
+
+    length = None
+    values = []
+    for k in keys:
+        column = columns.get(k)
+        if column is None:
+            values.append(None)
+            continue
+        if (not isinstance(column, (list, tuple, array.array)) and
+                hasattr(column, 'tolist')):
+            # NumPy arrays iterate over NumPy scalars
+            column = column.tolist()
+        if length is None:
+            length = len(column)
+        elif len(column) != length:
+            raise ValueError('Column %r has %d values instead of %d' %
+                             (k, len(column), length))
+        values.append(column)
+    if length is None:
+        length = 0
+    values = [column if column is not None else [None] * length
+              for column in values]
+
+    prefixes = [encode_basestring_ascii(k) + ': ' for k in keys]
+    encoders = ENCODERS
+    rows = []
+    separator = '['
+    for row in izip(*values):
+        items = []
+        for prefix, value in izip(prefixes, row):
+            if value is None:
+                if not is_filter_none_attr:
+                    items.append(prefix + 'null')
+                continue
+            encoder = encoders.get(type(value))
+            if encoder is None:
+                text = jsonstruct.encode(
+                        value, is_filter_none_attr=is_filter_none_attr)
+            else:
+                text = encoder(value)
+            items.append(prefix + text)
+        rows.append('{' + ', '.join(items) + '}')
+        if fp is not None and len(rows) == rows_per_write:
+            fp.write(separator + ', '.join(rows))
+            separator = ', '
+            rows = []
+
+    if fp is None:
+        return '[' + ', '.join(rows) + ']'
+    if rows:
+        fp.write(separator + ', '.join(rows))
+    elif separator == '[':
+        fp.write(separator)
+    fp.write(']')
+    return None
+
+
+def _import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
@@ -13,3 +13,8 @@ try:
     long = long
 except NameError:
     long = int
+
+try:
+    from itertools import izip
+except ImportError:
+    izip = zip
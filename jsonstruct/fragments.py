@@ -0,0 +1,221 @@
+"""Caching of flattened immutable objects.
+
+Reference data such as addresses or country records is often embedded in
+many documents without ever changing.  Classes (or individual objects) that
+are marked as immutable have their flattened representation cached, so the
+Pickler can splice the cached fragment in directly instead of walking the
+object again.
+
+    >>> cache = FragmentCache(maxsize=2)
+    >>> class Point(object):
+    ...     x = 0
+    >>> _ = cache.register(Point)
+    >>> p = Point()
+    >>> cache.is_cacheable(p)
+    True
+    >>> cache.get(p, True) is None
+    True
+    >>> cache.put(p, True, {'x': 1})
+    {'x': 1}
+    >>> cache.get(p, True)
+    {'x': 1}
+    >>> cache.stats()['hits'], cache.stats()['misses']
+    (1, 1)
+
+Fragments are only used by picklers running with ``unpicklable=False`` and
+without a ``max_depth``; in those modes the flattened form of an object does
+not depend on where it appears in the object graph.
+"""
+
+import collections
+import contextlib
+import threading
+import weakref
+
+
+class FragmentCache(object):
+    """A size-bounded LRU cache of flattened objects.
+
+    Only instances of registered classes, or objects that have been marked
+    individually, are cached.  Cached objects are held by a strong reference
+    so that their ``id()`` cannot be reused while they are in the cache.
+    Marked objects are held by a weak reference, except those which do not
+    support one, e.g. dicts, lists and tuples, which are held until they are
+    unmarked; marked() unmarks them on leaving a with block.  A cache may be
+    shared by threads.
+    """
+
+    def __init__(self, maxsize=1024):
+        ## The maximal number of objects kept in the cache
+        self.maxsize = maxsize
+        ## Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        ## Classes whose instances are immutable
+        self._classes = set()
+        ## Maps id(obj) to references to individually marked immutable
+        ## objects
+        self._marked = {}
+        ## Maps id(obj) to [obj, {options: flattened}], in LRU order
+        self._entries = collections.OrderedDict()
+        ## Guards the counters, _marked and _entries
+        self._lock = threading.RLock()
+
+    def register(self, cls):
+        """Mark all instances of `cls` as immutable.
+
+        Returns `cls` so that it can be used as a class decorator.
+        """
+        self._classes.add(cls)
+        return cls
+
+    def unregister(self, cls):
+        """Stop caching instances of `cls` and drop their fragments."""
+        self._classes.discard(cls)
+        self.invalidate_class(cls)
+
+    def mark(self, obj):
+        """Mark an individual object as immutable and return it."""
+        key = id(obj)
+        marked = self._marked
+        try:
+            def forget(ref):
+                # the object is gone, and key may be reused
+                if marked.get(key) is ref:
+                    del marked[key]
+            ref = weakref.ref(obj, forget)
+        except TypeError:
+            ref = _StrongRef(obj)
+        with self._lock:
+            marked[key] = ref
+        return obj
+
+    def unmark(self, obj):
+        """Forget that `obj` is immutable and drop its fragment."""
+        with self._lock:
+            ref = self._marked.get(id(obj))
+            if ref is not None and ref() is obj:
+                del self._marked[id(obj)]
+            self.invalidate(obj)
+
+    @contextlib.contextmanager
+    def marked(self, obj):
+        """Marks `obj` as immutable within a with block, and unmarks it on
+        leaving the block, even through an exception.
+
+        >>> cache = FragmentCache()
+        >>> point = {'x': 1}
+        >>> with cache.marked(point):
+        ...     cache.is_cacheable(point)
+        True
+        >>> cache.is_cacheable(point)
+        False
+        """
+        self.mark(obj)
+        try:
+            yield obj
+        finally:
+            self.unmark(obj)
+
+    def is_cacheable(self, obj):
+        """Returns True if the flattened form of `obj` may be cached."""
+        if type(obj) in self._classes:
+            return True
+        ref = self._marked.get(id(obj))
+        return ref is not None and ref() is obj
+
+    def get(self, obj, options):
+        """Returns the cached fragment of `obj` flattened with `options`,
+        or None if there is none.
+        """
+        key = id(obj)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is obj and options in entry[1]:
+                # move to the most recently used end
+                del self._entries[key]
+                self._entries[key] = entry
+                self.hits += 1
+                return entry[1][options]
+            self.misses += 1
+        return None
+
+    def put(self, obj, options, data):
+        """Store `data` as the fragment of `obj` flattened with `options`
+        and return it.
+        """
+        key = id(obj)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or entry[0] is not obj:
+                entry = [obj, {}]
+            entry[1][options] = data
+            self._entries[key] = entry
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return data
+
+    def invalidate(self, obj=None):
+        """Drop the cached fragment of `obj`, or every fragment if `obj` is
+        None.  Must be called whenever an immutable object is mutated.
+        """
+        with self._lock:
+            if obj is None:
+                self._entries.clear()
+                return
+            entry = self._entries.get(id(obj))
+            if entry is not None and entry[0] is obj:
+                del self._entries[id(obj)]
+
+    def invalidate_class(self, cls):
+        """Drop the cached fragments of all instances of `cls`."""
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if type(entry[0]) is cls:
+                    del self._entries[key]
+
+    def clear(self):
+        """Drop every fragment and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Returns the cache counters as a dict."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class _StrongRef(object):
+    """Holds an object which does not support weak references, with the
+    interface of a weak reference.
+    """
+    __slots__ = 'obj',
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __call__(self):
+        return self.obj
+
+
+## The cache used by jsonstruct.encode()
+default_cache = FragmentCache()
+
+
+def immutable(cls):
+    """Class decorator marking instances of `cls` as immutable, so that
+    jsonstruct.encode() caches their flattened form.
+    """
+    return default_cache.register(cls)
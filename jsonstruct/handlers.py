@@ -4,7 +4,11 @@ must derive from BaseHandler and override ``.flatten`` and
 ``.restore``.
 
 The handler may also declare a ``_handles`` class property which
-should be a sequence of types handled by that handler. See the `mod:_handlers`
+should be a sequence of types handled by that handler.  A handler also
+handles subclasses of those types, unless a handler is registered for the
+subclass itself.  Subclasses of dict, list, set and tuple, such as those
+of OrderedDict, are left to the generic path unless a handler is
+registered for them exactly. See the `mod:_handlers`
 module for more examples of internal handlers implemented in jsonstruct.
 
 A handler may also be late-bound to other types by calling the ``.handles``
@@ -20,6 +24,17 @@ the reduce protocol::
             return MyCustomObject, self._get_args()
 """
 
+## Maps types to the handler class resolved along their MRO, or to None
+_resolved = {}
+
+## Types whose subclasses do not inherit the handlers of their bases
+_COLLECTIONS = (dict, list, set, tuple)
+
+## Incremented whenever a handler is registered, so that caches depending
+## on the registry can tell they are stale
+generation = 0
+
+
 class TypeRegistered(type):
     """
     As classes of this metaclass are created, they keep a registry in the
@@ -37,7 +52,11 @@ class TypeRegistered(type):
         """
         Register this handler for the given class
         """
+        global generation
         handler._registry[cls] = handler
+        # subclasses of cls may resolve to this handler now
+        _resolved.clear()
+        generation += 1
         return cls
 
 class BaseHandler(object):
@@ -47,6 +66,10 @@ class BaseHandler(object):
 
     __metaclass__ = TypeRegistered
 
+    ## Keys of the dicts the handler flattens to, any of which marks a dict
+    ## as its payload for a typed decode; empty if any dict is
+    _payload_keys = ()
+
     def __init__(self, base):
         """
         Initialize a new handler to handle `type`.
@@ -77,6 +100,95 @@ class BaseHandler(object):
         """
         raise NotImplementedError("Abstract method.")
 
+    def restore_typed(self, obj, cls_def):
+        """
+        Restores the `obj` for a typed decode.
+
+        Handlers that flatten to something other than a dict when
+        unpicklable is False override this to read that form back.  The
+        default restores its payload dicts with `restore` and returns None,
+        a type mismatch, for anything else, including dicts without any of
+        the `_payload_keys`.
+
+        :Parameters:
+          - `obj`: json-friendly object
+          - `cls_def`: either the handled type, or a prototype instance of
+            it, e.g. the ``array('d')`` in ``samples = array('d')``
+
+        """
+        if type(obj) is dict and self.is_payload(obj):
+            return self.restore(obj)
+        return None
+
+    def is_payload(self, obj):
+        """
+        Returns True if the dict `obj` holds a flattened value of this
+        handler, i.e. has any of its `_payload_keys`.
+        """
+        keys = self._payload_keys
+        if not keys:
+            return True
+        for key in keys:
+            if key in obj:
+                return True
+        return False
+
+    def flatten_many(self, objs):
+        """
+        Flatten a list of objects, all of the same handled type.
+
+        The pickler calls this instead of `flatten` for each item when
+        unpicklable is False, so that handlers can process the whole list
+        at once.  The default calls `flatten` for each item.
+
+        :Parameters:
+          - `objs`: list of objects of the same `type`
+
+        """
+        new_obj_data = self._base._new_obj_data
+        return [self.flatten(obj, new_obj_data(obj)) for obj in objs]
+
+    def restore_many(self, objs, cls_def):
+        """
+        Restores a list of json-friendly objects for a typed decode of a
+        list of `cls_def`, e.g. ``stamps = [datetime(1970, 1, 1)]``.
+
+        The unpickler calls this instead of `restore_typed` for each item
+        when none of the items is a dict.  The default calls
+        `restore_typed` for each item and keeps None as is.
+
+        :Parameters:
+          - `objs`: list of json-friendly objects
+          - `cls_def`: as for `restore_typed`
+
+        """
+        restore_typed = self.restore_typed
+        return [None if obj is None else restore_typed(obj, cls_def)
+                for obj in objs]
+
+def get(cls):
+    """
+    Returns the handler class registered for `cls` or for the nearest of
+    its base classes, or None.  Subclasses of dict, list, set and tuple
+    only get a handler registered for themselves.  Results, including
+    misses, are cached until a handler is registered.
+    """
+    try:
+        return _resolved[cls]
+    except KeyError:
+        pass
+    registry = BaseHandler._registry
+    HandlerClass = registry.get(cls)
+    if HandlerClass is None and not (isinstance(cls, type) and
+                                     issubclass(cls, _COLLECTIONS)):
+        # old-style classes have no __mro__
+        for base in getattr(cls, '__mro__', (cls,))[1:]:
+            HandlerClass = registry.get(base)
+            if HandlerClass is not None:
+                break
+    _resolved[cls] = HandlerClass
+    return HandlerClass
+
 # for backward compatibility, provide 'registry'
 # josnpickle 0.4 clients will call it with something like:
 # registry.register(handled_type, handler_class)
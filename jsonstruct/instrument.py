@@ -0,0 +1,446 @@
+"""Opt-in statistics about encoding and decoding.
+
+enable() makes jsonstruct.encode() and decode() use instrumented
+subclasses of the Pickler and the Unpickler, which count and time the
+instances flattened and restored by class, count the handlers used, and
+record the size of the reference tables and the deepest nesting.  Each
+encode() and decode() also splits its time between the traversal and the
+JSON backend.  When disabled, encode() and decode() use the plain classes,
+so Pickler.flatten() and Unpickler.restore() are not slowed down at all.
+
+    >>> import jsonstruct
+    >>> class Address(object):
+    ...     city = ""
+    >>> enable()
+    >>> address = jsonstruct.decode('{"city": "Toronto"}', Address)
+    >>> totals = jsonstruct.stats()
+    >>> totals['calls']['decode'], totals['restore'][
+    ...     'jsonstruct.instrument.Address']['count']
+    (1, 1)
+    >>> disable()
+    >>> jsonstruct.stats() is None
+    True
+
+The times of a class include the nested objects.  Instances restored by
+generated decoders, see jsonstruct.codegen, are counted under the class
+given to decode() only.
+
+A callback passed to enable() is called after every call as
+callback(op, stats), where op is 'encode', 'decode', 'flatten' or
+'restore' and stats holds the counters of that call alone, in the form
+stats() returns.
+"""
+
+import sys
+import threading
+import time
+
+import jsonstruct.tracing as tracing
+import jsonstruct.util as util
+from jsonstruct.pickler import Pickler
+from jsonstruct.unpickler import Unpickler
+
+## The timer of the recorded times
+_timer = getattr(time, 'perf_counter', time.time)
+
+## The Recorder of the calls while enabled, or None
+recorder = None
+
+
+class Stats(object):
+    """Counters of one call, or of all calls."""
+
+    def __init__(self):
+        ## Calls by operation
+        self.calls = {}
+        ## [count, seconds] of the instances flattened and restored by class
+        self.flatten = {}
+        self.restore = {}
+        ## Uses by handler class
+        self.handlers = {}
+        self.traversal_seconds = 0.0
+        self.backend_seconds = 0.0
+        ## The largest reference table of a call
+        self.max_refs = 0
+        ## The deepest nesting of a call, the top-level object being 1
+        self.max_depth = 0
+
+    def merge(self, other):
+        for op, count in other.calls.items():
+            self.calls[op] = self.calls.get(op, 0) + count
+        for mine, theirs in ((self.flatten, other.flatten),
+                             (self.restore, other.restore)):
+            for cls, (count, seconds) in theirs.items():
+                entry = mine.get(cls)
+                if entry is None:
+                    mine[cls] = [count, seconds]
+                else:
+                    entry[0] += count
+                    entry[1] += seconds
+        for cls, count in other.handlers.items():
+            self.handlers[cls] = self.handlers.get(cls, 0) + count
+        self.traversal_seconds += other.traversal_seconds
+        self.backend_seconds += other.backend_seconds
+        self.max_refs = max(self.max_refs, other.max_refs)
+        self.max_depth = max(self.max_depth, other.max_depth)
+
+    def as_dict(self):
+        """Returns the counters as a dict, with classes by path."""
+        return {
+            'calls': dict(self.calls),
+            'flatten': _by_path(self.flatten),
+            'restore': _by_path(self.restore),
+            'handlers': dict((_path(cls), count)
+                             for cls, count in self.handlers.items()),
+            'traversal_seconds': self.traversal_seconds,
+            'backend_seconds': self.backend_seconds,
+            'max_refs': self.max_refs,
+            'max_depth': self.max_depth,
+        }
+
+
+def _path(cls):
+    return '%s.%s' % (cls.__module__, cls.__name__)
+
+
+def _by_path(entries):
+    return dict((_path(cls), {'count': count, 'seconds': seconds})
+                for cls, (count, seconds) in entries.items())
+
+
+def _add(entries, cls, seconds):
+    entry = entries.get(cls)
+    if entry is None:
+        entries[cls] = [1, seconds]
+    else:
+        entry[0] += 1
+        entry[1] += seconds
+
+
+class Recorder(object):
+    """Accumulates the Stats of calls, from any thread."""
+
+    def __init__(self, callback=None):
+        self.totals = Stats()
+        self.callback = callback
+        self._lock = threading.Lock()
+        ## The Stats of the call in progress in each thread
+        self._local = threading.local()
+
+    def current(self):
+        """Returns the Stats of the call in progress in this thread."""
+        return getattr(self._local, 'call', None)
+
+    def begin(self):
+        call = self._local.call = Stats()
+        return call
+
+    def end(self, op, call):
+        self._local.call = None
+        call.calls[op] = 1
+        with self._lock:
+            self.totals.merge(call)
+        if self.callback is not None:
+            self.callback(op, call.as_dict())
+
+    def reset(self):
+        with self._lock:
+            totals, self.totals = self.totals, Stats()
+        return totals
+
+
+def encode(pickler, encode_flat, value):
+    """Runs jsonstruct.encode() with pickler and the backend function,
+    recording the call in the enabled Recorder and tracing it.
+    """
+    rec = recorder
+    trace = tracing.active
+    cls = type(value)
+    call = rec.begin() if rec is not None else None
+    ## The inner span in progress
+    op = None
+    try:
+        start = middle = _timer()
+        if trace is not None:
+            trace.start('encode', cls)
+            trace.start('encode.flatten', cls)
+            op = 'encode.flatten'
+        flat = pickler.flatten(value)
+        middle = _timer()
+        if trace is not None:
+            trace.end('encode.flatten', cls, None, middle - start)
+            trace.start('encode.backend', cls)
+            op = 'encode.backend'
+        encoded = pickler.splice_raw_json(encode_flat(flat))
+        end = _timer()
+    except BaseException:
+        if op is not None:
+            _fail(trace, ('encode', op), cls, None, start, middle)
+        raise
+    finally:
+        if rec is not None:
+            rec._local.call = None
+    if trace is not None:
+        bytes = tracing.size(encoded)
+        trace.end('encode.backend', cls, bytes, end - middle)
+        trace.end('encode', cls, bytes, end - start)
+    if call is not None:
+        call.traversal_seconds = middle - start
+        call.backend_seconds = end - middle
+        rec.end('encode', call)
+    return encoded
+
+
+def decode(unpickler, decode_string, string, cls, raw=False):
+    """Runs jsonstruct.decode() with unpickler and the backend function,
+    recording the call in the enabled Recorder and tracing it.  If raw,
+    the string is restored by Unpickler.restore_raw(), which parses it
+    along the way: the values it hands to the backend count as backend
+    time, and are traced as 'decode.backend' spans within the
+    'decode.restore' span, and the scanning of the objects leading to raw
+    attributes as traversal.
+    """
+    rec = recorder
+    trace = tracing.active
+    bytes = tracing.size(string)
+    call = rec.begin() if rec is not None else None
+    ## The inner span in progress
+    op = None
+    try:
+        start = middle = _timer()
+        if trace is not None:
+            trace.start('decode', cls)
+            op = 'decode'
+        parsed = [0.0]
+        if raw:
+            restore = unpickler.restore_raw
+            data = string
+            args = (cls, _timed(decode_string, parsed, trace, cls))
+        else:
+            if trace is not None:
+                trace.start('decode.backend', cls)
+                op = 'decode.backend'
+            data = decode_string(string)
+            middle = _timer()
+            if trace is not None:
+                trace.end('decode.backend', cls, bytes, middle - start)
+            restore = unpickler.restore
+            args = (cls,)
+        if trace is not None:
+            trace.start('decode.restore', cls)
+            op = 'decode.restore'
+        value = restore(data, *args)
+        end = _timer()
+    except BaseException:
+        if op is not None:
+            _fail(trace, ('decode', op), cls, bytes, start, middle)
+        raise
+    finally:
+        if rec is not None:
+            rec._local.call = None
+    if trace is not None:
+        if cls is None:
+            cls = type(value)
+        trace.end('decode.restore', cls, bytes, end - middle)
+        trace.end('decode', cls, bytes, end - start)
+    if call is not None:
+        call.backend_seconds = middle - start + parsed[0]
+        call.traversal_seconds = end - middle - parsed[0]
+        rec.end('decode', call)
+    return value
+
+
+def _fail(trace, ops, cls, bytes, start, middle):
+    """Ends the spans of ops, the whole call and the inner span in
+    progress, with the exception being handled as their error.
+    """
+    error = sys.exc_info()[1]
+    end = _timer()
+    call, op = ops
+    if op != call:
+        trace.end(op, cls, bytes, end - middle, error)
+    trace.end(call, cls, bytes, end - start, error)
+
+
+def _timed(decode_string, seconds, trace=None, cls=None):
+    """Returns decode_string adding the time of its calls to seconds[0]
+    and tracing them as 'decode.backend' spans.
+    """
+    def decode(string):
+        bytes = None
+        if trace is not None:
+            bytes = tracing.size(string)
+            trace.start('decode.backend', cls)
+        start = _timer()
+        try:
+            value = decode_string(string)
+        except BaseException:
+            duration = _timer() - start
+            seconds[0] += duration
+            if trace is not None:
+                trace.end('decode.backend', cls, bytes, duration,
+                          sys.exc_info()[1])
+            raise
+        duration = _timer() - start
+        seconds[0] += duration
+        if trace is not None:
+            trace.end('decode.backend', cls, bytes, duration)
+        return value
+    return decode
+
+
+def _record(op, func, *args):
+    """Calls func, recording it as a call of its own unless it is part of
+    a recorded encode() or decode().
+    """
+    rec = recorder
+    if rec is None or rec.current() is not None:
+        return func(*args)
+    call = rec.begin()
+    start = _timer()
+    try:
+        value = func(*args)
+    finally:
+        rec._local.call = None
+    call.traversal_seconds = _timer() - start
+    rec.end(op, call)
+    return value
+
+
+def _current_call():
+    rec = recorder
+    call = rec.current() if rec is not None else None
+    if call is None:
+        # recorded nowhere, e.g. after disable()
+        call = Stats()
+    return call
+
+
+class InstrumentedPickler(Pickler):
+    """A Pickler recording its calls in the enabled Recorder."""
+
+    def _new_context(self):
+        context = super(InstrumentedPickler, self)._new_context()
+        context._call = _current_call()
+        return context
+
+    def flatten(self, obj):
+        if self._context:
+            return super(InstrumentedPickler, self).flatten(obj)
+        return _record('flatten', super(InstrumentedPickler, self).flatten,
+                       obj)
+
+    def _push(self):
+        self._depth += 1
+        if self._depth >= self._call.max_depth:
+            self._call.max_depth = self._depth + 1
+
+    def _reset(self):
+        if len(self._objs) > self._call.max_refs:
+            self._call.max_refs = len(self._objs)
+        super(InstrumentedPickler, self)._reset()
+
+    def _flatten_obj_instance(self, obj):
+        start = _timer()
+        data = super(InstrumentedPickler, self)._flatten_obj_instance(obj)
+        _add(self._call.flatten, type(obj), _timer() - start)
+        return data
+
+    def _get_handler(self, cls):
+        handler = super(InstrumentedPickler, self)._get_handler(cls)
+        if handler is not None:
+            handlers = self._call.handlers
+            handlers[type(handler)] = handlers.get(type(handler), 0) + 1
+        return handler
+
+
+class InstrumentedUnpickler(Unpickler):
+    """An Unpickler recording its calls in the enabled Recorder."""
+
+    def _new_context(self):
+        context = super(InstrumentedUnpickler, self)._new_context()
+        context._call = _current_call()
+        return context
+
+    def restore(self, obj, cls_def=None):
+        restore = super(InstrumentedUnpickler, self).restore
+        if not self._context:
+            return _record('restore', restore, obj, cls_def)
+        if not util.is_type(cls_def):
+            return restore(obj, cls_def)
+        start = _timer()
+        value = restore(obj, cls_def)
+        _add(self._call.restore, cls_def, _timer() - start)
+        return value
+
+    def restore_into(self, instance, obj, cls_def=None):
+        restore_into = super(InstrumentedUnpickler, self).restore_into
+        if self._context:
+            return restore_into(instance, obj, cls_def)
+        return _record('restore', restore_into, instance, obj, cls_def)
+
+    def restore_raw(self, string, cls_def, decoder):
+        restore_raw = super(InstrumentedUnpickler, self).restore_raw
+        if self._context:
+            return restore_raw(string, cls_def, decoder)
+        return _record('restore', restore_raw, string, cls_def, decoder)
+
+    def _push(self):
+        self._depth += 1
+        if self._depth > self._call.max_depth:
+            self._call.max_depth = self._depth
+
+    def _reset(self):
+        if len(self._objs) > self._call.max_refs:
+            self._call.max_refs = len(self._objs)
+        super(InstrumentedUnpickler, self)._reset()
+
+    def _get_handler(self, cls):
+        handler = super(InstrumentedUnpickler, self)._get_handler(cls)
+        if handler is not None:
+            handlers = self._call.handlers
+            handlers[type(handler)] = handlers.get(type(handler), 0) + 1
+        return handler
+
+
+def enable(callback=None):
+    """Starts recording the calls of jsonstruct.encode() and decode(),
+    discarding the statistics recorded so far.
+    """
+    global recorder
+    recorder = Recorder(callback)
+    _install(InstrumentedPickler, InstrumentedUnpickler)
+
+
+def disable():
+    """Stops recording and drops the statistics."""
+    global recorder
+    recorder = None
+    _install(Pickler, Unpickler)
+
+
+def _install(pickler_class, unpickler_class):
+    import jsonstruct
+    jsonstruct._pickler_class = pickler_class
+    jsonstruct._unpickler_class = unpickler_class
+    jsonstruct._picklers.clear()
+    jsonstruct._unpicklers.clear()
+
+
+def stats(reset=False):
+    """Returns the statistics recorded since enable() as a dict, or None
+    if recording is disabled.  Setting reset to True starts over.
+
+    The dict holds 'calls' by operation, 'flatten' and 'restore' counts
+    and seconds by class path, 'handlers' uses by handler class path,
+    'traversal_seconds' and 'backend_seconds', and 'max_refs' and
+    'max_depth', the largest reference table and the deepest nesting of
+    a call.
+    """
+    rec = recorder
+    if rec is None:
+        return None
+    if reset:
+        return rec.reset().as_dict()
+    with rec._lock:
+        return rec.totals.as_dict()
@@ -0,0 +1,352 @@
+"""ISO 8601 formatting and parsing of dates, times and durations.
+
+The formatter and the parser are hand-written for the forms jsonstruct
+produces, which is much faster than strptime() or a regular expression.
+
+    >>> import datetime
+    >>> isoformat(datetime.datetime(2013, 5, 1, 12, 30, 15, 250000))
+    '2013-05-01T12:30:15.250000'
+    >>> parse('2013-05-01T12:30:15.25Z', datetime.datetime)
+    datetime.datetime(2013, 5, 1, 12, 30, 15, 250000, tzinfo=FixedOffset(0))
+    >>> isoformat(datetime.timedelta(days=1, minutes=90))
+    'P1DT1H30M'
+
+The parser also reads the output of str(), which jsonstruct has always
+produced for dates when unpicklable is False.
+
+    >>> parse('2013-05-01 12:30:15', datetime.datetime)
+    datetime.datetime(2013, 5, 1, 12, 30, 15)
+    >>> parse('1 day, 1:30:00', datetime.timedelta)
+    datetime.timedelta(1, 5400)
+
+"""
+
+import datetime
+
+from jsonstruct.compat import unicode
+
+ZERO = datetime.timedelta(0)
+
+
+class FixedOffset(datetime.tzinfo):
+    """A fixed offset from UTC, in minutes east of UTC."""
+
+    def __init__(self, minutes):
+        self._minutes = minutes
+        self._offset = datetime.timedelta(minutes=minutes)
+
+    def utcoffset(self, dt):
+        return self._offset
+
+    def dst(self, dt):
+        return ZERO
+
+    def tzname(self, dt):
+        return _format_offset(self._minutes)
+
+    def __getinitargs__(self):
+        return (self._minutes,)
+
+    def __repr__(self):
+        return 'FixedOffset(%d)' % self._minutes
+
+    def __eq__(self, other):
+        return (isinstance(other, FixedOffset) and
+                self._minutes == other._minutes)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._minutes)
+
+
+UTC = FixedOffset(0)
+
+## FixedOffset instances by minutes, shared between parsed values
+_offsets = {0: UTC}
+
+
+def isoformat(obj):
+    """Returns the ISO 8601 form of a datetime, date, time or timedelta.
+
+    >>> isoformat(datetime.time(8, 5, tzinfo=FixedOffset(-150)))
+    '08:05:00-02:30'
+    >>> isoformat(-datetime.timedelta(seconds=1.5))
+    '-PT1.500000S'
+    """
+    cls = type(obj)
+    if issubclass(cls, datetime.datetime):
+        text = '%04d-%02d-%02dT%02d:%02d:%02d' % (
+                obj.year, obj.month, obj.day,
+                obj.hour, obj.minute, obj.second)
+        if obj.microsecond:
+            text += '.%06d' % obj.microsecond
+        if obj.tzinfo is not None:
+            text += _format_utcoffset(obj.utcoffset())
+        return text
+    if issubclass(cls, datetime.date):
+        return '%04d-%02d-%02d' % (obj.year, obj.month, obj.day)
+    if issubclass(cls, datetime.time):
+        text = '%02d:%02d:%02d' % (obj.hour, obj.minute, obj.second)
+        if obj.microsecond:
+            text += '.%06d' % obj.microsecond
+        if obj.tzinfo is not None:
+            text += _format_utcoffset(obj.utcoffset())
+        return text
+    if issubclass(cls, datetime.timedelta):
+        return _format_timedelta(obj)
+    raise TypeError('Cannot format %r as ISO 8601' % (obj,))
+
+
+def _format_utcoffset(offset):
+    if offset is None:
+        return ''
+    return _format_offset(offset.days * 1440 + offset.seconds // 60)
+
+
+def _format_offset(minutes):
+    if minutes < 0:
+        sign = '-'
+        minutes = -minutes
+    else:
+        sign = '+'
+    return '%s%02d:%02d' % (sign, minutes // 60, minutes % 60)
+
+
+def _format_timedelta(obj):
+    if obj < ZERO:
+        text = '-P'
+        obj = -obj
+    else:
+        text = 'P'
+    days, seconds, microseconds = obj.days, obj.seconds, obj.microseconds
+    if days:
+        text += '%dD' % days
+    if seconds or microseconds or not days:
+        hours, seconds = divmod(seconds, 3600)
+        minutes, seconds = divmod(seconds, 60)
+        text += 'T'
+        if hours:
+            text += '%dH' % hours
+        if minutes:
+            text += '%dM' % minutes
+        if microseconds:
+            text += '%d.%06dS' % (seconds, microseconds)
+        elif seconds or not (hours or minutes):
+            text += '%dS' % seconds
+    return text
+
+
+def parse(text, cls):
+    """Parses `text` into an instance of `cls`, which is datetime, date,
+    time or timedelta, or a subclass of them.  Raises ValueError if `text`
+    is not in one of the supported forms.
+
+    Dates are YYYY-MM-DD.  Times are hh:mm[:ss[.ffffff]] followed by an
+    optional Z or +hh:mm offset.  Datetimes join both with a T or a space,
+    and may omit the time.  Timedeltas are ISO 8601 durations using weeks,
+    days, hours, minutes and seconds, or the output of str().
+
+    >>> parse('2013-05-01', datetime.date)
+    datetime.date(2013, 5, 1)
+    >>> parse('P1W', datetime.timedelta)
+    datetime.timedelta(7)
+    >>> parse('12:30+0530', datetime.time)
+    datetime.time(12, 30, tzinfo=FixedOffset(330))
+    >>> parse('2013-02-30', datetime.date)
+    Traceback (most recent call last):
+    ...
+    ValueError: day is out of range for month
+    """
+    if not isinstance(text, (str, unicode)):
+        raise ValueError('Expecting a string, got %r' % (text,))
+    return _parser(cls)(text, cls)
+
+
+def parse_many(texts, cls):
+    """Parses each of `texts` into an instance of `cls`, see parse().
+    Values which are not strings or cannot be parsed give None.
+
+    >>> parse_many(['12:30', None, 'noon'], datetime.time)
+    [datetime.time(12, 30), None, None]
+    """
+    parser = _parser(cls)
+    values = []
+    append = values.append
+    for text in texts:
+        if isinstance(text, (str, unicode)):
+            try:
+                append(parser(text, cls))
+                continue
+            except ValueError:
+                pass
+        append(None)
+    return values
+
+
+def _parser(cls):
+    if issubclass(cls, datetime.datetime):
+        return _parse_datetime
+    if issubclass(cls, datetime.date):
+        return _parse_date_value
+    if issubclass(cls, datetime.time):
+        return _parse_time_value
+    if issubclass(cls, datetime.timedelta):
+        return _parse_timedelta
+    raise TypeError('Cannot parse ISO 8601 into %r' % (cls,))
+
+
+def _parse_datetime(text, cls):
+    length = len(text)
+    if ((length == 19 or length == 26 and text[19] == '.') and
+            text[4] == '-' and text[7] == '-' and text[10] in 'Tt ' and
+            text[13] == ':' and text[16] == ':'):
+        # the forms isoformat() and str() produce for naive datetimes
+        digits = (text[:4] + text[5:7] + text[8:10] + text[11:13] +
+                  text[14:16] + text[17:19] + text[20:])
+        if digits.isdigit():
+            return cls(int(digits[:4]), int(digits[4:6]), int(digits[6:8]),
+                       int(digits[8:10]), int(digits[10:12]),
+                       int(digits[12:14]), int(digits[14:] or 0))
+    if length == 10:
+        return cls(*_parse_date(text))
+    if text[10:11] not in ('T', 't', ' '):
+        raise ValueError('Invalid ISO 8601 datetime: %r' % text)
+    return cls(*(_parse_date(text[:10]) + _parse_time(text[11:])))
+
+
+def _parse_date_value(text, cls):
+    return cls(*_parse_date(text))
+
+
+def _parse_time_value(text, cls):
+    return cls(*_parse_time(text))
+
+
+def _parse_date(text):
+    if (len(text) != 10 or text[4] != '-' or text[7] != '-' or
+            not (text[:4] + text[5:7] + text[8:]).isdigit()):
+        raise ValueError('Invalid ISO 8601 date: %r' % text)
+    return int(text[:4]), int(text[5:7]), int(text[8:])
+
+
+def _parse_time(text):
+    """Returns (hour, minute, second, microsecond, tzinfo)."""
+    tzinfo = None
+    end = len(text)
+    if text[-1:] in ('Z', 'z'):
+        tzinfo = UTC
+        end -= 1
+    else:
+        sign = max(text.rfind('+'), text.rfind('-'))
+        if sign > 0:
+            tzinfo = _parse_offset(text[sign:])
+            end = sign
+
+    second = microsecond = 0
+    if end < 5 or text[2] != ':':
+        raise ValueError('Invalid ISO 8601 time: %r' % text)
+    digits = text[:2] + text[3:5]
+    if end > 5:
+        if end < 8 or text[5] != ':':
+            raise ValueError('Invalid ISO 8601 time: %r' % text)
+        digits += text[6:8]
+        second = int(text[6:8])
+        if end > 8:
+            fraction = text[9:end]
+            if text[8] not in ('.', ',') or not fraction.isdigit():
+                raise ValueError('Invalid ISO 8601 time: %r' % text)
+            microsecond = int(fraction[:6].ljust(6, '0'))
+    if not digits.isdigit():
+        raise ValueError('Invalid ISO 8601 time: %r' % text)
+    return int(text[:2]), int(text[3:5]), second, microsecond, tzinfo
+
+
+def _parse_offset(text):
+    """Parses +hh, +hhmm or +hh:mm into a FixedOffset."""
+    digits = text[1:].replace(':', '', 1)
+    if len(digits) not in (2, 4) or not digits.isdigit():
+        raise ValueError('Invalid UTC offset: %r' % text)
+    minutes = int(digits[:2]) * 60 + int(digits[2:] or 0)
+    if text[0] == '-':
+        minutes = -minutes
+    tzinfo = _offsets.get(minutes)
+    if tzinfo is None:
+        tzinfo = _offsets.setdefault(minutes, FixedOffset(minutes))
+    return tzinfo
+
+
+## Seconds per unit of an ISO 8601 duration, in the date and time parts
+_DATE_UNITS = {'W': 604800, 'D': 86400}
+_TIME_UNITS = {'H': 3600, 'M': 60, 'S': 1}
+
+
+def _parse_timedelta(text, cls):
+    negative = text[:1] == '-'
+    body = text[1:] if negative or text[:1] == '+' else text
+    if body[:1] in ('P', 'p'):
+        days, seconds, microseconds = _parse_duration(body[1:], text)
+    else:
+        days, seconds, microseconds = _parse_str_timedelta(text)
+        negative = False
+    value = cls(days, seconds, microseconds)
+    if negative:
+        value = -value
+    return value
+
+
+def _parse_duration(body, text):
+    """Parses the part of an ISO 8601 duration after the P into (days,
+    seconds, microseconds), which timedelta() normalizes."""
+    seconds = microseconds = 0
+    units = _DATE_UNITS
+    number = ''
+    fraction = None
+    for c in body.upper():
+        if c.isdigit():
+            if fraction is None:
+                number += c
+            else:
+                fraction += c
+        elif c in ('.', ',') and fraction is None and number:
+            fraction = ''
+        elif c == 'T' and units is _DATE_UNITS and not number:
+            units = _TIME_UNITS
+        elif c in units and number:
+            seconds += int(number) * units[c]
+            if fraction:
+                scaled = int(fraction[:6].ljust(6, '0')) * units[c]
+                microseconds += scaled % 1000000
+                seconds += scaled // 1000000
+            elif fraction is not None:
+                raise ValueError('Invalid ISO 8601 duration: %r' % text)
+            number = ''
+            fraction = None
+        else:
+            raise ValueError('Invalid ISO 8601 duration: %r' % text)
+    if number or not body or body.upper().endswith('T'):
+        raise ValueError('Invalid ISO 8601 duration: %r' % text)
+    return 0, seconds, microseconds
+
+
+def _parse_str_timedelta(text):
+    """Parses '[-]D day[s], h:mm:ss[.ffffff]' as produced by str()."""
+    days = 0
+    clock = text
+    if ',' in text:
+        head, clock = text.split(',', 1)
+        parts = head.split()
+        if len(parts) != 2 or parts[1] not in ('day', 'days'):
+            raise ValueError('Invalid timedelta: %r' % text)
+        days = int(parts[0])
+        clock = clock.strip()
+    hours, sep, rest = clock.partition(':')
+    if not sep or not hours.isdigit() or len(rest) < 5 or rest[2] != ':':
+        raise ValueError('Invalid timedelta: %r' % text)
+    hour, minute, second, microsecond, tzinfo = _parse_time(
+            '00:' + rest)
+    if tzinfo is not None:
+        raise ValueError('Invalid timedelta: %r' % text)
+    seconds = int(hours) * 3600 + minute * 60 + second
+    return days, seconds, microsecond
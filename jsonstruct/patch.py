@@ -0,0 +1,265 @@
+"""Delta encoding between object snapshots.
+
+diff() flattens two snapshots with the Pickler and returns the RFC 6902
+JSON Patch that turns the first into the second.  apply_patch() applies such
+a patch to the flattened form of an object and restores the result with the
+typed semantics of the Unpickler.
+
+    >>> class Address(object):
+    ...     city = ""
+    ...     province = ""
+    >>> old = Address()
+    >>> old.city, old.province = 'Toronto', 'Ontario'
+    >>> new = Address()
+    >>> new.city, new.province = 'Markham', 'Ontario'
+    >>> patch = diff(old, new)
+    >>> patch
+    [{'path': '/city', 'value': 'Markham', 'op': 'replace'}]
+    >>> apply_patch(old, patch).city
+    'Markham'
+
+"""
+
+import jsonstruct.util as util
+from jsonstruct.compat import unicode
+from jsonstruct.pickler import Pickler
+from jsonstruct.unpickler import Unpickler
+
+
+class _SnapshotPickler(Pickler):
+    """A Pickler which leaves RawJSON fragments in place, so that they are
+    compared by their text and spliced when the patch is encoded.
+    """
+
+    def _flatten_raw_json(self, obj):
+        return obj
+
+
+def flatten(obj, is_filter_none_attr=True):
+    """Returns the flattened form of `obj` used for diffing."""
+    # the Unpickler restores plain dicts only
+    pickler = _SnapshotPickler(unpicklable=False,
+                               is_filter_none_attr=is_filter_none_attr,
+                               plain_dicts=True)
+    return pickler.flatten(obj)
+
+
+def diff(old, new, is_filter_none_attr=True):
+    """Returns a JSON Patch (a list of operation dicts) turning the flattened
+    form of `old` into the flattened form of `new`.
+
+    >>> diff({'a': 1, 'b': [1, 2]}, {'b': [1]})
+    [{'path': '/a', 'op': 'remove'}, {'path': '/b/1', 'op': 'remove'}]
+    """
+    ops = []
+    _diff(flatten(old, is_filter_none_attr),
+          flatten(new, is_filter_none_attr), '', ops)
+    return ops
+
+
+def _diff(old, new, path, ops):
+    if old is new:
+        return
+
+    if isinstance(old, dict) and isinstance(new, dict):
+        for k in sorted(old):
+            if k not in new:
+                ops.append({'op': 'remove', 'path': _join(path, k)})
+        for k in sorted(new):
+            if k in old:
+                _diff(old[k], new[k], _join(path, k), ops)
+            else:
+                ops.append({'op': 'add', 'path': _join(path, k),
+                            'value': new[k]})
+        return
+
+    if type(old) is list and type(new) is list:
+        common = min(len(old), len(new))
+        for i in range(common):
+            _diff(old[i], new[i], _join(path, i), ops)
+        # remove from the end so that the indices stay valid
+        for i in range(len(old) - 1, common - 1, -1):
+            ops.append({'op': 'remove', 'path': _join(path, i)})
+        for i in range(common, len(new)):
+            ops.append({'op': 'add', 'path': _join(path, i),
+                        'value': new[i]})
+        return
+
+    if not _equal(old, new):
+        ops.append({'op': 'replace', 'path': path, 'value': new})
+
+
+def _equal(a, b):
+    """Compares flattened values as JSON does.
+
+    >>> _equal([1, {'a': None}], [1, {'a': None}])
+    True
+    >>> _equal(True, 1), _equal({'a': 0}, {'a': False})
+    (False, False)
+    """
+    if isinstance(a, dict) and isinstance(b, dict):
+        return (len(a) == len(b) and
+                all(k in b and _equal(v, b[k]) for k, v in a.items()))
+    if type(a) is list and type(b) is list:
+        return (len(a) == len(b) and
+                all(_equal(x, y) for x, y in zip(a, b)))
+    # True == 1 in Python, but not in JSON
+    return (a == b and (type(a) is bool) == (type(b) is bool) and
+            (a is None) == (b is None))
+
+
+def _join(path, key):
+    """Appends `key` to the JSON pointer `path`.
+
+    >>> _join('/a', 'b/c~d')
+    '/a/b~1c~0d'
+    """
+    if not isinstance(key, (str, unicode)):
+        key = str(key)
+    return path + '/' + key.replace('~', '~0').replace('/', '~1')
+
+
+def _split(path):
+    """Splits a JSON pointer into its reference tokens.
+
+    >>> _split('/a/b~1c~0d')
+    ['a', 'b/c~d']
+    >>> _split('')
+    []
+    """
+    if not path:
+        return []
+    if not path.startswith('/'):
+        raise ValueError('Invalid JSON pointer: %r' % path)
+    return [token.replace('~1', '/').replace('~0', '~')
+            for token in path[1:].split('/')]
+
+
+def apply_patch(obj, patch, cls=None):
+    """Applies a JSON Patch to the flattened form of `obj` and returns the
+    result restored as an instance of `cls`, which defaults to the type of
+    `obj` for class instances.  `obj` itself is left untouched.
+
+    >>> apply_patch({'a': [1, 2]}, [{'op': 'add', 'path': '/a/-', 'value': 3}])
+    {'a': [1, 2, 3]}
+    """
+    if cls is None and not (util.is_primitive(obj) or
+                            util.is_container(obj)):
+        cls = type(obj)
+    doc = apply_to_document(flatten(obj), patch)
+    return Unpickler().restore(doc, cls)
+
+
+def apply_to_document(doc, patch):
+    """Applies a JSON Patch to a flattened document and returns the result.
+    Containers along the modified paths are copied, so `doc` is not
+    modified.
+    """
+    # the copies by id; keeping them here keeps their ids from being reused
+    copied = {}
+    for op in patch:
+        kind = op['op']
+        path = op['path']
+        if kind == 'test':
+            if not _equal(_get(doc, path), op['value']):
+                raise ValueError('Test failed at %r' % path)
+            continue
+        if kind == 'move':
+            value = _get(doc, op['from'])
+            doc = _remove(doc, op['from'], copied)
+            doc = _add(doc, path, value, copied)
+        elif kind == 'copy':
+            # the copy must not share containers with its source
+            doc = _add(doc, path, _clone(_get(doc, op['from'])), copied)
+        elif kind == 'add':
+            doc = _add(doc, path, _clone(op['value']), copied)
+        elif kind == 'remove':
+            doc = _remove(doc, path, copied)
+        elif kind == 'replace':
+            doc = _remove(doc, path, copied)
+            doc = _add(doc, path, _clone(op['value']), copied)
+        else:
+            raise ValueError('Unknown patch operation: %r' % kind)
+    return doc
+
+
+def _get(doc, path):
+    for token in _split(path):
+        doc = doc[_index(doc, token)]
+    return doc
+
+
+def _index(container, token):
+    if type(container) is list:
+        try:
+            return int(token)
+        except ValueError:
+            raise ValueError('Invalid list index: %r' % token)
+    if isinstance(container, dict):
+        return token
+    raise ValueError('Cannot index into %r' % (container,))
+
+
+def _parent(doc, tokens, copied):
+    """Returns (doc, parent) where every container from the root to the
+    parent of the last token has been copied once.
+    """
+    doc = _copy(doc, copied)
+    parent = doc
+    for token in tokens[:-1]:
+        idx = _index(parent, token)
+        child = _copy(parent[idx], copied)
+        parent[idx] = child
+        parent = child
+    return doc, parent
+
+
+def _copy(container, copied):
+    if copied.get(id(container)) is container:
+        return container
+    if type(container) is list:
+        container = list(container)
+    elif isinstance(container, dict):
+        container = dict(container)
+    copied[id(container)] = container
+    return container
+
+
+def _clone(value):
+    """Returns a copy of the containers of a flattened value."""
+    if type(value) is list:
+        return [_clone(v) for v in value]
+    if isinstance(value, dict):
+        return dict((k, _clone(v)) for k, v in value.items())
+    return value
+
+
+def _add(doc, path, value, copied):
+    tokens = _split(path)
+    if not tokens:
+        return value
+    doc, parent = _parent(doc, tokens, copied)
+    token = tokens[-1]
+    if type(parent) is list:
+        if token == '-':
+            parent.append(value)
+        else:
+            idx = _index(parent, token)
+            if not 0 <= idx <= len(parent):
+                raise ValueError('Index out of range: %r' % path)
+            parent.insert(idx, value)
+    else:
+        parent[_index(parent, token)] = value
+    return doc
+
+
+def _remove(doc, path, copied):
+    tokens = _split(path)
+    if not tokens:
+        return None
+    doc, parent = _parent(doc, tokens, copied)
+    try:
+        del parent[_index(parent, tokens[-1])]
+    except (KeyError, IndexError):
+        raise ValueError('Nothing to remove at %r' % path)
+    return doc
@@ -8,9 +8,12 @@
 # This software is licensed as described in the file COPYING, which
 # you should have received as part of this distribution.
 import operator
+import threading
 import jsonstruct.util as util
 import jsonstruct.tags as tags
 import jsonstruct.handlers as handlers
+import jsonstruct.rawjson as rawjson
+import jsonstruct.codegen as _codegen
 from jsonstruct.compat import unicode
 
 
@@ -26,14 +29,47 @@ class Pickler(object):
     object.  Setting it to zero or higher places a hard limit
     on how deep jsonstruct recurses into objects, dictionaries, etc.
 
+    Setting iso8601 to True flattens dates, times and timedeltas into their
+    ISO 8601 form, e.g. '2013-05-01T12:30:00' and 'P1DT2H'.  Otherwise they
+    are str() when unpicklable is False.
+
+    Lists and dicts holding only primitives are copied in one step rather
+    than flattened item by item.  Setting reuse_containers to True returns
+    them as they are instead, for output that is encoded right away.
+
+    Instances are flattened into ObjDicts, which can be dict keys.  Setting
+    plain_dicts to True flattens them into plain dicts instead, which are
+    smaller and do not keep the instances alive, and only uses ObjDicts
+    for instances which are dict keys.
+
+    Setting codegen to True flattens instances with encoders generated for
+    their class, see jsonstruct.codegen.  It is ignored with a max_depth.
+
+    Passing a jsonstruct.fragments.FragmentCache as fragment_cache
+    reuses the flattened form of objects marked immutable.  The cache is
+    only consulted when unpicklable is False and there is no max_depth.
+
+    jsonstruct.RawJSON fragments are flattened into placeholder strings;
+    call splice_raw_json() on the encoded output to substitute them.
+
+    A Pickler can be shared between threads.  Each call to flatten() runs
+    on a context, a shallow copy of the pickler which shares its options
+    and caches and holds the state of the traversal.  The RawJSON
+    fragments of a thread are kept until it calls splice_raw_json().
+
     >>> p = Pickler()
     >>> p.flatten('hello world')
     'hello world'
     """
 
     def __init__(self, unpicklable=True, max_depth=None,
-            is_filter_none_attr=True):
+            is_filter_none_attr=True, fragment_cache=None, iso8601=False,
+            reuse_containers=False, plain_dicts=False, codegen=False):
         self.unpicklable = unpicklable
+        self.iso8601 = iso8601
+        self._reuse_containers = reuse_containers
+        ## Whether instances are flattened into dicts rather than ObjDicts
+        self._plain_dicts = plain_dicts
         ## The current recursion depth
         self._depth = -1
         ## The maximal recursion depth
@@ -42,10 +78,43 @@ class Pickler(object):
         self._is_filter_none_attr = is_filter_none_attr
         ## Maps id(obj) to reference IDs
         self._objs = {}
+        ## Cache of flattened immutable objects. Fragments are only valid
+        ## when they carry no references and no depth-limited reprs.
+        if unpicklable or (max_depth is not None and max_depth >= 0):
+            fragment_cache = None
+        self._fragment_cache = fragment_cache
+        ## Generated encoders, which do not limit the depth
+        if max_depth is not None and max_depth >= 0:
+            codegen = False
+        self._encoders = None
+        if codegen:
+            self._encoders = _codegen.default_encoders
+        ## RawJSON texts, indexed by the number in their placeholder
+        self._raw_fragments = []
+        self._raw_prefix = None
+        ## Handler instances by handler class
+        self._handlers = {}
+        ## Whether this is the context of a call rather than the pickler
+        self._context = False
+        ## The RawJSON fragments of each thread, between flatten() and
+        ## splice_raw_json()
+        self._local = threading.local()
 
     def _reset(self):
         self._objs = {}
 
+    def _new_context(self):
+        """Returns the context of a call to flatten()."""
+        context = object.__new__(self.__class__)
+        context.__dict__.update(self.__dict__)
+        context._context = True
+        context._objs = {}
+        context._handlers = {}
+        local = self._local
+        context._raw_prefix = getattr(local, 'raw_prefix', None)
+        context._raw_fragments = getattr(local, 'raw_fragments', None) or []
+        return context
+
     def _push(self):
         """Steps down one level in the namespace.
         """
@@ -104,6 +173,15 @@ class Pickler(object):
         >>> p.flatten({'key': 'value'})
         {'key': 'value'}
         """
+        if not self._context:
+            context = self._new_context()
+            flat = context.flatten(obj)
+            if context._raw_fragments:
+                local = self._local
+                local.raw_prefix = context._raw_prefix
+                local.raw_fragments = context._raw_fragments
+            return flat
+
         self._push()
 
         max_reached = self._depth == self._max_depth
@@ -116,7 +194,7 @@ class Pickler(object):
         if util.is_primitive(obj):
             return lambda obj: obj
 
-        list_recurse = lambda obj: [self.flatten(v) for v in obj]
+        list_recurse = self._flatten_list
 
         if util.is_list(obj):
             if self._mkref(obj):
@@ -129,12 +207,12 @@ class Pickler(object):
         if util.is_tuple(obj):
             if not self.unpicklable:
                 return list_recurse
-            return lambda obj: {tags.TUPLE: [self.flatten(v) for v in obj]}
+            return lambda obj: {tags.TUPLE: self._flatten_list(obj)}
 
         if util.is_set(obj):
             if not self.unpicklable:
                 return list_recurse
-            return lambda obj: {tags.SET: [self.flatten(v) for v in obj]}
+            return lambda obj: {tags.SET: self._flatten_list(obj)}
 
         if util.is_dictionary(obj):
             return self._flatten_dict_obj
@@ -142,46 +220,142 @@ class Pickler(object):
         if util.is_type(obj):
             return _mktyperef
 
+        if type(obj) is rawjson.RawJSON:
+            return self._flatten_raw_json
+
         if util.is_object(obj):
             return self._ref_obj_instance
 
         # else, what else? (methods, functions, old style classes...)
         return None
 
+    def _flatten_list(self, obj):
+        """Flatten the items of a list, a tuple or a set into a list.
+        """
+        if self._depth + 1 != self._max_depth:
+            if util.all_primitive(obj):
+                if self._reuse_containers and type(obj) is list:
+                    return obj
+                return list(obj)
+            if not self.unpicklable:
+                flat = self._flatten_handled_items(obj)
+                if flat is not None:
+                    return flat
+        return [self.flatten(v) for v in obj]
+
+    def _flatten_handled_items(self, obj):
+        """Return the items of obj flattened by their handler's
+        flatten_many(), or None unless they are all of one handled type.
+        """
+        for first in obj:
+            break
+        else:
+            return None
+        cls = type(first)
+        handler = self._get_handler(cls)
+        if handler is None:
+            return None
+        for v in obj:
+            if type(v) is not cls:
+                return None
+        if type(obj) is not list:
+            obj = list(obj)
+        # the items are one level down
+        self._push()
+        return self._pop(handler.flatten_many(obj))
+
     def _ref_obj_instance(self, obj):
         """Reference an existing object or flatten if new
         """
         if self._mkref(obj):
             # We've never seen this object so return its
             # json representation.
+            cache = self._fragment_cache
+            if cache is not None and cache.is_cacheable(obj):
+                return self._flatten_cached_obj_instance(obj, cache)
             return self._flatten_obj_instance(obj)
         # We've seen this object before so place an object
         # reference tag in the data. This avoids infinite recursion
         # when processing cyclical objects.
         return self._getref(obj)
 
+    def _flatten_cached_obj_instance(self, obj, cache):
+        """Return the cached flattened form of an immutable object,
+        flattening and caching it on a miss.
+        """
+        options = self._is_filter_none_attr
+        if self.iso8601:
+            options = (options, 'iso8601')
+        data = cache.get(obj, options)
+        if data is None:
+            num_raw = len(self._raw_fragments)
+            data = self._flatten_obj_instance(obj)
+            # placeholders are only meaningful to this pickler
+            if len(self._raw_fragments) == num_raw:
+                cache.put(obj, options, data)
+        return data
+
+    def _flatten_raw_json(self, obj):
+        """Return a placeholder string for a RawJSON fragment."""
+        if self._raw_prefix is None:
+            self._raw_prefix = rawjson.new_placeholder_prefix()
+        self._raw_fragments.append(obj.json)
+        return '%s%d' % (self._raw_prefix, len(self._raw_fragments) - 1)
+
+    def splice_raw_json(self, encoded):
+        """Substitute the RawJSON placeholders in `encoded`, the backend's
+        encoding of what this pickler flattened in the current thread, with
+        the fragments' text.
+
+        >>> from jsonstruct.rawjson import RawJSON
+        >>> p = Pickler()
+        >>> flat = p.flatten([RawJSON('{"a":1}')])
+        >>> p.splice_raw_json('["%s"]' % flat[0])
+        '[{"a":1}]'
+        """
+        local = self._local
+        fragments = getattr(local, 'raw_fragments', None)
+        if not fragments:
+            return encoded
+        local.raw_fragments = None
+        return rawjson.splice(encoded, local.raw_prefix, fragments)
+
     def _flatten_obj_instance(self, obj):
         """Recursively flatten an instance and return a json-friendly dict
         """
-        data = ObjDict(obj)
+        data = self._new_obj_data(obj)
+        if self._encoders is not None:
+            encoder = self._encoders.get(obj, self._is_filter_none_attr,
+                                         self.unpicklable)
+            if encoder is not None:
+                flat_obj = encoder(obj, data, self)
+                if flat_obj is None:
+                    encoder = self._encoders.regenerate(
+                        obj, self._is_filter_none_attr, self.unpicklable)
+                    if encoder is not None:
+                        flat_obj = encoder(obj, data, self)
+                if flat_obj is not None:
+                    return flat_obj
+
+        # Check for a custom handler, before inspecting the instance
+        handler = self._get_handler(type(obj))
+        if handler is not None and not util.is_module(obj):
+            if self.unpicklable:
+                data[tags.OBJECT] = '%s.%s' % _getclassdetail(obj)
+            flat_obj = handler.flatten(obj, data)
+            self._mkref(flat_obj)
+            return flat_obj
+
         has_class = hasattr(obj, '__class__')
         has_dict = hasattr(obj, '__dict__')
         has_slots = not has_dict and hasattr(obj, '__slots__')
         has_getstate = has_dict and hasattr(obj, '__getstate__')
         has_getstate_support = has_getstate and hasattr(obj, '__setstate__')
 
-        HandlerClass = handlers.BaseHandler._registry.get(type(obj))
-
         if has_class and not util.is_module(obj):
             module, name = _getclassdetail(obj)
             if self.unpicklable:
                 data[tags.OBJECT] = '%s.%s' % (module, name)
-            # Check for a custom handler
-            if HandlerClass:
-                handler = HandlerClass(self)
-                flat_obj = handler.flatten(obj, data)
-                self._mkref(flat_obj)
-                return flat_obj
 
         if util.is_module(obj):
             if self.unpicklable:
@@ -223,21 +397,51 @@ class Pickler(object):
         if has_slots:
             return self._flatten_newstyle_with_slots(obj, data)
 
+    def _get_handler(self, cls):
+        """Return this pickler's instance of the handler for cls, or None.
+        """
+        HandlerClass = handlers.get(cls)
+        if HandlerClass is None:
+            return None
+        try:
+            return self._handlers[HandlerClass]
+        except KeyError:
+            handler = self._handlers[HandlerClass] = HandlerClass(self)
+            return handler
+
+    def _new_obj_data(self, obj):
+        """Return the dict an instance is flattened into."""
+        if self._plain_dicts:
+            return {}
+        return ObjDict(obj)
+
     def _flatten_dict_obj(self, obj, data=None, is_filter_none=False):
         """Recursively call flatten() and return json-friendly dict
         """
-        if data is None:
-            data = obj.__class__()
+        if self._depth + 1 != self._max_depth and _has_primitive_items(obj):
+            if data is None:
+                if self._reuse_containers:
+                    return obj
+                data = obj.__class__()
+            items = sorted(obj.items(), key=operator.itemgetter(0))
+            if is_filter_none:
+                data.update((k, v) for k, v in items if v is not None)
+            else:
+                data.update(items)
+        else:
+            if data is None:
+                data = obj.__class__()
 
-        flatten = self._flatten_key_value_pair
-        for k, v in sorted(obj.items(), key=operator.itemgetter(0)):
-            # If it was requested that we filter out None values.
-            if not is_filter_none or v is not None:
-                flatten(k, v, data)
+            flatten = self._flatten_key_value_pair
+            for k, v in sorted(obj.items(), key=operator.itemgetter(0)):
+                # If it was requested that we filter out None values.
+                if not is_filter_none or v is not None:
+                    flatten(k, v, data)
 
         # the collections.defaultdict protocol
         if hasattr(obj, 'default_factory') and callable(obj.default_factory):
-            flatten('default_factory', obj.default_factory, data)
+            self._flatten_key_value_pair('default_factory',
+                                         obj.default_factory, data)
 
         return data
 
@@ -253,7 +457,15 @@ class Pickler(object):
         if not util.is_picklable(k, v):
             return data
         if not isinstance(k, (str, unicode)):
-            k = self.flatten(k)
+            num_raw = len(self._raw_fragments)
+            flat_k = self.flatten(k)
+            if len(self._raw_fragments) != num_raw:
+                # the placeholder would be spliced into an object key
+                raise TypeError('RawJSON cannot be a dict key: %r' % (k,))
+            if type(flat_k) is dict and self._plain_dicts:
+                # dicts are not hashable
+                flat_k = ObjDict(k, flat_k)
+            k = flat_k
         data[k] = self.flatten(v)
         return data
 
@@ -268,6 +480,19 @@ class Pickler(object):
             return value
         return data
 
+## Types of the keys _has_primitive_items() accepts
+_STRING_TYPES = set((str, unicode))
+
+
+def _has_primitive_items(obj):
+    """Return True if obj maps strings, none of them a reserved tag, to
+    primitive values, so that it can be flattened as it is.
+    """
+    return (util.all_primitive(obj.itervalues()) and
+            not set(map(type, obj)) - _STRING_TYPES and
+            tags.RESERVED.isdisjoint(obj))
+
+
 def _mktyperef(obj):
     """Return a typeref dictionary.  Used for references.
 
@@ -303,8 +528,8 @@ class ObjDict(dict):
     hash and equality of the original object, allowing this dict to be used as
     key."""
 
-    def __init__(self, obj):
-        super(ObjDict, self).__init__()
+    def __init__(self, obj, items=()):
+        super(ObjDict, self).__init__(items)
         self.__obj = obj;
 
     def __hash__(self):
@@ -0,0 +1,361 @@
+"""Memory profile of jsonstruct.decode() and encode().
+
+Decoding runs in two phases, parsing the JSON text into a tree of dicts
+and lists with the backend, then restoring the object graph from the
+tree.  Encoding flattens the object graph into a tree, then has the
+backend write it out.  For each phase the profile reports the time, the
+memory still allocated after it, the number of objects it left allocated
+and where they come from.  It also reports the size of the JSON text, of
+the tree, of the reference tables of the Unpickler (_objs, _obj_to_idx,
+_namedict and _namestack) and of the object graph.
+
+    python -m jsonstruct.profile --decode file.json --cls mod.Class
+    python -m jsonstruct.profile --encode file.json --cls mod.Class
+
+--encode first decodes the file into cls, then profiles encoding it.
+
+With tracemalloc, which comes with Python 3.4 and later, the objects are
+memory blocks, broken down by allocation site, and the peak memory of each
+phase is reported too.  Without it, the objects are those tracked by the
+garbage collector, i.e. instances and containers but not strings and
+numbers, broken down by type, and the memory is the growth of the RSS, on
+Linux only.  The peak RSS of a phase is then only measured with
+--reset-peak, which resets the peak RSS of the whole process through
+/proc/self/clear_refs.
+
+    >>> class Address(object):
+    ...     city = ""
+    >>> report = profile_decode('[{"city": "Toronto"}]', [Address()])
+    >>> [phase['name'] for phase in report['phases']]
+    ['backend', 'restore']
+    >>> report['sizes']['input']
+    21
+    >>> report['tables']['objs']
+    2
+    >>> report['phases'][1]['blocks'] >= 1
+    True
+"""
+from __future__ import print_function
+
+import collections
+import gc
+import os
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+import jsonstruct
+from jsonstruct.pickler import Pickler
+from jsonstruct.unpickler import Unpickler, loadclass
+
+## The timer of the phases
+_timer = getattr(time, 'perf_counter', time.time)
+
+## Types whose instances are shared or part of the program, not the data
+_SKIPPED = (type, type(sys), type(loadclass), type(len))
+
+
+def deep_size(obj):
+    """Returns the size in bytes of obj and of every object it refers to
+    through containers, instance dicts and slots, counting each object
+    once.  Classes, modules and functions are left out.
+
+    >>> deep_size([]) == sys.getsizeof([])
+    True
+    """
+    seen = set()
+    pending = [obj]
+    size = 0
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen or isinstance(obj, _SKIPPED):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            pending.extend(obj.keys())
+            pending.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            pending.extend(obj)
+        if hasattr(obj, '__dict__'):
+            pending.append(obj.__dict__)
+        for name in getattr(type(obj), '__slots__', ()):
+            if hasattr(obj, name):
+                pending.append(getattr(obj, name))
+    return size
+
+
+class ProfilingUnpickler(Unpickler):
+    """An Unpickler measuring its reference tables before it clears them
+    at the end of a call.
+    """
+
+    def __init__(self, *args, **kwargs):
+        Unpickler.__init__(self, *args, **kwargs)
+        ## Shared with the contexts, which copy the attributes
+        self.tables = {}
+
+    def _reset(self):
+        if self._objs or self._namedict:
+            self.tables.update(self._measure_tables())
+        Unpickler._reset(self)
+
+    def _measure_tables(self):
+        size = sys.getsizeof
+        names = self._namedict
+        return {
+            'objs': len(self._objs),
+            # the tables hold the restored objects, which belong to the
+            # graph, and their own keys and indexes
+            'bytes': (size(self._objs) + size(self._obj_to_idx) +
+                      size(names) + size(self._namestack) +
+                      sum(size(k) for k in self._obj_to_idx) +
+                      sum(size(v) for v in self._obj_to_idx.values()) +
+                      sum(size(k) for k in names)),
+        }
+
+
+def _status_kb(field):
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except (IOError, OSError):
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except (IOError, OSError):
+        return False
+
+
+def _type_name(cls):
+    if cls.__module__ in ('__builtin__', 'builtins'):
+        return cls.__name__
+    return '%s.%s' % (cls.__module__, cls.__name__)
+
+
+def _object_counts():
+    """Returns the number of objects tracked by the garbage collector by
+    type.
+    """
+    counts = collections.defaultdict(int)
+    for obj in gc.get_objects():
+        counts[type(obj)] += 1
+    return counts
+
+
+def _phase(name, func, args, top, reset_peak=False):
+    """Runs func(*args) and returns (result, measures of the call)."""
+    gc.collect()
+    phase = {'name': name}
+    if tracemalloc is not None:
+        before = tracemalloc.take_snapshot()
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        start = _timer()
+        result = func(*args)
+        phase['seconds'] = _timer() - start
+        after_current, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+        ignored = (tracemalloc.Filter(False, tracemalloc.__file__),
+                   tracemalloc.Filter(False, __file__))
+        stats = after.filter_traces(ignored).compare_to(
+            before.filter_traces(ignored), 'lineno')
+        phase['retained_kb'] = (after_current - current) // 1024
+        phase['peak_kb'] = (peak - current) // 1024
+        phase['blocks'] = sum(s.count_diff for s in stats
+                              if s.count_diff > 0)
+        phase['sites'] = [(str(s.traceback[0]), s.size_diff // 1024,
+                           s.count_diff) for s in stats[:top]]
+        return result, phase
+    peak = reset_peak and _reset_peak_rss()
+    before = _object_counts()
+    rss = _status_kb('VmRSS')
+    start = _timer()
+    result = func(*args)
+    phase['seconds'] = _timer() - start
+    if rss is not None:
+        phase['retained_kb'] = _status_kb('VmRSS') - rss
+        if peak:
+            phase['peak_kb'] = _status_kb('VmHWM') - rss
+    after = _object_counts()
+    # the counts taken before the call
+    after[type(before)] -= 1
+    deltas = sorted(((count - before.get(cls, 0), cls)
+                     for cls, count in after.items()),
+                    key=lambda delta: -delta[0])
+    phase['blocks'] = sum(count for count, cls in deltas if count > 0)
+    phase['types'] = [(_type_name(cls), count)
+                      for count, cls in deltas[:top] if count > 0]
+    return result, phase
+
+
+def _profile(steps, top, reset_peak=False):
+    started = tracemalloc is not None and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        phases = []
+        value = None
+        for name, func, args in steps:
+            value, phase = _phase(name, func, args(value), top, reset_peak)
+            phases.append(phase)
+        return phases
+    finally:
+        if started:
+            tracemalloc.stop()
+
+
+def profile_decode(string, cls=None, top=10, reset_peak=False):
+    """Profiles jsonstruct.decode(string, cls) and returns the report as
+    a dict of 'phases', 'sizes' and 'tables'.  Without tracemalloc,
+    reset_peak resets the peak RSS of the process to measure the peak of
+    each phase.
+    """
+    unpickler = ProfilingUnpickler(reuse_containers=True)
+    results = {}
+
+    def parse(string):
+        results['tree'] = jsonstruct.json.decode(string)
+        return results['tree']
+
+    def restore(tree):
+        results['graph'] = unpickler.restore(tree, cls)
+        return results['graph']
+
+    phases = _profile([('backend', parse, lambda value: (string,)),
+                       ('restore', restore, lambda value: (value,))], top,
+                      reset_peak)
+    return {
+        'op': 'decode',
+        'phases': phases,
+        'sizes': {
+            'input': len(string),
+            'tree': deep_size(results['tree']),
+            'graph': deep_size(results['graph']),
+        },
+        'tables': unpickler.tables,
+    }
+
+
+def profile_encode(obj, top=10, reset_peak=False):
+    """Profiles jsonstruct.encode(obj) and returns the report as a dict
+    of 'phases' and 'sizes'.  reset_peak is as for profile_decode().
+    """
+    # the options of jsonstruct.encode()
+    pickler = Pickler(unpicklable=False, reuse_containers=True,
+                      plain_dicts=True)
+    results = {}
+
+    def flatten(obj):
+        results['tree'] = pickler.flatten(obj)
+        return results['tree']
+
+    def write(tree):
+        results['output'] = pickler.splice_raw_json(
+            jsonstruct.json.encode(tree))
+        return results['output']
+
+    phases = _profile([('flatten', flatten, lambda value: (obj,)),
+                       ('backend', write, lambda value: (value,))], top,
+                      reset_peak)
+    return {
+        'op': 'encode',
+        'phases': phases,
+        'sizes': {
+            'graph': deep_size(obj),
+            'tree': deep_size(results['tree']),
+            'output': len(results['output']),
+        },
+    }
+
+
+def format_report(report):
+    """Returns the report as text."""
+    lines = ['%s: %s' % (report['op'], ', '.join(
+        '%s %d KB' % (name, size // 1024)
+        for name, size in sorted(report['sizes'].items())))]
+    tables = report.get('tables')
+    if tables:
+        lines.append('reference tables: %d objects, %d KB'
+                     % (tables['objs'], tables['bytes'] // 1024))
+    lines.append('')
+    lines.append('%-10s %10s %12s %10s %10s' % ('phase', 'ms', 'retained KB',
+                                                 'peak KB', 'objects'))
+    for phase in report['phases']:
+        lines.append('%-10s %10.1f %12s %10s %10s' % (
+            phase['name'], phase['seconds'] * 1000,
+            phase.get('retained_kb', '-'), phase.get('peak_kb', '-'),
+            phase.get('blocks', '-')))
+    for phase in report['phases']:
+        if not phase.get('sites'):
+            continue
+        lines.append('')
+        lines.append('top allocation sites of %s:' % phase['name'])
+        for site, size, count in phase['sites']:
+            lines.append('  %8d KB %8d blocks  %s' % (size, count, site))
+    for phase in report['phases']:
+        if not phase.get('types'):
+            continue
+        lines.append('')
+        lines.append('top object types of %s:' % phase['name'])
+        for type_name, count in phase['types']:
+            lines.append('  %8d objects  %s' % (count, type_name))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='python -m jsonstruct.profile',
+        description='Profiles the memory of jsonstruct.decode() or '
+                    'encode() on a JSON file.')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--decode', metavar='FILE',
+                       help='profiles decoding the file')
+    group.add_argument('--encode', metavar='FILE',
+                       help='profiles encoding the object decoded from the '
+                            'file')
+    parser.add_argument('--cls', metavar='MODULE.CLASS',
+                        help='the class to decode into')
+    parser.add_argument('--top', type=int, default=10,
+                        help='allocation sites or object types shown per '
+                             'phase')
+    parser.add_argument('--reset-peak', action='store_true',
+                        help='without tracemalloc, resets the peak RSS of '
+                             'the process before each phase to measure its '
+                             'peak (Linux only)')
+    args = parser.parse_args(argv)
+
+    cls = None
+    if args.cls:
+        # allow classes of modules of the working directory
+        sys.path.insert(0, os.getcwd())
+        cls = loadclass(args.cls)
+        if cls is None:
+            parser.error('cannot import %s' % args.cls)
+    with open(args.decode or args.encode) as f:
+        string = f.read()
+    if args.decode:
+        report = profile_decode(string, cls, args.top, args.reset_peak)
+    else:
+        report = profile_encode(jsonstruct.decode(string, cls), args.top,
+                                args.reset_peak)
+    print(format_report(report))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,230 @@
+"""Pre-encoded JSON fragments.
+
+A RawJSON wraps JSON text that has already been encoded, e.g. a cached
+sub-document or the body of an upstream response.  The Pickler replaces it
+with a unique placeholder string, and the placeholder is substituted with the
+fragment after the backend has encoded the surrounding document, so the
+fragment is neither parsed nor re-serialized.
+
+    >>> import jsonstruct
+    >>> jsonstruct.encode({'items': RawJSON('[1,2,3]')})
+    '{"items": [1,2,3]}'
+
+On decode, a class attribute whose prototype is a RawJSON marks that
+attribute as raw.  jsonstruct.decode() then only scans over its value and
+keeps it as a slice of the input, which is decoded on demand.
+
+    >>> class Message(object):
+    ...     topic = ""
+    ...     body = RawJSON()
+    >>> m = jsonstruct.decode('{"topic": "a", "body": {"x": [1, 2]}}', Message)
+    >>> print m.topic, m.body
+    a RawJSON('{"x": [1, 2]}')
+    >>> m.body.decode()['x']
+    [1, 2]
+
+"""
+
+import re
+import uuid
+
+
+class RawJSON(object):
+    """JSON text spliced verbatim into the encoded output.
+
+    Setting validate to True checks that the text decodes with the current
+    jsonstruct backend and raises ValueError otherwise.
+
+    Instances created by from_slice() reference the source text and only
+    copy their slice out of it when json is first accessed.
+
+    >>> RawJSON('{"a": 1}')
+    RawJSON('{"a": 1}')
+    >>> RawJSON('{"a": ', validate=True)
+    Traceback (most recent call last):
+    ...
+    ValueError: invalid JSON fragment: '{"a": '
+    """
+
+    __slots__ = ('_json', '_source', '_start', '_end')
+
+    def __init__(self, json='null', validate=False):
+        if validate:
+            _validate(json)
+        self._json = json
+        self._source = None
+
+    @classmethod
+    def from_slice(cls, source, start, end):
+        """Returns a RawJSON for source[start:end] without copying it."""
+        raw = cls.__new__(cls)
+        raw._json = None
+        raw._source = source
+        raw._start = start
+        raw._end = end
+        return raw
+
+    @classmethod
+    def from_value(cls, value):
+        """Returns a RawJSON holding the encoding of a decoded JSON value."""
+        import jsonstruct
+        return cls(jsonstruct.json.encode(value))
+
+    @property
+    def json(self):
+        """The JSON text."""
+        if self._json is None:
+            self._json = self._source[self._start:self._end]
+            self._source = None
+        return self._json
+
+    def decode(self, cls=None):
+        """Decodes the JSON text, into an instance of `cls` if given."""
+        import jsonstruct
+        return jsonstruct.decode(self.json, cls)
+
+    def __repr__(self):
+        return 'RawJSON(%r)' % self.json
+
+    def __eq__(self, other):
+        return type(other) is RawJSON and self.json == other.json
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.json)
+
+
+def _validate(text):
+    import jsonstruct
+    try:
+        jsonstruct.json.decode(text)
+    except Exception:
+        raise ValueError('invalid JSON fragment: %r' % text)
+
+
+def new_placeholder_prefix():
+    """Returns a prefix for placeholder strings that cannot clash with
+    strings found in user data.
+    """
+    return 'jsonstruct.RawJSON:%s:' % uuid.uuid4().hex
+
+
+def splice(encoded, prefix, fragments):
+    """Replaces the encoded placeholder strings "<prefix><index>" found in
+    `encoded` with fragments[index].
+
+    >>> splice('{"a": "p:0", "b": ["p:1"]}', 'p:', ['1', '{}'])
+    '{"a": 1, "b": [{}]}'
+    """
+    pattern = re.compile('"%s(\\d+)"' % re.escape(prefix))
+    return pattern.sub(lambda match: fragments[int(match.group(1))], encoded)
+
+
+## A JSON string literal
+_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+## String literals and brackets, the tokens that matter to find the end of
+## an array or an object
+_STRUCTURE = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[\[\]{}]', re.DOTALL)
+## Numbers, true, false and null
+_SCALAR = re.compile(r'[^\s,:\[\]{}"]+')
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def skip_whitespace(s, idx):
+    """Returns the index of the first non-whitespace character at or after
+    `idx`.
+    """
+    return _WHITESPACE.match(s, idx).end()
+
+
+def scan_value(s, idx):
+    """Returns the end index of the JSON value starting at `idx`, without
+    decoding it.
+
+    >>> s = '{"a": [1, "]"], "b": 2}'
+    >>> s[6:scan_value(s, 6)]
+    '[1, "]"]'
+    """
+    try:
+        c = s[idx]
+    except IndexError:
+        raise ValueError('Expecting value at %d' % idx)
+    if c == '"':
+        match = _STRING.match(s, idx)
+    elif c == '[' or c == '{':
+        depth = 0
+        for match in _STRUCTURE.finditer(s, idx):
+            token = match.group()
+            if token == '[' or token == '{':
+                depth += 1
+            elif token == ']' or token == '}':
+                depth -= 1
+                if depth == 0:
+                    return match.end()
+        match = None
+    else:
+        match = _SCALAR.match(s, idx)
+    if match is None:
+        raise ValueError('Unterminated value at %d' % idx)
+    return match.end()
+
+
+def iter_array(s, idx):
+    """Yields the (start, end) spans of the elements of the JSON array
+    starting at `idx`.
+
+    >>> s = '[1, {"a": 2}]'
+    >>> [s[start:end] for start, end in iter_array(s, 0)]
+    ['1', '{"a": 2}']
+    """
+    idx = skip_whitespace(s, idx + 1)
+    if s[idx:idx + 1] == ']':
+        return
+    while True:
+        end = scan_value(s, idx)
+        yield idx, end
+        idx = skip_whitespace(s, end)
+        c = s[idx:idx + 1]
+        if c == ']':
+            return
+        if c != ',':
+            raise ValueError('Expecting , delimiter at %d' % idx)
+        idx = skip_whitespace(s, idx + 1)
+
+
+def iter_object(s, idx, decoder):
+    """Yields (key, start, end) for the members of the JSON object starting
+    at `idx`, where start and end delimit the member's value.  Keys with
+    escape sequences are decoded with `decoder`.
+
+    >>> s = '{"a": [1], "b": "x"}'
+    >>> [(k, s[start:end]) for k, start, end in iter_object(s, 0, None)]
+    [('a', '[1]'), ('b', '"x"')]
+    """
+    idx = skip_whitespace(s, idx + 1)
+    if s[idx:idx + 1] == '}':
+        return
+    while True:
+        match = _STRING.match(s, idx)
+        if match is None:
+            raise ValueError('Expecting property name at %d' % idx)
+        key = match.group()
+        if '\\' in key:
+            key = decoder(key)
+        else:
+            key = key[1:-1]
+        idx = skip_whitespace(s, match.end())
+        if s[idx:idx + 1] != ':':
+            raise ValueError('Expecting : delimiter at %d' % idx)
+        idx = skip_whitespace(s, idx + 1)
+        end = scan_value(s, idx)
+        yield key, idx, end
+        idx = skip_whitespace(s, end)
+        c = s[idx:idx + 1]
+        if c == '}':
+            return
+        if c != ',':
+            raise ValueError('Expecting , delimiter at %d' % idx)
+        idx = skip_whitespace(s, idx + 1)
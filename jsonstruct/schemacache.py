@@ -0,0 +1,250 @@
+"""Persistent cache of the code generated for classes.
+
+jsonstruct.codegen generates an encoder and a decoder for each class, and
+compiling them is most of the cost of the first request of a fresh process.
+A SchemaCache keeps the compiled code in a file, keyed by the path of the
+class and a fingerprint of the generated source.  The source is derived
+from the public variables and prototypes of the class, so an entry becomes
+stale as soon as the class definition changes; it is then compiled again
+and replaced on the next save().
+
+The cache only saves the compile() step.  Walking the classes and
+generating the source still runs in every process, since the source is
+what tells a fresh entry from a stale one, so the saving is small: about
+1.5 ms for a class with a few nested classes, against about 100 ms to
+import jsonstruct.  Entries compiled after warmup(), for classes met later
+on, are only written to the file by a later save().
+
+The file holds code objects, loaded with marshal.load() and run as the
+encoders and decoders: it is executable code and must be trusted as much
+as the modules of the program.  Keep it where only the program can write
+it, never in a shared or world-writable directory.
+
+warmup() prepares classes at process start, or before forking workers:
+
+    >>> import os, shutil, tempfile
+    >>> class Address(object):
+    ...     city = ""
+    >>> class Developer(object):
+    ...     name = ""
+    ...     address = Address()
+    >>> directory = tempfile.mkdtemp()
+    >>> path = os.path.join(directory, 'schemas')
+    >>> cache = warmup([Developer], path)
+    >>> sorted(cache.keys())[:2]
+    ['jsonstruct.schemacache.Address decoder', 'jsonstruct.schemacache.Address encoder 10']
+    >>> len(SchemaCache(path)) == len(cache)
+    True
+    >>> use(None)
+    >>> shutil.rmtree(directory)
+
+"""
+
+import gc
+import hashlib
+import marshal
+import os
+import tempfile
+
+import jsonstruct.codegen as codegen
+import jsonstruct.handlers as handlers
+import jsonstruct.util as util
+from jsonstruct.unpickler import get_attr_cls_def, get_collection_item_type
+from jsonstruct.unpickler import get_dictionary_item_type, has_raw_attrs
+
+try:
+    from importlib.util import MAGIC_NUMBER
+except ImportError:
+    import imp
+    MAGIC_NUMBER = imp.get_magic()
+
+## Identifies the layout of cache files together with the bytecode magic
+FORMAT = 1
+
+
+class SchemaCache(object):
+    """Compiled code by key, loaded from and saved to a file.
+
+    Entries are (fingerprint, code) pairs.  A file written by another
+    Python version, or which cannot be read, is treated as empty.  The
+    code of the file is run without any check, so the file must be
+    trusted.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._entries = {}
+        self._dirty = False
+        ## Compilations served from and missing from the cache
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    def load(self):
+        """Reads the entries of the file, replacing those in memory."""
+        self._entries = {}
+        self._dirty = False
+        try:
+            with open(self.path, 'rb') as f:
+                header, entries = marshal.load(f)
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            return
+        if header == (FORMAT, MAGIC_NUMBER) and type(entries) is dict:
+            self._entries = entries
+
+    def save(self):
+        """Writes the entries to the file if any has changed.
+
+        The file is replaced atomically, so that processes starting
+        concurrently never read a partial file.
+        """
+        if not self._dirty:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.jsonstruct')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                marshal.dump(((FORMAT, MAGIC_NUMBER), self._entries), f)
+            try:
+                os.rename(tmp, self.path)
+            except OSError:
+                # rename() does not replace files on Windows
+                os.remove(self.path)
+                os.rename(tmp, self.path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self._dirty = False
+
+    def compile(self, source, filename, key):
+        """Returns the code of source, from the cache if the entry of key
+        was compiled from the same source.
+        """
+        fingerprint = hashlib.sha1(source.encode('utf-8')).hexdigest()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == fingerprint:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        code = compile(source, filename, 'exec')
+        self._entries[key] = (fingerprint, code)
+        self._dirty = True
+        return code
+
+    def keys(self):
+        return self._entries.keys()
+
+    def clear(self):
+        self._entries = {}
+        self._dirty = True
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+
+def use(path):
+    """Makes jsonstruct.codegen compile through the SchemaCache of path,
+    or through none if path is None, and returns it.
+    """
+    cache = codegen.code_cache
+    if path is None:
+        cache = None
+    elif cache is None or cache.path != path:
+        cache = SchemaCache(path)
+    codegen.code_cache = cache
+    return cache
+
+
+def warmup(classes, path=None):
+    """Prepares jsonstruct for the given classes and every class their
+    prototypes refer to: resolves their handlers and RawJSON attributes and
+    generates their decoders and encoders for jsonstruct.encode() and
+    decode() with codegen=True.
+
+    If path is given, the generated code is compiled through the
+    SchemaCache of that file, which is saved afterwards and also serves
+    the classes generated later on.  Returns the cache, or None.
+    """
+    cache = use(path) if path is not None else codegen.code_cache
+    for cls in reachable_classes(classes):
+        handlers.get(cls)
+        has_raw_attrs(cls)
+        codegen.default_decoders.get(cls)
+        codegen.default_encoders.prepare(cls)
+    if cache is not None:
+        cache.save()
+    return cache
+
+
+def freeze(classes=(), path=None):
+    """Builds the lazily built state of jsonstruct before a pre-fork server
+    forks its workers, so that they share it instead of each building a
+    copy of their own.
+
+    Warms the given classes up as warmup() does, resolves the handlers of
+    all registered types and runs a round trip through the JSON backend.
+    Then, on Pythons which have gc.freeze(), i.e. 3.7 and later, moves
+    every object tracked by the garbage collector to the permanent
+    generation, so that collections in the workers do not write to the
+    pages holding them.  Returns True if gc.freeze() was called.
+
+    On Python 2, which has no gc.freeze(), it always returns False: the
+    state is built before forking, but collections in the workers still
+    write to every page holding it, so the workers end up with copies of
+    most of it anyway.
+
+    Neither does freeze() seal the caches: the handler, decoder and encoder
+    caches stay mutable, and classes the workers meet later on are still
+    resolved and generated in each worker.  Call it last thing before
+    forking.
+    """
+    import jsonstruct
+    warmup(classes, path)
+    for cls in list(handlers.BaseHandler._registry):
+        handlers.get(cls)
+    jsonstruct.decode(jsonstruct.encode({'a': [1, 1.5, 'b', None, True]}))
+    if not hasattr(gc, 'freeze'):
+        return False
+    # drop the garbage left so far, rather than freezing it
+    gc.collect()
+    gc.freeze()
+    return True
+
+
+def reachable_classes(classes):
+    """Returns the classes and the classes their prototypes refer to,
+    including through lists and dicts, in the order they are found.
+    Builtin types and types with a handler are left out.
+
+    >>> class Address(object):
+    ...     city = ""
+    >>> class Developer(object):
+    ...     safe_houses = [Address()]
+    >>> [cls.__name__ for cls in reachable_classes([Developer])]
+    ['Developer', 'Address']
+    """
+    found = []
+    seen = set()
+    pending = list(classes)
+    while pending:
+        cls_def = pending.pop(0)
+        if util.is_collection(cls_def):
+            pending.append(get_collection_item_type(cls_def))
+            continue
+        if util.is_dictionary(cls_def):
+            pending.append(get_dictionary_item_type(cls_def)[1])
+            continue
+        if (not util.is_type(cls_def) or cls_def in seen or
+                cls_def.__module__ in ('__builtin__', 'builtins') or
+                handlers.get(cls_def) is not None):
+            # builtins and handled types have no prototypes of interest
+            continue
+        seen.add(cls_def)
+        found.append(cls_def)
+        for k in util.get_public_variables(cls_def):
+            pending.append(get_attr_cls_def(cls_def, k))
+    return found
@@ -0,0 +1,180 @@
+"""Tracing spans around jsonstruct.encode() and decode().
+
+A tracer is an object with two methods, called for each span:
+
+    start(op, cls)
+    end(op, cls, bytes, duration, error=None)
+
+op is one of
+
+    'encode'            the whole call to encode()
+    'encode.flatten'    flattening the top-level object
+    'encode.backend'    the call to the JSON backend
+    'decode'            the whole call to decode()
+    'decode.backend'    the call to the JSON backend
+    'decode.restore'    restoring the top-level object
+
+A class with RawJSON attributes, see jsonstruct.rawjson, is restored
+along with the parsing of the JSON text, so its 'decode.backend' spans
+are within 'decode.restore', one for each value handed to the backend,
+with its own size in bytes.
+
+cls is the class of the top-level object.  decode() only knows it in
+advance when given cls, so start() may receive None where end() receives
+the class of the restored object.  bytes is the size of the JSON text,
+or None for 'encode.flatten', and duration is in seconds.
+
+When a call raises an exception, the spans in progress are ended anyway,
+with the exception as error, which is None otherwise.  bytes is then
+None for the spans of encode(), and cls may be None for decode().  The
+error is only passed to end() when there is one, so tracers written
+without it keep working as long as calls succeed.
+
+Tracer does nothing and is meant to be subclassed.  Collector keeps the
+spans in memory:
+
+    >>> import jsonstruct
+    >>> collector = Collector()
+    >>> set_tracer(collector)
+    >>> jsonstruct.encode([1, 2])
+    '[1, 2]'
+    >>> [span.op for span in collector.spans]
+    ['encode.flatten', 'encode.backend', 'encode']
+    >>> collector.summary()['encode']['bytes']
+    6
+    >>> try:
+    ...     jsonstruct.decode('[1,')
+    ... except Exception as error:
+    ...     pass
+    >>> collector.spans[-1].op, collector.spans[-1].error is error
+    ('decode', True)
+    >>> set_tracer(None)
+
+A slow-payload callback is called as on_slow(op, path, bytes, duration)
+whenever an encode() or decode() returns after more than slow_seconds,
+path being the path of the class of the top-level object:
+
+    >>> slow = []
+    >>> set_tracer(on_slow=lambda *args: slow.append(args), slow_seconds=0)
+    >>> jsonstruct.decode('{"a": 1}') == {'a': 1}
+    True
+    >>> slow[0][:3]
+    ('decode', '__builtin__.dict', 8)
+    >>> set_tracer(None)
+
+Tracing is off by default and then costs encode() and decode() a single
+test.
+"""
+
+import collections
+import threading
+import time
+
+## The timer of the span durations
+_timer = getattr(time, 'perf_counter', time.time)
+
+## The _Tracing of set_tracer(), or None when tracing is off
+active = None
+
+## The ops of whole calls, checked against the slow-payload threshold
+CALLS = ('encode', 'decode')
+
+Span = collections.namedtuple('Span', 'op cls bytes duration error')
+
+
+class Tracer(object):
+    """The no-op tracer."""
+
+    def start(self, op, cls):
+        pass
+
+    def end(self, op, cls, bytes, duration, error=None):
+        pass
+
+
+class Collector(Tracer):
+    """A tracer keeping the last `limit` ended spans in memory."""
+
+    def __init__(self, limit=10000):
+        self.spans = collections.deque(maxlen=limit)
+        self._lock = threading.Lock()
+
+    def end(self, op, cls, bytes, duration, error=None):
+        with self._lock:
+            self.spans.append(Span(op, cls, bytes, duration, error))
+
+    def summary(self):
+        """Returns the count, the total and maximal duration, the total
+        bytes and the errors of the kept spans, by op.
+        """
+        with self._lock:
+            spans = list(self.spans)
+        summary = {}
+        for span in spans:
+            entry = summary.get(span.op)
+            if entry is None:
+                entry = summary[span.op] = {
+                    'count': 0, 'seconds': 0.0, 'max_seconds': 0.0,
+                    'bytes': 0, 'errors': 0,
+                }
+            entry['count'] += 1
+            entry['seconds'] += span.duration
+            entry['max_seconds'] = max(entry['max_seconds'], span.duration)
+            entry['bytes'] += span.bytes or 0
+            if span.error is not None:
+                entry['errors'] += 1
+        return summary
+
+    def clear(self):
+        with self._lock:
+            self.spans.clear()
+
+
+class _Tracing(object):
+    """The tracer and the slow-payload callback in use."""
+
+    def __init__(self, tracer, slow_seconds, on_slow):
+        self.tracer = tracer
+        self.slow_seconds = slow_seconds
+        self.on_slow = on_slow
+
+    def start(self, op, cls):
+        self.tracer.start(op, cls)
+
+    def end(self, op, cls, bytes, duration, error=None):
+        if error is not None:
+            self.tracer.end(op, cls, bytes, duration, error)
+            return
+        self.tracer.end(op, cls, bytes, duration)
+        if (self.on_slow is not None and op in CALLS and
+                duration > self.slow_seconds):
+            self.on_slow(op, _path(cls), bytes, duration)
+
+
+def _path(cls):
+    if cls is None:
+        return None
+    return '%s.%s' % (cls.__module__, cls.__name__)
+
+
+def size(encoded):
+    """Returns the size of a JSON text, or None for other values, e.g.
+    those of backends which do not produce text.
+    """
+    if isinstance(encoded, basestring):
+        return len(encoded)
+    return None
+
+
+def set_tracer(tracer=None, slow_seconds=1.0, on_slow=None):
+    """Traces encode() and decode() with tracer, and calls on_slow for
+    the calls taking more than slow_seconds.  Either may be None; tracing
+    is off when both are.
+    """
+    global active
+    if tracer is None and on_slow is None:
+        active = None
+        return
+    if tracer is None:
+        tracer = Tracer()
+    active = _Tracing(tracer, slow_seconds, on_slow)
@@ -12,11 +12,33 @@ import sys
 import jsonstruct.util as util
 import jsonstruct.tags as tags
 import jsonstruct.handlers as handlers
+import jsonstruct.rawjson as rawjson
 from jsonstruct.compat import set
 
 
 class Unpickler(object):
-    def __init__(self):
+    """Restores flattened objects, typed by a class or a prototype.
+
+    Setting reuse_containers to True lets restore() return lists and dicts
+    of primitives from its input as they are, instead of copying them.
+    Only do that when the input is not used afterwards, e.g. for freshly
+    decoded JSON.
+
+    Setting codegen to True restores instances typed by a class with
+    decoders generated for the class, see jsonstruct.codegen.
+
+    An Unpickler can be shared between threads: each call to restore(),
+    restore_into() or restore_raw() runs on a context, a shallow copy of
+    the unpickler which holds the state of the traversal.
+    """
+
+    def __init__(self, reuse_containers=False, codegen=False):
+        self._reuse_containers = reuse_containers
+        self._decoders = None
+        if codegen:
+            # jsonstruct.codegen imports this module
+            from jsonstruct.codegen import default_decoders
+            self._decoders = default_decoders
         ## The current recursion depth
         self._depth = 0
         ## Maps reference names to object instances
@@ -27,6 +49,22 @@ class Unpickler(object):
         ## Maps objects to their index in the _objs list
         self._obj_to_idx = {}
         self._objs = []
+        ## Handler instances by handler class
+        self._handlers = {}
+        ## Whether this is the context of a call rather than the unpickler
+        self._context = False
+
+    def _new_context(self):
+        """Returns the context of a call to restore()."""
+        context = object.__new__(self.__class__)
+        context.__dict__.update(self.__dict__)
+        context._context = True
+        context._namedict = {}
+        context._namestack = []
+        context._obj_to_idx = {}
+        context._objs = []
+        context._handlers = {}
+        return context
 
     def _reset(self):
         """Resets the object's internal state.
@@ -64,9 +102,18 @@ class Unpickler(object):
         cls_def could be either a type or an instance. In case of instance, it
         will be used to define types inside a list or dict. eg. [Test()] means
         a list of Test.
+
+        If cls_def is RawJSON, obj is re-encoded into a RawJSON. Use
+        restore_raw() to keep such values as slices of the input instead.
         """
+        if not self._context:
+            return self._new_context().restore(obj, cls_def)
+
         self._push()
 
+        if cls_def is rawjson.RawJSON:
+            return self._pop(rawjson.RawJSON.from_value(obj))
+
         if has_tag(obj, tags.ID):
             return self._pop(self._objs[obj[tags.ID]])
 
@@ -86,17 +133,21 @@ class Unpickler(object):
             return self._pop(self._mkref(obj))
 
         if util.is_type(cls_def):
+            # check custom handlers
+            handler = self._get_handler(cls_def)
+            if handler is not None:
+                return self._pop(self._restore_handled(handler, obj,
+                                                       cls_def))
+
             if not util.is_dictionary(obj):
                 # Type mismatch. cls_def is a type but we didn't get a dict
                 # from JSON. Return None.
                 return self._pop(None)
 
-            # check custom handlers
-            HandlerClass = handlers.BaseHandler._registry.get(cls_def)
-            if HandlerClass:
-                handler = HandlerClass(self)
-                instance = handler.restore(obj)
-                return self._pop(self._mkref(instance))
+            if self._decoders is not None:
+                decoder = self._decoders.get(cls_def)
+                if decoder is not None and SPECIAL_KEYS.isdisjoint(obj):
+                    return self._pop(decoder(self, obj))
 
             factory = loadfactory(obj)
             args = getargs(obj, cls_def)
@@ -166,7 +217,18 @@ class Unpickler(object):
 
             return self._pop(instance)
 
+        if cls_def is not None and not util.is_container(cls_def):
+            # A prototype instance of a type with a custom handler
+            handler = self._get_handler(type(cls_def))
+            if handler is not None:
+                return self._pop(self._restore_handled(handler, obj,
+                                                       cls_def))
+
         if util.is_list(obj):
+            if util.all_primitive(obj) and (
+                    get_collection_item_type(cls_def) is None):
+                return self._pop(self._mkref(self._new_collection(obj,
+                                                                  cls_def)))
             if util.is_collection(cls_def):
                 parent = type(cls_def)()
             else:
@@ -174,6 +236,13 @@ class Unpickler(object):
             self._mkref(parent)
             item_type = get_collection_item_type(cls_def)
             is_set = type(parent) is set
+            values = self._restore_handled_items(obj, item_type)
+            if values is not None:
+                if is_set:
+                    parent.update(values)
+                else:
+                    parent.extend(values)
+                return self._pop(parent)
             for v in obj:
                 restored_v = self.restore(v, item_type)
                 if is_set:
@@ -192,11 +261,15 @@ class Unpickler(object):
                                   for v in obj[tags.SET]]))
 
         if util.is_dictionary(obj):
+            k_type, v_type = get_dictionary_item_type(cls_def)
+            if (k_type is None and v_type is None and
+                    util.all_primitive(obj.itervalues())):
+                return self._pop(self._new_dict(obj))
+
             if util.is_dictionary(cls_def):
                 data = type(cls_def)()
             else:
                 data = {}
-            k_type, v_type = get_dictionary_item_type(cls_def)
 
             for k, v in sorted(obj.items(), key=operator.itemgetter(0)):
                 self._namestack.append(k)
@@ -207,6 +280,275 @@ class Unpickler(object):
 
         return self._pop(obj)
 
+    def _get_handler(self, cls):
+        """Returns this unpickler's instance of the handler for cls, or None.
+        """
+        HandlerClass = handlers.get(cls)
+        if HandlerClass is None:
+            return None
+        try:
+            return self._handlers[HandlerClass]
+        except KeyError:
+            handler = self._handlers[HandlerClass] = HandlerClass(self)
+            return handler
+
+    def _new_collection(self, obj, cls_def):
+        """Returns the list obj of primitives as a collection of the type
+        of cls_def, or a list.
+        """
+        if util.is_collection(cls_def) and type(cls_def) is not list:
+            return type(cls_def)(obj)
+        if self._reuse_containers:
+            return obj
+        return list(obj)
+
+    def _new_dict(self, obj):
+        """Returns the dict obj of primitives, or a copy of it."""
+        if self._reuse_containers:
+            return obj
+        return dict(obj)
+
+    def _restore_handled_items(self, obj, item_type):
+        """Restores the items of the list obj with their handler's
+        restore_many() if item_type is handled and none of the items is a
+        dict.  Returns None otherwise.
+        """
+        if not obj or item_type is None or util.is_container(item_type):
+            return None
+        if util.is_type(item_type):
+            handler = self._get_handler(item_type)
+        else:
+            handler = self._get_handler(type(item_type))
+        if handler is None:
+            return None
+        for v in obj:
+            if type(v) is dict:
+                # may carry tags or references
+                return None
+        # the items are one level down
+        self._push()
+        values = handler.restore_many(obj, item_type)
+        for v in values:
+            if v is not None:
+                self._mkref(v)
+        return self._pop(values)
+
+    def _restore_handled(self, handler, obj, cls_def):
+        """Restores obj with a custom handler for a typed decode."""
+        if obj is None:
+            return None
+        instance = handler.restore_typed(obj, cls_def)
+        if instance is None:
+            if (type(obj) is dict and not util.is_type(cls_def) and
+                    not cls_def):
+                # an empty prototype such as OrderedDict() declares no
+                # type, the dict is restored as is
+                return self.restore(obj)
+            return None
+        return self._mkref(instance)
+
+    def restore_into(self, instance, obj, cls_def=None):
+        """Updates `instance` in place from the flattened `obj` and returns
+        it.
+
+        Only the attributes present in obj are assigned, out of the public
+        variables of cls_def and the attributes instance already has.
+        Nested objects, lists and dicts that already exist are updated in
+        place as well, so their identity is kept; everything else is
+        restored as by restore().  cls_def defaults to the type of instance.
+
+        >>> from jsonstruct._samples import Thing
+        >>> thing = Thing('old')
+        >>> thing.child = Thing('child')
+        >>> child = thing.child
+        >>> u = Unpickler()
+        >>> u.restore_into(thing, {'child': {'name': 'new child'}}) is thing
+        True
+        >>> thing.name, thing.child is child, child.name
+        ('old', True, 'new child')
+        """
+        if not self._context:
+            return self._new_context().restore_into(instance, obj, cls_def)
+        if cls_def is None:
+            cls_def = type(instance)
+        self._push()
+        return self._pop(self._restore_into(instance, obj, cls_def))
+
+    def _restore_into(self, current, obj, cls_def):
+        """Returns `current` updated from obj if it can be updated in place,
+        otherwise obj restored according to cls_def.
+        """
+        if cls_def is None and not (util.is_primitive(current) or
+                                    util.is_container(current)):
+            cls_def = type(current)
+
+        if (util.is_type(cls_def) and isinstance(current, cls_def) and
+                util.is_dictionary(obj) and _is_plain(obj) and
+                hasattr(current, '__dict__') and
+                handlers.get(cls_def) is None):
+            self._mkref(current)
+            attrs = current.__dict__
+            names = set(util.get_public_variables(cls_def))
+            names.update(k for k in attrs if not k.startswith('__'))
+            for k in sorted(names):
+                if k not in obj or k in tags.RESERVED:
+                    continue
+                self._namestack.append(k)
+                if hasattr(cls_def, k):
+                    attr_cls_def = get_attr_cls_def(cls_def, k)
+                else:
+                    attr_cls_def = None
+                # values only found on the class are prototypes, which must
+                # not be updated
+                value = self._restore_into(attrs.get(k), obj[k],
+                                           attr_cls_def)
+                setattr(current, k, value)
+                self._namestack.pop()
+            return current
+
+        if (util.is_list(obj) and type(current) in (list, set) and
+                (cls_def is None or type(cls_def) is type(current))):
+            self._mkref(current)
+            item_type = get_collection_item_type(cls_def)
+            if type(current) is set:
+                values = [self.restore(v, item_type) for v in obj]
+                current.clear()
+                current.update(values)
+                return current
+            for i, v in enumerate(obj):
+                if i < len(current):
+                    current[i] = self._restore_into(current[i], v, item_type)
+                else:
+                    current.append(self.restore(v, item_type))
+            del current[len(obj):]
+            return current
+
+        if (util.is_dictionary(obj) and _is_plain(obj) and
+                util.is_dictionary(current) and
+                (cls_def is None or util.is_dictionary(cls_def))):
+            k_type, v_type = get_dictionary_item_type(cls_def)
+            keys = set()
+            for k, v in sorted(obj.items(), key=operator.itemgetter(0)):
+                self._namestack.append(k)
+                k = self.restore(k, k_type)
+                keys.add(k)
+                current[k] = self._restore_into(current.get(k), v, v_type)
+                self._namestack.pop()
+            for k in list(current):
+                if k not in keys:
+                    del current[k]
+            return current
+
+        return self.restore(obj, cls_def)
+
+    def restore_raw(self, string, cls_def, decoder):
+        """Restores the JSON text `string` into an instance of cls_def,
+        keeping attributes declared as RawJSON as unparsed slices of
+        `string`.
+
+        Only the objects and collections leading to raw attributes are
+        scanned; every other value is decoded with `decoder` and restored
+        as usual.
+
+        >>> import json
+        >>> from jsonstruct.rawjson import RawJSON
+        >>> class Message(object):
+        ...     topic = ''
+        ...     body = RawJSON()
+        >>> u = Unpickler()
+        >>> m = u.restore_raw('{"body": [1, 2], "topic": "a"}', Message,
+        ...                   json.loads)
+        >>> m.topic, m.body.json
+        (u'a', '[1, 2]')
+        """
+        if not self._context:
+            return self._new_context().restore_raw(string, cls_def, decoder)
+
+        self._push()
+        start = rawjson.skip_whitespace(string, 0)
+        end = rawjson.scan_value(string, start)
+        if rawjson.skip_whitespace(string, end) != len(string):
+            raise ValueError('Extra data at %d' % end)
+        return self._pop(self._restore_span(string, start, end, cls_def,
+                                            decoder))
+
+    def _restore_span(self, s, start, end, cls_def, decoder):
+        """Restores the JSON value s[start:end] according to cls_def."""
+        if cls_def is rawjson.RawJSON:
+            return rawjson.RawJSON.from_slice(s, start, end)
+
+        if has_raw_attrs(cls_def):
+            c = s[start]
+            if c == '{' and util.is_type(cls_def):
+                instance = self._restore_object_span(s, start, cls_def,
+                                                     decoder)
+                if instance is not None:
+                    return instance
+            elif c == '[' and util.is_collection(cls_def):
+                return self._restore_collection_span(s, start, cls_def,
+                                                     decoder)
+            elif c == '{' and util.is_dictionary(cls_def):
+                return self._restore_dict_span(s, start, cls_def, decoder)
+
+        return self.restore(decoder(s[start:end]), cls_def)
+
+    def _restore_object_span(self, s, start, cls_def, decoder):
+        """Restores the JSON object starting at s[start] into an instance
+        of cls_def.  Returns None if it needs the generic restore path.
+        """
+        members = {}
+        for k, vstart, vend in rawjson.iter_object(s, start, decoder):
+            members[k] = (vstart, vend)
+
+        # Documents with references or type tags take the generic path
+        for tag in (tags.ID, tags.REF, tags.TYPE, tags.REPR, tags.STATE):
+            if tag in members:
+                return None
+        try:
+            instance = cls_def.__new__(cls_def)
+        except TypeError:
+            return None
+        self._mkref(instance)
+
+        for k in util.get_public_variables(cls_def):
+            span = members.get(k)
+            if span is None:
+                setattr(instance, k, None)
+                continue
+            self._namestack.append(k)
+            value = self._restore_span(s, span[0], span[1],
+                                       get_attr_cls_def(cls_def, k), decoder)
+            setattr(instance, k, value)
+            self._namestack.pop()
+        return instance
+
+    def _restore_collection_span(self, s, start, cls_def, decoder):
+        """Restores the JSON array starting at s[start] into a collection
+        of the type of cls_def.
+        """
+        parent = type(cls_def)()
+        self._mkref(parent)
+        item_type = get_collection_item_type(cls_def)
+        is_set = type(parent) is set
+        for vstart, vend in rawjson.iter_array(s, start):
+            value = self._restore_span(s, vstart, vend, item_type, decoder)
+            if is_set:
+                parent.add(value)
+            else:
+                parent.append(value)
+        return parent
+
+    def _restore_dict_span(self, s, start, cls_def, decoder):
+        """Restores the JSON object starting at s[start] into a dict."""
+        data = {}
+        k_type, v_type = get_dictionary_item_type(cls_def)
+        for k, vstart, vend in rawjson.iter_object(s, start, decoder):
+            self._namestack.append(k)
+            data[self.restore(k, k_type)] = self._restore_span(
+                    s, vstart, vend, v_type, decoder)
+            self._namestack.pop()
+        return data
+
     def _refname(self):
         """Calculates the name of the current location in the JSON stack.
 
@@ -345,6 +687,24 @@ def has_tag(obj, tag):
     return type(obj) is dict and tag in obj
 
 
+## Keys which make restore() treat a dict typed by a class differently from
+## a plain set of attributes
+SPECIAL_KEYS = frozenset([tags.ID, tags.REF, tags.TYPE, tags.REPR,
+                          tags.STATE, tags.TUPLE, tags.SET, tags.SEQ,
+                          'default_factory'])
+
+
+def _is_plain(obj):
+    """Returns True if the flattened dict `obj` carries no reference or
+    type tags.
+    """
+    for tag in (tags.ID, tags.REF, tags.TYPE, tags.REPR, tags.STATE,
+                tags.TUPLE, tags.SET):
+        if tag in obj:
+            return False
+    return True
+
+
 def get_attr_cls_def(cls_def, k):
     if not cls_def or not k:
         return None
@@ -355,18 +715,64 @@ def get_attr_cls_def(cls_def, k):
 
 
 def get_obj_cls_def(obj):
-    if not obj or util.is_function(obj):
+    if obj is None or util.is_function(obj):
         return None
 
     if util.is_container(obj):
-        return obj
+        # empty containers carry no item type
+        return obj or None
 
     if not util.is_primitive(obj):
+        if handlers.get(type(obj)) is not None:
+            # handlers may need the prototype itself, e.g. an array typecode
+            return obj
+        if not obj:
+            # e.g. an empty dict subclass, which declares no type
+            return None
         return type(obj)
 
     return None
 
 
+## Maps types to whether they have attributes declared as RawJSON
+_raw_attrs = {}
+
+
+def has_raw_attrs(cls_def):
+    """Returns True if restoring cls_def involves attributes declared as
+    RawJSON, directly or through nested types and collections.
+
+    >>> from jsonstruct.rawjson import RawJSON
+    >>> class Message(object):
+    ...     body = RawJSON()
+    >>> class Batch(object):
+    ...     messages = [Message()]
+    >>> has_raw_attrs(Batch), has_raw_attrs([Message()]), has_raw_attrs(int)
+    (True, True, False)
+    """
+    if cls_def is rawjson.RawJSON:
+        return True
+    if util.is_collection(cls_def):
+        return has_raw_attrs(get_collection_item_type(cls_def))
+    if util.is_dictionary(cls_def):
+        return has_raw_attrs(get_dictionary_item_type(cls_def)[1])
+    if not util.is_type(cls_def):
+        return False
+    try:
+        return _raw_attrs[cls_def]
+    except KeyError:
+        pass
+    # guards against types whose prototypes refer back to them
+    _raw_attrs[cls_def] = False
+    result = False
+    for k in util.get_public_variables(cls_def):
+        if has_raw_attrs(get_attr_cls_def(cls_def, k)):
+            result = True
+            break
+    _raw_attrs[cls_def] = result
+    return result
+
+
 def get_collection_item_type(cls_def):
     if cls_def and util.is_collection(cls_def):
         return get_obj_cls_def(cls_def.__iter__().next())
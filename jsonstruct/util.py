@@ -72,6 +72,18 @@ def is_primitive(obj):
         return True
     return False
 
+## Types of primitive values, including None
+PRIMITIVE_TYPES = PRIMITIVES | set([type(None)])
+
+
+def all_primitive(values):
+    """Returns True if every item of values is primitive.
+
+    >>> all_primitive([1, 'a', None]), all_primitive([1, [2]])
+    (True, False)
+    """
+    return not set(map(type, values)) - PRIMITIVE_TYPES
+
 def is_dictionary(obj):
     """Helper method for testing if the object is a dictionary.
 
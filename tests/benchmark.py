@@ -6,32 +6,451 @@
 #
 # This software is licensed as described in the file COPYING, which
 # you should have received as part of this distribution.
+"""Benchmark suite of jsonstruct.encode() and decode() on synthetic
+workloads, for each JSON backend.
 
+The workloads are generated from a fixed seed, so that runs on the same
+machine are comparable:
+
+    wide        objects with many attributes
+    deep        deeply nested objects
+    samples     a long list of jsonstruct._samples.Thing trees
+    developers  the Team of Developers of the README
+    documents   cyclic Document graphs, through Pickler and Unpickler
+                with references; the Document classes of _samples have no
+                prototypes, so the graphs use classes of the same shape
+    datetimes   records holding datetimes, dates and times
+
+For each workload, backend and operation it measures the latency
+percentiles of one call, the throughput and the peak memory of one call.
+Results can be written as JSON and compared with a baseline written by
+an earlier run:
+
+    python tests/benchmark.py --output baseline.json
+    python tests/benchmark.py --baseline baseline.json
+
+The comparison exits with status 1 if the median latency of any
+measurement grew by more than the tolerance.
+"""
+from __future__ import print_function
+
+import argparse
+import datetime
+import json as stdjson
+import os
+import platform
+import random
 import sys
 import timeit
 
-IS_25_DOWN = sys.version_info[:2] <= (2, 5)
+import jsonstruct
+from jsonstruct._samples import Thing
 
-number = 1000
+## Identifies the layout of the result files
+FORMAT = 1
 
-mod = 'json'
-if IS_25_DOWN:
-    mod = 'simplejson'
+WIDE_ATTRS = 100
 
-json = """\
-import feedparser
-import jsonstruct
-import jsonstruct.tests.thirdparty_tests as test
-doc = feedparser.parse(test.RSS_DOC)
 
-jsonstruct.set_preferred_backend('%s')
+class Wide(object):
+    pass
+
+for i in range(WIDE_ATTRS):
+    setattr(Wide, 'attr%03d' % i, (0, '', 0.0)[i % 3])
+
+
+class Deep(object):
+    name = ""
+    weight = 0.0
+
+Deep.child = Deep()
+
+
+class Address(object):
+    city = ""
+    province = ""
+
+
+class Developer(object):
+    name = ""
+    title = ""
+    address = Address()
+    safe_houses = [Address()]
+    work_locations = {"": Address()}
+    language_set = set([""])
+
+
+class Team(object):
+    developers = [Developer()]
+
+
+class Question(object):
+    name = ""
+
+
+class Section(object):
+    name = ""
+    questions = [Question()]
+
+
+class Document(object):
+    name = ""
+    sections = [Section()]
+
+Question.parent = Section()
+Section.parent = Document()
+
+
+class Record(object):
+    id = 0
+    created = datetime.datetime(1970, 1, 1)
+    updated = datetime.datetime(1970, 1, 1)
+    day = datetime.date(1970, 1, 1)
+    opens = datetime.time(0, 0)
+    history = [datetime.datetime(1970, 1, 1)]
+
+
+class Records(object):
+    records = [Record()]
+
+
+def word(rand):
+    return ''.join(rand.choice('abcdefghijklmnopqrstuvwxyz')
+                   for i in range(rand.randint(3, 10)))
+
+
+def make_wide(rand, scale):
+    objs = []
+    for n in range(20 * scale):
+        obj = Wide()
+        for i in range(WIDE_ATTRS):
+            value = (rand.randint(0, 1 << 20), word(rand),
+                     rand.random())[i % 3]
+            setattr(obj, 'attr%03d' % i, value)
+        objs.append(obj)
+    return objs
+
+
+def make_deep(rand, scale):
+    roots = []
+    for n in range(4 * scale):
+        root = node = Deep()
+        for depth in range(80):
+            node.name = word(rand)
+            node.weight = rand.random()
+            node.child = Deep()
+            node = node.child
+        node.child = None
+        roots.append(root)
+    return roots
+
+
+def make_samples(rand, scale):
+    things = []
+    for n in range(500 * scale):
+        thing = Thing(word(rand))
+        thing.child = Thing(word(rand))
+        things.append(thing)
+    return things
+
+
+def make_developers(rand, scale):
+    def address(city, province=None):
+        a = Address()
+        a.city = city
+        a.province = province
+        return a
+
+    team = Team()
+    team.developers = []
+    for i in range(200 * scale):
+        d = Developer()
+        d.name = word(rand)
+        d.title = rand.choice(['Developer', 'Tester', 'Manager'])
+        d.address = address(word(rand), 'Ontario')
+        d.safe_houses = [address(word(rand)), address(word(rand))]
+        d.work_locations = {'Company': address(word(rand), 'Ontario')}
+        d.language_set = set(rand.sample(['en', 'fr', 'de', 'es'], 2))
+        team.developers.append(d)
+    return team
+
+
+def make_documents(rand, scale):
+    documents = []
+    for n in range(2 * scale):
+        document = Document()
+        document.name = word(rand)
+        document.sections = []
+        for s in range(20):
+            section = Section()
+            section.name = word(rand)
+            section.parent = document
+            section.questions = []
+            document.sections.append(section)
+            for q in range(10):
+                question = Question()
+                question.name = word(rand)
+                question.parent = section
+                section.questions.append(question)
+        documents.append(document)
+    return documents
+
+
+def make_datetimes(rand, scale):
+    start = datetime.datetime(2013, 5, 1)
+
+    def stamp():
+        return start + datetime.timedelta(seconds=rand.randint(0, 1 << 25),
+                                          microseconds=rand.randint(0, 999999))
+
+    records = Records()
+    records.records = []
+    for i in range(300 * scale):
+        r = Record()
+        r.id = i
+        r.created = stamp()
+        r.updated = stamp()
+        r.day = r.created.date()
+        r.opens = r.updated.time()
+        r.history = [stamp() for j in range(3)]
+        records.records.append(r)
+    return records
+
+
+def encode_references(value):
+    pickler = jsonstruct.Pickler(plain_dicts=True)
+    return jsonstruct.json.encode(pickler.flatten(value))
+
+
+def decode_references(string, cls):
+    return jsonstruct.Unpickler().restore(jsonstruct.json.decode(string),
+                                          cls)
+
+
+## name: (generator, class given to decode(), encode, decode)
+WORKLOADS = [
+    ('wide', make_wide, [Wide()], jsonstruct.encode, jsonstruct.decode),
+    ('deep', make_deep, [Deep()], jsonstruct.encode, jsonstruct.decode),
+    ('samples', make_samples, None, jsonstruct.encode, jsonstruct.decode),
+    ('developers', make_developers, Team, jsonstruct.encode,
+     jsonstruct.decode),
+    ('documents', make_documents, [Document()], encode_references,
+     decode_references),
+    ('datetimes', make_datetimes, Records, jsonstruct.encode,
+     jsonstruct.decode),
+]
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1,
+                int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def latencies(func, arg, repeat):
+    """Returns the sorted seconds of repeat calls of func(arg)."""
+    func(*arg)
+    timer = timeit.default_timer
+    times = []
+    for i in range(repeat):
+        start = timer()
+        func(*arg)
+        times.append(timer() - start)
+    times.sort()
+    return times
+
+
+def status_kb(field):
+    """Returns a field of /proc/self/status in KB, or None."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except (IOError, OSError):
+        pass
+    return None
+
+
+def reset_peak_rss():
+    """Resets the peak RSS of the process, on Linux 4.0 and later."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except (IOError, OSError):
+        return False
+
+
+def peak_memory(func, arg):
+    """Returns the peak memory of a call of func(arg) in KB, and how it
+    was measured: with tracemalloc where available, otherwise as the
+    growth of the RSS of a forked child over its peak.  Returns (None,
+    None) if neither is possible.
+    """
+    try:
+        import tracemalloc
+    except ImportError:
+        tracemalloc = None
+    if tracemalloc is not None:
+        tracemalloc.start()
+        try:
+            func(*arg)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return peak // 1024, 'tracemalloc'
+    if not hasattr(os, 'fork') or not reset_peak_rss():
+        return None, None
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        # the peak RSS of a child starts at that of its parent
+        reset_peak_rss()
+        before = status_kb('VmRSS')
+        func(*arg)
+        os.write(write, str(status_kb('VmHWM') - before).encode())
+        os._exit(0)
+    os.close(write)
+    result = os.read(read, 64).decode()
+    os.close(read)
+    os.waitpid(pid, 0)
+    return int(result), 'rss'
+
+
+def measure(func, arg, repeat, size, memory):
+    times = latencies(func, arg, repeat)
+    median = percentile(times, 0.5)
+    result = {
+        'bytes': size,
+        'repeat': repeat,
+        'p50_ms': median * 1000,
+        'p90_ms': percentile(times, 0.9) * 1000,
+        'p99_ms': percentile(times, 0.99) * 1000,
+        'min_ms': times[0] * 1000,
+        'ops_per_s': 1 / median if median else None,
+        'mb_per_s': size / median / 1e6 if median else None,
+    }
+    if memory:
+        result['peak_kb'], result['memory'] = peak_memory(func, arg)
+    return result
+
+
+def run(backends, workloads, repeat, scale, seed, memory, report):
+    results = {}
+    preferred = jsonstruct.json._backend_names[:]
+    try:
+        for name, generate, cls, encode, decode in WORKLOADS:
+            if workloads and name not in workloads:
+                continue
+            value = generate(random.Random(seed), scale)
+            for backend in backends:
+                jsonstruct.set_preferred_backend(backend)
+                encoded = encode(value)
+                size = len(encoded)
+                for op, func, arg in (('encode', encode, (value,)),
+                                      ('decode', decode, (encoded, cls))):
+                    key = '%s/%s/%s' % (name, backend, op)
+                    results[key] = measure(func, arg, repeat, size, memory)
+                    report(key, results[key])
+    finally:
+        for backend in reversed(preferred):
+            jsonstruct.set_preferred_backend(backend)
+    return results
+
+
+def print_result(key, result):
+    peak = result.get('peak_kb')
+    print('%-32s %9.2f %9.2f %9.2f %9.1f %9s' % (
+        key, result['p50_ms'], result['p90_ms'], result['p99_ms'],
+        result['mb_per_s'] or 0, '-' if peak is None else peak))
+
+
+def compare(results, baseline, tolerance):
+    """Prints the median latencies against the baseline and returns the
+    keys of the measurements slower by more than tolerance.
+    """
+    regressions = []
+    print()
+    print('%-32s %9s %9s %9s' % ('vs baseline', 'base ms', 'now ms',
+                                 'ratio'))
+    for key in sorted(results):
+        base = baseline.get(key)
+        if base is None or not base['p50_ms']:
+            continue
+        ratio = results[key]['p50_ms'] / base['p50_ms']
+        flag = ''
+        if ratio > 1 + tolerance:
+            flag = '  slower'
+            regressions.append(key)
+        print('%-32s %9.2f %9.2f %9.2f%s' % (
+            key, base['p50_ms'], results[key]['p50_ms'], ratio, flag))
+    return regressions
+
+
+def main(argv=None):
+    loaded = jsonstruct.json._backend_names
+    parser = argparse.ArgumentParser(
+        description='Benchmarks jsonstruct on synthetic workloads.')
+    parser.add_argument('--backends', default=','.join(loaded),
+                        help='comma separated backends (default: %(default)s)')
+    parser.add_argument('--workloads', default='',
+                        help='comma separated workloads (default: all of %s)'
+                        % ', '.join(w[0] for w in WORKLOADS))
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='calls measured per operation')
+    parser.add_argument('--scale', type=int, default=1,
+                        help='multiplies the size of the workloads')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help='skip the peak memory measurements')
+    parser.add_argument('--output', help='writes the results to this file')
+    parser.add_argument('--baseline',
+                        help='compares the results with this file')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed growth of the median latency')
+    args = parser.parse_args(argv)
+
+    backends = [b for b in args.backends.split(',') if b]
+    for backend in backends:
+        if backend not in loaded:
+            parser.error('backend %r is not loaded' % backend)
+    workloads = [w for w in args.workloads.split(',') if w]
+    # the deep workload nests beyond the default recursion limit
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+
+    print('%-32s %9s %9s %9s %9s %9s' % ('workload/backend/op', 'p50 ms',
+                                         'p90 ms', 'p99 ms', 'MB/s',
+                                         'peak KB'))
+    results = run(backends, workloads, args.repeat, args.scale, args.seed,
+                  args.memory, print_result)
+    document = {
+        'format': FORMAT,
+        'jsonstruct': jsonstruct.__version__,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'scale': args.scale,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            stdjson.dump(document, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = stdjson.load(f)
+        if baseline.get('format') != FORMAT:
+            parser.error('%s is not a result file of this version'
+                         % args.baseline)
+        if (baseline.get('scale'), baseline.get('seed')) != (args.scale,
+                                                            args.seed):
+            print('warning: the baseline was run with another scale or seed')
+        if compare(results, baseline['results'], args.tolerance):
+            return 1
+    return 0
 
-pickled = jsonstruct.encode(doc)
-unpickled = jsonstruct.decode(pickled)
-if doc['feed']['title'] != unpickled['feed']['title']:
-    print 'Not a match'
-""" % mod
 
-print 'Using %s' % mod
-json_test = timeit.Timer(stmt=json)
-print "%.9f sec/pass " % (json_test.timeit(number=number) / number)
+if __name__ == '__main__':
+    sys.exit(main())
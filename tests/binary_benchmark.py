@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""Measures the encode and decode throughput of binary payloads, from 1KB
+to 10MB, against base64 over a copy of the payload.  The handler column
+flattens the payload with BinaryHandler alone, without the per-call cost
+of encode(), so that small payloads show what the handler itself costs.
+
+    python tests/binary_benchmark.py
+"""
+from __future__ import print_function
+
+import base64
+import os
+import timeit
+
+import jsonstruct
+from jsonstruct._handlers import BinaryHandler
+from jsonstruct.pickler import Pickler
+
+SIZES = [1 << 10, 64 << 10, 1 << 20, 10 << 20]
+
+
+class Blob(object):
+    data = bytearray()
+
+
+def throughput(func, size):
+    number = max(1, (32 << 20) // size)
+    seconds = min(timeit.repeat(func, number=number, repeat=3)) / number
+    return size / seconds / (1 << 20)
+
+
+def main():
+    print('%10s %14s %14s %14s %14s' % ('size', 'encode MB/s',
+                                        'decode MB/s', 'handler MB/s',
+                                        'copy+b64 MB/s'))
+    handler = BinaryHandler(Pickler(unpicklable=False))
+    for size in SIZES:
+        blob = Blob()
+        blob.data = bytearray(os.urandom(size))
+        encoded = jsonstruct.encode(blob)
+        assert jsonstruct.decode(encoded, Blob).data == blob.data
+
+        encode = throughput(lambda: jsonstruct.encode(blob), size)
+        decode = throughput(lambda: jsonstruct.decode(encoded, Blob), size)
+        alone = throughput(lambda: handler.flatten(blob.data, {}), size)
+        naive = throughput(lambda: jsonstruct.json.encode(
+                {'data': base64.b64encode(bytes(blob.data)).decode('ascii')}),
+            size)
+        print('%9dK %14.1f %14.1f %14.1f %14.1f' % (size >> 10, encode, decode,
+                                                   alone, naive))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""Compares the generic Pickler and Unpickler with the encoders and decoders
+generated by jsonstruct.codegen, on a list of the Developer objects from the
+README.
+
+    python tests/codegen_benchmark.py
+"""
+from __future__ import print_function
+
+import timeit
+
+import jsonstruct
+
+from samples import Developer, new_address
+
+COUNT = 10000
+
+
+class Team(object):
+    developers = [Developer()]
+
+
+def new_team():
+    team = Team()
+    team.developers = []
+    for i in range(COUNT):
+        d = Developer()
+        d.name = 'Bob %d' % i
+        d.title = 'Developer'
+        d.address = new_address('Toronto', 'Ontario')
+        d.safe_houses = [new_address('Secret'),
+                         new_address('Middle of nowhere')]
+        d.work_locations = {'Company': new_address('Markham', 'Ontario')}
+        d.language_set = set(['en', 'fr'])
+        team.developers.append(d)
+    return team
+
+
+def generic_encode(team):
+    return jsonstruct.encode(team)
+
+
+def codegen_encode(team):
+    return jsonstruct.encode(team, codegen=True)
+
+
+def generic_decode(encoded):
+    return jsonstruct.decode(encoded, Team)
+
+
+def codegen_decode(encoded):
+    return jsonstruct.decode(encoded, Team, codegen=True)
+
+
+def report(func, arg):
+    seconds = min(timeit.repeat(lambda: func(arg), number=1, repeat=3))
+    print('%-16s %8.1f ms  %8.2f us/developer' % (
+        func.__name__, seconds * 1000, seconds * 1e6 / COUNT))
+
+
+def main():
+    team = new_team()
+    encoded = jsonstruct.encode(team)
+    assert codegen_encode(team) == encoded
+    assert (jsonstruct.encode(codegen_decode(encoded)) ==
+            jsonstruct.encode(generic_decode(encoded)))
+    print('%d developers, %d bytes' % (COUNT, len(encoded)))
+    report(generic_encode, team)
+    report(codegen_encode, team)
+    report(generic_decode, encoded)
+    report(codegen_decode, encoded)
+
+
+if __name__ == '__main__':
+    main()
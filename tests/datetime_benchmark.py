@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""Compares the ISO 8601 encoding of datetimes with the __reduce__ based
+one on a list of datetimes, and the ISO 8601 parser with strptime().
+
+    python tests/datetime_benchmark.py
+"""
+from __future__ import print_function
+
+import datetime
+import timeit
+
+import jsonstruct
+from jsonstruct import isodate
+
+COUNT = 10000
+
+
+class Log(object):
+    stamps = [datetime.datetime(1970, 1, 1)]
+
+
+def reduce_round_trip(log):
+    flat = jsonstruct.Pickler().flatten(log.stamps)
+    encoded = jsonstruct.json.encode(flat)
+    return jsonstruct.Unpickler().restore(jsonstruct.json.decode(encoded),
+                                          Log.stamps)
+
+
+def iso_round_trip(log):
+    return jsonstruct.decode(jsonstruct.encode(log, iso8601=True),
+                             Log).stamps
+
+
+def strptime_round_trip(log):
+    encoded = jsonstruct.json.encode(
+            [v.strftime('%Y-%m-%dT%H:%M:%S.%f') for v in log.stamps])
+    return [datetime.datetime.strptime(v, '%Y-%m-%dT%H:%M:%S.%f')
+            for v in jsonstruct.json.decode(encoded)]
+
+
+def isodate_parse(texts):
+    return [isodate.parse(v, datetime.datetime) for v in texts]
+
+
+def strptime_parse(texts):
+    return [datetime.datetime.strptime(v, '%Y-%m-%dT%H:%M:%S.%f')
+            for v in texts]
+
+
+def report(func, arg):
+    seconds = min(timeit.repeat(lambda: func(arg), number=1, repeat=3))
+    print('%-22s %8.1f ms  %8.2f us/value' % (
+        func.__name__, seconds * 1000, seconds * 1e6 / COUNT))
+
+
+def main():
+    start = datetime.datetime(2013, 5, 1)
+    log = Log()
+    log.stamps = [start + datetime.timedelta(seconds=i, microseconds=i)
+                  for i in range(COUNT)]
+    for func in (reduce_round_trip, iso_round_trip, strptime_round_trip):
+        assert func(log) == log.stamps, func.__name__
+        report(func, log)
+    texts = [v.strftime('%Y-%m-%dT%H:%M:%S.%f') for v in log.stamps]
+    for func in (isodate_parse, strptime_parse):
+        assert func(texts) == log.stamps, func.__name__
+        report(func, texts)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""Measures the memory of forked workers decoding and encoding many
+classes with codegen, with and without jsonstruct.freeze() in the master.
+
+Each worker reports its RSS and the part of it which is private, i.e. not
+shared with the master any more, after handling one document per class.
+Linux only, as it reads /proc/self/smaps_rollup or /proc/self/smaps.
+
+    python tests/fork_benchmark.py [classes] [workers]
+"""
+from __future__ import print_function
+
+import os
+import sys
+
+import jsonstruct
+
+
+def make_classes(count):
+    """Returns `count` classes with a nested class and a list of them."""
+    classes = []
+    for i in range(count):
+        item = type('Item%d' % i, (object,), {
+            'name': '', 'weight': 0.0, 'tags': [''],
+        })
+        classes.append(type('Record%d' % i, (object,), {
+            'id': 0, 'title': '', 'item': item(), 'items': [item()],
+            'extra': {'': item()},
+        }))
+    return classes
+
+
+def document(i):
+    item = '{"name": "n%d", "weight": 1.5, "tags": ["a", "b"]}' % i
+    return ('{"id": %d, "title": "t", "item": %s, "items": [%s, %s],'
+            ' "extra": {"x": %s}}' % (i, item, item, item, item))
+
+
+def memory():
+    """Returns (rss, private) in KB."""
+    path = '/proc/self/smaps_rollup'
+    if not os.path.exists(path):
+        path = '/proc/self/smaps'
+    rss = private = 0
+    with open(path) as f:
+        for line in f:
+            if line.startswith('Rss:'):
+                rss += int(line.split()[1])
+            elif line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                private += int(line.split()[1])
+    return rss, private
+
+
+def worker(classes, write):
+    for i, cls in enumerate(classes):
+        obj = jsonstruct.decode(document(i), cls, codegen=True)
+        jsonstruct.encode(obj, codegen=True)
+    os.write(write, ('%d %d' % memory()).encode())
+    os._exit(0)
+
+
+def measure(classes, workers, frozen):
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # a fresh master, so that runs do not share generated state
+        os.close(read)
+        if frozen:
+            jsonstruct.freeze(classes)
+        pids = []
+        pipes = []
+        for i in range(workers):
+            r, w = os.pipe()
+            child = os.fork()
+            if child == 0:
+                worker(classes, w)
+            os.close(w)
+            pids.append(child)
+            pipes.append(r)
+        results = []
+        for child, r in zip(pids, pipes):
+            results.append(os.read(r, 64).decode())
+            os.waitpid(child, 0)
+        os.write(write, ';'.join(results).encode())
+        os._exit(0)
+    os.close(write)
+    data = b''
+    while True:
+        chunk = os.read(read, 4096)
+        if not chunk:
+            break
+        data += chunk
+    os.waitpid(pid, 0)
+    results = [tuple(map(int, r.split())) for r in data.decode().split(';')]
+    return (sum(r[0] for r in results) // len(results),
+            sum(r[1] for r in results) // len(results))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    classes = make_classes(count)
+    print('%d classes, %d workers' % (count, workers))
+    print('%-20s %12s %12s' % ('per worker', 'RSS KB', 'private KB'))
+    for frozen in (False, True):
+        rss, private = measure(classes, workers, frozen)
+        print('%-20s %12d %12d' % ('freeze()' if frozen else 'lazy',
+                                   rss, private))
+
+if __name__ == '__main__':
+    main()
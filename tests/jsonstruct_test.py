@@ -663,6 +663,14 @@ class jsonstructTestCase(unittest.TestCase):
 
         self.assertEqual(d, decoded)
 
+    def test_all(self):
+        namespace = {}
+        exec 'from jsonstruct import *' in namespace
+        for name in ('decode_into', 'stats', 'set_tracer', 'warmup',
+                     'freeze', 'diff', 'apply_patch', 'decode_columns',
+                     'immutable', 'EncoderProfile'):
+            self.assertTrue(namespace[name] is getattr(jsonstruct, name))
+
 
 # Test classes for ExternalHandlerTestCase
 class Mixin(object):
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""Measures the peak memory of flattening a large object graph into
+ObjDicts and into plain dicts, and the memory the flattened tree retains
+once the graph is dropped.
+
+Each measurement runs in a forked child, so that peak RSS (ru_maxrss) is
+not shared between measurements.  POSIX only; the retained memory is read
+from /proc/self/status, on Linux only.  It is measured from the RSS
+before the graph is built, so it includes whatever the tree keeps of the
+graph, and memory which the allocator does not give back to the system.
+
+    python tests/memory_benchmark.py [nodes]
+"""
+from __future__ import print_function
+
+import gc
+import os
+import resource
+import sys
+import time
+
+import jsonstruct
+
+
+class Node(object):
+    def __init__(self, i, children):
+        self.name = 'node-%d' % i
+        self.weight = i * 0.5
+        self.tags = {'level': i % 7}
+        self.children = children
+
+
+def build(count, fanout=4):
+    """Returns the root of a tree of `count` nodes."""
+    nodes = [Node(i, []) for i in range(count)]
+    for i in range(1, count):
+        nodes[(i - 1) // fanout].children.append(nodes[i])
+    return nodes[0]
+
+
+def maxrss():
+    """Peak RSS in KB (ru_maxrss is in bytes on OS X)."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss //= 1024
+    return rss
+
+
+def rss():
+    """Current RSS in KB, or -1 where /proc is not available."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except (IOError, OSError):
+        pass
+    return -1
+
+
+def measure(count, plain_dicts, drop_source):
+    """Returns the peak KB, or with drop_source the KB retained by the
+    flattened tree alone, and the seconds taken by flatten().
+    """
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        gc.collect()
+        start_rss = rss()
+        root = build(count)
+        before = maxrss()
+        start = time.time()
+        pickler = jsonstruct.Pickler(unpicklable=False,
+                                     plain_dicts=plain_dicts)
+        flat = pickler.flatten(root)
+        elapsed = time.time() - start
+        if drop_source:
+            # only the flattened tree is kept, e.g. queued for encoding
+            del root
+            gc.collect()
+            kb = rss() - start_rss if start_rss >= 0 else -1
+        else:
+            kb = maxrss() - before
+        os.write(write, ('%d %f' % (kb, elapsed)).encode())
+        del flat
+        os._exit(0)
+    os.close(write)
+    result = os.read(read, 64).decode().split()
+    os.waitpid(pid, 0)
+    return int(result[0]), float(result[1])
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    print('%d nodes' % count)
+    for drop_source in (False, True):
+        print()
+        print('%-34s %12s %10s' % ('', 'retained KB' if drop_source else
+                                   'peak +KB', 'seconds'))
+        for plain_dicts in (False, True):
+            label = '%s%s' % ('plain dicts' if plain_dicts else 'ObjDicts',
+                              ', source dropped' if drop_source else '')
+            kb, elapsed = measure(count, plain_dicts, drop_source)
+            print('%-34s %12s %10.2f' % (label, kb if kb >= 0 else '-',
+                                          elapsed))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Classes and factories shared by the tests and the benchmarks."""
+
+import datetime
+
+
+class Address(object):
+    city = ""
+    province = ""
+
+
+class Developer(object):
+    name = ""
+    title = ""
+    address = Address()
+    safe_houses = [Address()]
+    work_locations = {"": Address()}
+    language_set = set([""])
+    started = datetime.date(2013, 5, 1)
+    scores = [0]
+
+
+class Leaf(object):
+    name = ""
+
+
+class Tree(object):
+    name = ""
+    leaves = [Leaf()]
+
+# the prototypes of Tree and Leaf refer to each other
+Leaf.tree = Tree()
+
+
+def new_address(city=None, province=None):
+    address = Address()
+    address.city = city
+    address.province = province
+    return address
+
+
+def make_developer():
+    """Returns a Developer with every attribute set and no shared objects."""
+    d = Developer()
+    d.name = 'Bob'
+    d.title = 'Developer'
+    d.address = Address()
+    d.address.city = 'Toronto'
+    d.address.province = 'Ontario'
+    d.safe_houses = [Address(), Address()]
+    d.safe_houses[0].city = 'Secret'
+    d.safe_houses[1].city = 'Nowhere'
+    d.work_locations = {'Company': Address()}
+    d.work_locations['Company'].city = 'Markham'
+    d.language_set = set(['en'])
+    d.started = datetime.date(2013, 5, 1)
+    d.scores = [1, 2, 3]
+    return d
+
+
+def new_developer(i=0):
+    """Returns the i-th Developer of a series, whose first safe house is a
+    reference to its address and whose work location is its second one.
+    """
+    d = Developer()
+    d.name = 'dev-%d' % i
+    d.address = Address()
+    d.address.city = 'city-%d' % i
+    d.safe_houses = [d.address, Address()]
+    d.safe_houses[1].city = 'safe-%d' % i
+    d.work_locations = {'Company': d.safe_houses[1]}
+    d.started = datetime.date(2013, 5, 1)
+    return d
@@ -0,0 +1,132 @@
+import array
+import collections
+import datetime
+import unittest
+
+import jsonstruct
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class Series(object):
+    name = ""
+    samples = array.array('d')
+    counts = array.array('l', [0])
+    history = [array.array('h')]
+
+
+class Options(collections.OrderedDict):
+    pass
+
+
+class Settings(object):
+    options = collections.OrderedDict()
+    custom = Options()
+    closing = datetime.time(17, 30)
+    midnight = datetime.time()
+
+
+class ArrayTestCase(unittest.TestCase):
+    def test_encode_as_list(self):
+        self.assertEqual('[1.5, 2.0]',
+                         jsonstruct.encode(array.array('d', [1.5, 2])))
+
+    def test_typed_decode(self):
+        s = Series()
+        s.name = 'cpu'
+        s.samples = array.array('d', [0.5, 1.0])
+        s.counts = array.array('l', [1, 2, 3])
+        s.history = [array.array('h', [1]), array.array('h', [2, 3])]
+        decoded = jsonstruct.decode(jsonstruct.encode(s), Series)
+        self.assertEqual(s.samples, decoded.samples)
+        self.assertEqual(s.counts, decoded.counts)
+        self.assertEqual('l', decoded.counts.typecode)
+        self.assertEqual(s.history, decoded.history)
+        self.assertEqual('h', decoded.history[1].typecode)
+
+    def test_typed_decode_mismatch(self):
+        decoded = jsonstruct.decode('{"samples": "x", "counts": [1.5]}',
+                                    Series)
+        self.assertEqual(None, decoded.samples)
+        self.assertEqual(None, decoded.counts)
+
+    def test_dict_without_payload(self):
+        decoded = jsonstruct.decode('{"samples": {"a": 1}}', Series)
+        self.assertEqual({'a': 1}, decoded.samples)
+        decoded = jsonstruct.decode('{"counts": {"a": 1}}', Series)
+        self.assertEqual(None, decoded.counts)
+
+    def test_handled_prototypes_given_a_dict(self):
+        decoded = jsonstruct.decode(
+            '{"options": {"a": 1}, "custom": {"a": 1}, "closing": {"a": 1},'
+            ' "midnight": {"a": 1}}', Settings)
+        # empty and false prototypes declare no type, as before
+        self.assertEqual({'a': 1}, decoded.options)
+        self.assertEqual({'a': 1}, decoded.custom)
+        self.assertEqual({'a': 1}, decoded.midnight)
+        # a type mismatch
+        self.assertEqual(None, decoded.closing)
+
+    def test_unpicklable_round_trip(self):
+        value = array.array('i', [1, -2, 3])
+        flattened = jsonstruct.Pickler().flatten(value)
+        self.assertTrue('base64' in flattened)
+        restored = jsonstruct.Unpickler().restore(dict(flattened),
+                                                  array.array)
+        self.assertEqual(value, restored)
+
+    def test_byteswap(self):
+        value = array.array('i', [1, 256])
+        flattened = dict(jsonstruct.Pickler().flatten(value))
+        swapped = array.array('i', value)
+        swapped.byteswap()
+        flattened['base64'] = jsonstruct.Pickler().flatten(
+            swapped)['base64']
+        flattened['byteorder'] = {'little': 'big',
+                                  'big': 'little'}[flattened['byteorder']]
+        self.assertEqual(value, jsonstruct.Unpickler().restore(flattened,
+                                                               array.array))
+
+
+class NumpyTestCase(unittest.TestCase):
+    def setUp(self):
+        if numpy is None:
+            self.skipTest('numpy is not installed')
+
+    def test_encode_as_list(self):
+        self.assertEqual('[[1, 2], [3, 4]]',
+                         jsonstruct.encode(numpy.array([[1, 2], [3, 4]])))
+
+    def test_scalars(self):
+        self.assertEqual('[1.5, 2, true]', jsonstruct.encode(
+            [numpy.float64(1.5), numpy.int32(2), numpy.bool_(True)]))
+
+    def test_typed_decode(self):
+        class Frame(object):
+            values = numpy.zeros(0, dtype='float32')
+            total = numpy.int64(0)
+        decoded = jsonstruct.decode('{"values": [[1, 2]], "total": 3}',
+                                    Frame)
+        self.assertEqual(numpy.float32, decoded.values.dtype)
+        self.assertEqual((1, 2), decoded.values.shape)
+        self.assertEqual(numpy.int64, type(decoded.total))
+
+    def test_unpicklable_round_trip(self):
+        value = numpy.arange(6, dtype='>i4').reshape(2, 3)
+        flattened = dict(jsonstruct.Pickler().flatten(value))
+        restored = jsonstruct.Unpickler().restore(flattened, numpy.ndarray)
+        self.assertEqual(value.tolist(), restored.tolist())
+        self.assertEqual(value.dtype, restored.dtype)
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(ArrayTestCase))
+    suite.addTest(unittest.makeSuite(NumpyTestCase))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
@@ -0,0 +1,64 @@
+import unittest
+
+import jsonstruct
+
+
+class Attachment(object):
+    name = ""
+    data = bytearray()
+    view = memoryview(b'')
+
+
+class BinaryTestCase(unittest.TestCase):
+    def test_encode_as_base64(self):
+        self.assertEqual('"AAEC/w=="',
+                         jsonstruct.encode(bytearray(b'\x00\x01\x02\xff')))
+        self.assertEqual('"YWJj"', jsonstruct.encode(memoryview(b'abc')))
+
+    def test_typed_decode(self):
+        a = Attachment()
+        a.name = 'blob'
+        a.data = bytearray(range(256)) * 4
+        a.view = memoryview(b'\x00view')
+        decoded = jsonstruct.decode(jsonstruct.encode(a), Attachment)
+        self.assertEqual('blob', decoded.name)
+        self.assertTrue(type(decoded.data) is bytearray)
+        self.assertEqual(a.data, decoded.data)
+        self.assertTrue(type(decoded.view) is memoryview)
+        self.assertEqual(b'\x00view', decoded.view.tobytes())
+
+    def test_empty(self):
+        a = Attachment()
+        a.data = bytearray()
+        decoded = jsonstruct.decode(jsonstruct.encode(a), Attachment)
+        self.assertEqual(bytearray(), decoded.data)
+
+    def test_typed_decode_mismatch(self):
+        decoded = jsonstruct.decode('{"data": 5, "view": [1]}', Attachment)
+        self.assertEqual(None, decoded.data)
+        self.assertEqual(None, decoded.view)
+
+    def test_unpicklable_round_trip(self):
+        value = bytearray(b'payload')
+        flattened = jsonstruct.Pickler().flatten(value)
+        self.assertEqual('cGF5bG9hZA==', flattened['base64'])
+        self.assertEqual(value, jsonstruct.Unpickler().restore(
+            dict(flattened), bytearray))
+
+    def test_non_contiguous_view(self):
+        view = memoryview(bytearray(b'abcdef'))
+        try:
+            view = view[::2]
+        except (TypeError, NotImplementedError):
+            # slicing with a step needs Python 3
+            return
+        self.assertEqual('"YWNl"', jsonstruct.encode(view))
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(BinaryTestCase))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
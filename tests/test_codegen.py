@@ -0,0 +1,263 @@
+import datetime
+import unittest
+
+import jsonstruct
+from jsonstruct import codegen
+
+from samples import Address, Developer, Leaf, Tree, new_address
+
+
+class Person(object):
+    def __init__(self, name=None, address=None, tags=None):
+        self.name = name
+        self.address = address
+        self.tags = tags
+
+
+class Slotted(object):
+    __slots__ = ('x',)
+
+    def __init__(self, x=1):
+        self.x = x
+
+
+class Stateful(object):
+    def __init__(self):
+        self.x = 1
+
+    def __getstate__(self):
+        return {'y': 2}
+
+    def __setstate__(self, state):
+        pass
+
+
+class Node(object):
+    name = ""
+
+Node.parent = Node()
+Node.children = [Node()]
+
+
+class Doubling(object):
+    x = 0
+
+    def __setattr__(self, name, value):
+        if value is not None:
+            value *= 2
+        object.__setattr__(self, name, value)
+
+
+class CodegenEncoderTestCase(unittest.TestCase):
+    def setUp(self):
+        codegen.default_encoders.clear()
+
+    def assertSameAsGeneric(self, obj, **kwargs):
+        generic = jsonstruct.Pickler(**kwargs).flatten(obj)
+        generated = jsonstruct.Pickler(codegen=True, **kwargs).flatten(obj)
+        self.assertEqual(jsonstruct.json.encode(generic),
+                         jsonstruct.json.encode(generated))
+        return generated
+
+    def test_same_as_generic(self):
+        people = [Person('Bob', new_address('Toronto'), ['a', 1]),
+                  Person('Alice', None, {'b': [new_address('Markham', 'ON')]})]
+        for kwargs in ({}, {'unpicklable': False},
+                       {'unpicklable': False, 'is_filter_none_attr': False}):
+            self.assertSameAsGeneric(people, **kwargs)
+        self.assertTrue(codegen.encoder_source(Person, True, True))
+        self.assertTrue(codegen.encoder_source(Address, False, False))
+
+    def test_encode(self):
+        person = Person('Bob', new_address('Toronto', 'Ontario'),
+                        [datetime.date(2013, 5, 1)])
+        self.assertEqual(jsonstruct.encode(person),
+                         jsonstruct.encode(person, codegen=True))
+        self.assertEqual(None, codegen.encoder_source(datetime.date))
+
+    def test_mismatching_instance_falls_back(self):
+        jsonstruct.encode(new_address('Toronto'), codegen=True)
+        odd = new_address('Toronto')
+        odd.extra = 1
+        self.assertEqual({'city': 'Toronto', 'extra': 1},
+                         jsonstruct.decode(jsonstruct.encode(odd,
+                                                             codegen=True)))
+        del odd.city
+        self.assertEqual({'province': None, 'extra': 1},
+                         jsonstruct.decode(jsonstruct.encode(
+                             odd, codegen=True, is_filter_none_attr=False)))
+
+    def test_unsupported_classes(self):
+        self.assertSameAsGeneric(Slotted(), unpicklable=False)
+        self.assertSameAsGeneric(Stateful())
+        self.assertEqual(None, codegen.encoder_source(Slotted, True, False))
+        self.assertEqual(None, codegen.encoder_source(Stateful, True, True))
+
+    def test_not_used_with_max_depth(self):
+        encoded = jsonstruct.encode(new_address('Toronto'), max_depth=1,
+                                    codegen=True)
+        self.assertEqual({'city': "'Toronto'"}, jsonstruct.decode(encoded))
+        self.assertEqual(0, len(codegen.default_encoders))
+
+    def test_prepare_from_prototype(self):
+        class Point(object):
+            x = 0
+            y = 0
+        codegen.default_encoders.prepare(Point)
+        self.assertTrue("d['x']" in codegen.encoder_source(Point))
+        point = Point()
+        point.x, point.y = 1, 2
+        self.assertEqual({'x': 1, 'y': 2},
+                         jsonstruct.decode(jsonstruct.encode(point,
+                                                             codegen=True)))
+
+    def test_prepared_class_with_constants(self):
+        class Account(object):
+            KIND = 'account'
+            owner = ""
+
+            @property
+            def label(self):
+                return self.KIND + ':' + self.owner
+
+        codegen.default_encoders.prepare(Account)
+        self.assertTrue("d['KIND']" in codegen.encoder_source(Account))
+        self.assertFalse("d['label']" in codegen.encoder_source(Account))
+        account = Account()
+        account.owner = 'Bob'
+        self.assertEqual({'owner': 'Bob'},
+                         jsonstruct.decode(jsonstruct.encode(account,
+                                                             codegen=True)))
+        # generated again from the instance, which it matches
+        source = codegen.encoder_source(Account)
+        self.assertTrue('if len(d) != 1:' in source)
+        self.assertFalse("d['KIND']" in source)
+        self.assertTrue(codegen.default_encoders.get(account, True, False)(
+            account, {}, None) is not None)
+        self.assertEqual(None, codegen.default_encoders.regenerate(
+            account, True, False))
+
+    def test_traceback_shows_source(self):
+        import linecache
+        jsonstruct.encode(new_address('Toronto'), codegen=True)
+        filename = '<jsonstruct.codegen samples.Address>'
+        self.assertTrue('def encode_Address' in
+                        linecache.getline(filename, 1))
+
+
+class CodegenDecoderTestCase(unittest.TestCase):
+    def setUp(self):
+        codegen.default_decoders.clear()
+
+    def assertSameAsGeneric(self, string, cls):
+        generic = jsonstruct.decode(string, cls)
+        generated = jsonstruct.decode(string, cls, codegen=True)
+        # unpicklable output keeps the cycles and the types
+        self.assertEqual(jsonstruct.Pickler(plain_dicts=True).flatten(generic),
+                         jsonstruct.Pickler(plain_dicts=True).flatten(generated))
+        return generated
+
+    def test_developer(self):
+        developer = self.assertSameAsGeneric(
+            '{"name": "Bob", "title": "Developer",'
+            ' "address": {"city": "Toronto", "province": "Ontario"},'
+            ' "safe_houses": [{"city": "Secret"}, {"city": "Nowhere"}],'
+            ' "work_locations": {"Company": {"city": "Markham"}},'
+            ' "language_set": ["en", "fr"], "started": "2013-05-02"}',
+            Developer)
+        self.assertEqual('Toronto', developer.address.city)
+        self.assertEqual('Nowhere', developer.safe_houses[1].city)
+        self.assertEqual(None, developer.safe_houses[1].province)
+        self.assertEqual('Markham', developer.work_locations['Company'].city)
+        self.assertEqual(set(['en', 'fr']), developer.language_set)
+        self.assertEqual(datetime.date(2013, 5, 2), developer.started)
+        self.assertTrue(codegen.decoder_source(Developer))
+        self.assertTrue(codegen.decoder_source(Address))
+
+    def test_missing_and_mismatching_attributes(self):
+        developer = self.assertSameAsGeneric(
+            '{"name": ["x"], "address": "Toronto", "safe_houses": {"a": 1},'
+            ' "work_locations": [1], "language_set": 1, "started": 2}',
+            Developer)
+        self.assertEqual(['x'], developer.name)
+        self.assertEqual(None, developer.address)
+        self.assertEqual(None, developer.title)
+        self.assertSameAsGeneric('{"safe_houses": [1, null, []]}', Developer)
+        self.assertSameAsGeneric('{}', Developer)
+        self.assertEqual(None, jsonstruct.decode('[]', Developer,
+                                                 codegen=True))
+
+    def test_tagged_input_uses_generic_path(self):
+        developer = self.assertSameAsGeneric(
+            '{"address": {"city": "Toronto"},'
+            ' "safe_houses": [{"py/id": 1}, {"city": "Markham"}]}',
+            Developer)
+        self.assertTrue(developer.safe_houses[0] is developer.address)
+
+    def test_cyclic_prototypes(self):
+        node = self.assertSameAsGeneric(
+            '{"name": "root", "children": [{"name": "leaf",'
+            ' "parent": {"py/id": 0}}]}', Node)
+        self.assertTrue(node.children[0].parent is node)
+        self.assertEqual(None, node.parent)
+
+    def test_cyclic_decoders_published_together(self):
+        published = []
+
+        class RecordingCache(codegen.DecoderCache):
+            def _decoder_source(self, cls, name):
+                source = codegen.DecoderCache._decoder_source(self, cls,
+                                                              name)
+                published.append((cls, self._decoders.get(Leaf)))
+                return source
+
+        cache = RecordingCache()
+        decoder = cache.get(Tree)
+        # the decoder of Leaf calls the one of Tree, not defined yet
+        self.assertEqual([(Leaf, None), (Tree, None)], published)
+        self.assertTrue(callable(decoder))
+        self.assertTrue(callable(cache.get(Leaf)))
+
+    def test_custom_setattr(self):
+        doubling = self.assertSameAsGeneric('{"x": 2}', Doubling)
+        self.assertEqual(4, doubling.x)
+        self.assertTrue('setattr' in codegen.decoder_source(Doubling))
+
+    def test_handler_registered_later(self):
+        class Flag(object):
+            value = False
+
+        class Settings(object):
+            flag = Flag()
+
+        decoded = jsonstruct.decode('{"flag": {"value": true}}', Settings,
+                                    codegen=True)
+        self.assertTrue(decoded.flag.value)
+
+        class FlagHandler(jsonstruct.handlers.BaseHandler):
+            def flatten(self, obj, data):
+                return obj.value
+
+            def restore_typed(self, obj, cls_def):
+                flag = Flag()
+                flag.value = obj
+                return flag
+
+        FlagHandler.handles(Flag)
+        try:
+            decoded = jsonstruct.decode('{"flag": true}', Settings,
+                                        codegen=True)
+            self.assertTrue(decoded.flag.value)
+        finally:
+            del jsonstruct.handlers.BaseHandler._registry[Flag]
+            jsonstruct.handlers._resolved.clear()
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(CodegenEncoderTestCase))
+    suite.addTest(unittest.makeSuite(CodegenDecoderTestCase))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
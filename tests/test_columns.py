@@ -0,0 +1,148 @@
+import array
+import unittest
+
+from six import StringIO
+
+import jsonstruct
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class Address(object):
+    city = ""
+    province = ""
+    floor = 0
+    latitude = 0.0
+
+
+class Office(object):
+    name = ""
+    address = Address()
+    phones = [""]
+
+
+ROWS = ('[{"city": "Toronto", "province": "Ontario", "floor": 3,'
+        ' "latitude": 43.7},'
+        ' {"city": "Markham", "floor": 12, "latitude": 43.9}]')
+
+
+class DecodeColumnsTestCase(unittest.TestCase):
+    def test_columns(self):
+        columns = jsonstruct.decode_columns(ROWS, Address)
+        self.assertEqual(['city', 'floor', 'latitude', 'province'],
+                         sorted(columns))
+        self.assertEqual(['Toronto', 'Markham'], columns['city'])
+        self.assertEqual(['Ontario', None], columns['province'])
+        self.assertEqual(array.array('l', [3, 12]), columns['floor'])
+        self.assertEqual(array.array('d', [43.7, 43.9]), columns['latitude'])
+
+    def test_file(self):
+        columns = jsonstruct.decode_columns(StringIO(ROWS), Address)
+        self.assertEqual(array.array('l', [3, 12]), columns['floor'])
+
+    def test_numeric_column_with_missing_value(self):
+        columns = jsonstruct.decode_columns('[{"floor": 1}, {}]', Address)
+        self.assertEqual([1, None], columns['floor'])
+
+    def test_nested_values_are_restored(self):
+        columns = jsonstruct.decode_columns(
+            '[{"name": "HQ", "address": {"city": "Toronto"},'
+            ' "phones": ["1", "2"]}, 5]', Office)
+        self.assertEqual(['HQ', None], columns['name'])
+        self.assertEqual(Address, type(columns['address'][0]))
+        self.assertEqual('Toronto', columns['address'][0].city)
+        self.assertEqual(None, columns['address'][1])
+        self.assertEqual([['1', '2'], None], columns['phones'])
+
+    def test_numpy(self):
+        if numpy is None:
+            self.skipTest('numpy is not installed')
+        columns = jsonstruct.decode_columns(ROWS, Address, numpy=True)
+        self.assertTrue(isinstance(columns['floor'], numpy.ndarray))
+        self.assertEqual(numpy.dtype('l'), columns['floor'].dtype)
+        self.assertTrue(isinstance(columns['latitude'], numpy.ndarray))
+        self.assertEqual(numpy.dtype('d'), columns['latitude'].dtype)
+        self.assertEqual([3, 12], columns['floor'].tolist())
+        self.assertEqual([43.7, 43.9], columns['latitude'].tolist())
+        self.assertEqual(['Toronto', 'Markham'], columns['city'])
+
+    def test_empty(self):
+        columns = jsonstruct.decode_columns('[]', Address)
+        self.assertEqual(array.array('l'), columns['floor'])
+        self.assertEqual([], columns['city'])
+
+    def test_not_an_array(self):
+        self.assertRaises(ValueError, jsonstruct.decode_columns, '{}',
+                          Address)
+
+
+class EncodeColumnsTestCase(unittest.TestCase):
+    def test_matches_encode(self):
+        columns = {'city': ['Toronto', u'Montr\xe9al', None],
+                   'province': ['Ontario', 'Quebec', 'Nunavut'],
+                   'floor': [3, 2 ** 40, -1],
+                   'latitude': [43.7, 45.5, float('nan')]}
+        rows = []
+        for i in range(3):
+            address = Address()
+            for k, column in columns.items():
+                setattr(address, k, column[i])
+            rows.append(address)
+        decode = jsonstruct.decode
+        self.assertEqual(repr(decode(jsonstruct.encode(rows))),
+                         repr(decode(jsonstruct.encode_columns(columns))))
+        self.assertEqual(
+            repr(decode(jsonstruct.encode(rows, is_filter_none_attr=False))),
+            repr(decode(jsonstruct.encode_columns(
+                columns, is_filter_none_attr=False))))
+
+    def test_cls_defines_keys(self):
+        encoded = jsonstruct.encode_columns({'city': ['a'], 'other': [1]},
+                                            cls=Address,
+                                            is_filter_none_attr=False)
+        self.assertEqual('[{"city": "a", "floor": null, "latitude": null,'
+                         ' "province": null}]', encoded)
+
+    def test_array_and_nested_values(self):
+        encoded = jsonstruct.encode_columns(
+            {'floor': array.array('l', [1, 2]),
+             'flag': [True, False],
+             'address': [Address(), None],
+             'phones': [['1'], []]})
+        self.assertEqual(
+            '[{"address": {}, "flag": true, "floor": 1, "phones": ["1"]},'
+            ' {"flag": false, "floor": 2, "phones": []}]', encoded)
+
+    def test_round_trip(self):
+        columns = jsonstruct.decode_columns(ROWS, Address)
+        encoded = jsonstruct.encode_columns(columns)
+        self.assertEqual(columns, jsonstruct.decode_columns(encoded, Address))
+
+    def test_fp(self):
+        columns = {'n': list(range(5))}
+        for rows_per_write in (1, 2, 5, 10):
+            fp = StringIO()
+            self.assertEqual(None, jsonstruct.encode_columns(
+                columns, fp=fp, rows_per_write=rows_per_write))
+            self.assertEqual(jsonstruct.encode_columns(columns),
+                             fp.getvalue())
+        fp = StringIO()
+        jsonstruct.encode_columns({'n': []}, fp=fp)
+        self.assertEqual('[]', fp.getvalue())
+
+    def test_length_mismatch(self):
+        self.assertRaises(ValueError, jsonstruct.encode_columns,
+                          {'a': [1], 'b': [1, 2]})
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(DecodeColumnsTestCase))
+    suite.addTest(unittest.makeSuite(EncodeColumnsTestCase))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
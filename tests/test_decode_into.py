@@ -0,0 +1,91 @@
+import unittest
+
+import jsonstruct
+
+from samples import Address, Developer, make_developer
+
+
+class Inbox(object):
+    items = []
+    labels = set()
+
+
+class DecodeIntoTestCase(unittest.TestCase):
+    def test_only_present_attributes(self):
+        d = make_developer()
+        jsonstruct.decode_into(d, '{"title": "Lead"}')
+        self.assertEqual('Lead', d.title)
+        self.assertEqual('Bob', d.name)
+        self.assertEqual('Toronto', d.address.city)
+
+    def test_nested_identity(self):
+        d = make_developer()
+        address = d.address
+        houses = d.safe_houses
+        first = d.safe_houses[0]
+        locations = d.work_locations
+        company = d.work_locations['Company']
+        jsonstruct.decode_into(d, '{"address": {"city": "Ottawa"},'
+                               ' "safe_houses": [{"city": "Cave"}],'
+                               ' "work_locations": {"Company": {"city": "X"},'
+                               ' "Home": {"city": "Y"}},'
+                               ' "language_set": ["fr"]}')
+        self.assertTrue(d.address is address)
+        self.assertEqual('Ottawa', address.city)
+        self.assertEqual('Ontario', address.province)
+        self.assertTrue(d.safe_houses is houses)
+        self.assertEqual(1, len(houses))
+        self.assertTrue(houses[0] is first)
+        self.assertEqual('Cave', first.city)
+        self.assertTrue(d.work_locations is locations)
+        self.assertTrue(locations['Company'] is company)
+        self.assertEqual('X', company.city)
+        self.assertEqual('Y', locations['Home'].city)
+        self.assertEqual(set(['fr']), d.language_set)
+
+    def test_undeclared_and_empty_containers_keep_identity(self):
+        inbox = Inbox()
+        items = inbox.items = [1]
+        labels = inbox.labels = set(['a'])
+        tags = inbox.tags = ['x']
+        options = inbox.options = {'x': 1}
+        jsonstruct.decode_into(inbox, '{"items": [2, 3], "labels": ["b"],'
+                               ' "tags": ["y"], "options": {"y": 2}}')
+        self.assertTrue(inbox.items is items)
+        self.assertEqual([2, 3], items)
+        self.assertTrue(inbox.labels is labels)
+        self.assertEqual(set(['b']), labels)
+        self.assertTrue(inbox.tags is tags)
+        self.assertEqual(['y'], tags)
+        self.assertTrue(inbox.options is options)
+        self.assertEqual({'y': 2}, options)
+        self.assertEqual([], Inbox.items)
+
+    def test_list_grows(self):
+        d = make_developer()
+        jsonstruct.decode_into(d, '{"safe_houses": [{}, {}, {"city": "C"}]}')
+        self.assertEqual(3, len(d.safe_houses))
+        self.assertEqual('Secret', d.safe_houses[0].city)
+        self.assertEqual(Address, type(d.safe_houses[2]))
+        self.assertEqual('C', d.safe_houses[2].city)
+
+    def test_prototypes_are_not_updated(self):
+        d = Developer()
+        jsonstruct.decode_into(d, '{"address": {"city": "Ottawa"}}')
+        self.assertEqual('Ottawa', d.address.city)
+        self.assertEqual('', Developer.address.city)
+        self.assertFalse(d.address is Developer.address)
+
+    def test_type_mismatch(self):
+        d = make_developer()
+        jsonstruct.decode_into(d, '{"address": "nowhere"}')
+        self.assertEqual(None, d.address)
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(DecodeIntoTestCase))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
@@ -0,0 +1,137 @@
+import gc
+import sys
+import threading
+import unittest
+import weakref
+
+import jsonstruct
+from jsonstruct.fragments import FragmentCache
+
+from samples import Address, new_address
+
+
+class Person(object):
+    name = ""
+    address = Address()
+
+    def __init__(self, name=None, address=None):
+        self.name = name
+        self.address = address
+
+
+class FragmentCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cache = FragmentCache(maxsize=2)
+        self.cache.register(Address)
+
+    def encode(self, obj, **kwargs):
+        return jsonstruct.encode(obj, fragment_cache=self.cache, **kwargs)
+
+    def test_hit(self):
+        home = new_address('Toronto', 'Ontario')
+        first = self.encode(Person('Bob', home))
+        second = self.encode(Person('Alice', home))
+        self.assertEqual(first.replace('Bob', 'Alice'), second)
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 1)
+
+    def test_uncached_class(self):
+        self.encode(Person('Bob'))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_filter_none_is_part_of_key(self):
+        home = new_address('Toronto')
+        self.assertEqual({'city': 'Toronto'},
+                         jsonstruct.decode(self.encode(home)))
+        self.assertEqual({'city': 'Toronto', 'province': None},
+                         jsonstruct.decode(self.encode(
+                             home, is_filter_none_attr=False)))
+
+    def test_invalidate(self):
+        home = new_address('Toronto', 'Ontario')
+        self.encode(home)
+        home.city = 'Markham'
+        self.assertTrue('Toronto' in self.encode(home))
+        self.cache.invalidate(home)
+        self.assertTrue('Markham' in self.encode(home))
+
+    def test_lru_eviction(self):
+        a, b, c = new_address('a'), new_address('b'), new_address('c')
+        self.encode([a, b])
+        self.encode(a)
+        self.encode(c)
+        self.assertEqual(self.cache.evictions, 1)
+        self.assertTrue(self.cache.get(a, True) is not None)
+        self.assertTrue(self.cache.get(b, True) is None)
+
+    def test_marked_object(self):
+        person = Person('Bob')
+        self.cache.mark(person)
+        self.encode(person)
+        self.encode(person)
+        self.assertEqual(self.cache.hits, 1)
+        self.cache.unmark(person)
+        self.assertFalse(self.cache.is_cacheable(person))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_marked_object_not_kept_alive(self):
+        person = Person('Bob')
+        ref = weakref.ref(person)
+        self.cache.mark(person)
+        del person
+        gc.collect()
+        self.assertTrue(ref() is None)
+
+    def test_marked_block(self):
+        point = {'x': 1}
+        try:
+            with self.cache.marked(point):
+                self.assertTrue(self.cache.is_cacheable(point))
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertFalse(self.cache.is_cacheable(point))
+
+    def test_not_used_with_max_depth(self):
+        self.encode(new_address('Toronto'), max_depth=3)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_threads(self):
+        cache = FragmentCache(maxsize=8)
+        cache.register(Address)
+        addresses = [new_address('city %d' % i) for i in range(32)]
+        errors = []
+
+        def run():
+            try:
+                for i in range(200):
+                    address = addresses[i % len(addresses)]
+                    if cache.get(address, True) is None:
+                        cache.put(address, True, {'city': address.city})
+            except Exception as e:
+                errors.append(e)
+
+        interval = sys.getcheckinterval()
+        # switch threads often to provoke interleavings
+        sys.setcheckinterval(1)
+        try:
+            threads = [threading.Thread(target=run) for i in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setcheckinterval(interval)
+        self.assertEqual([], errors)
+        self.assertTrue(len(cache) <= 8)
+        stats = cache.stats()
+        self.assertEqual(8 * 200, stats['hits'] + stats['misses'])
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(FragmentCacheTestCase))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
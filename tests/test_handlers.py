@@ -6,9 +6,12 @@
 # This software is licensed as described in the file COPYING, which
 # you should have received as part of this distribution.
 
+import collections
+import datetime
 import unittest
 
 import jsonstruct
+from jsonstruct import handlers
 
 
 class CustomObject(object):
@@ -44,9 +47,169 @@ class HandlerTests(unittest.TestCase):
         assert new_subject['a'] is new_subject['b']
         assert new_subject['b'] is new_subject['c']
 
+
+class Timestamp(datetime.datetime):
+    "A datetime subclass without a handler of its own"
+
+
+class Event(object):
+    at = Timestamp(1970, 1, 1)
+
+
+class CustomChild(CustomObject):
+    pass
+
+
+class CountingHandler(jsonstruct.handlers.BaseHandler):
+    instances = 0
+
+    def __init__(self, base):
+        super(CountingHandler, self).__init__(base)
+        CountingHandler.instances += 1
+
+    def flatten(self, obj, data):
+        return 'counted'
+
+
+class Late(object):
+    pass
+
+
+class Config(collections.OrderedDict):
+    "An OrderedDict subclass, flattened as a dict"
+
+
+class HandlerLookupTests(unittest.TestCase):
+    def test_subclass_resolves_to_base_handler(self):
+        self.assertTrue(handlers.get(Timestamp) is
+                        handlers.get(datetime.datetime))
+        self.assertTrue(handlers.get(CustomChild) is NullHandler)
+
+    def test_subclass_typed_decode(self):
+        event = Event()
+        event.at = Timestamp(2013, 5, 1, 12, 30)
+        decoded = jsonstruct.decode(jsonstruct.encode(event, iso8601=True),
+                                    Event)
+        self.assertTrue(type(decoded.at) is Timestamp)
+        self.assertEqual(event.at, decoded.at)
+
+    def test_ordered_dict_subclass_is_a_dict(self):
+        self.assertTrue(handlers.get(Config) is None)
+        config = Config([('a', 1)])
+        self.assertEqual('{"a": 1}', jsonstruct.encode(config))
+        self.assertEqual('{"x": {"a": 1}}', jsonstruct.encode({'x': config}))
+        # restored like any class without prototypes, as before
+        self.assertEqual(Config, type(jsonstruct.decode('{"a": 1}', Config)))
+
+    def test_miss_is_invalidated_by_registration(self):
+        self.assertTrue(handlers.get(Late) is None)
+        CountingHandler.handles(Late)
+        try:
+            self.assertTrue(handlers.get(Late) is CountingHandler)
+        finally:
+            del handlers.BaseHandler._registry[Late]
+            handlers._resolved.clear()
+
+    def test_one_handler_per_pickler(self):
+        CountingHandler.handles(Late)
+        try:
+            CountingHandler.instances = 0
+            self.assertEqual('["counted", "counted", "counted"]',
+                             jsonstruct.encode([Late(), Late(), Late()]))
+            self.assertEqual(1, CountingHandler.instances)
+        finally:
+            del handlers.BaseHandler._registry[Late]
+            handlers._resolved.clear()
+
+
+class Point(object):
+    def __init__(self, x=0, y=0):
+        self.x, self.y = x, y
+
+
+class PointHandler(jsonstruct.handlers.BaseHandler):
+    batches = []
+
+    def flatten(self, obj, data):
+        return [obj.x, obj.y]
+
+    def flatten_many(self, objs):
+        PointHandler.batches.append(len(objs))
+        return [[obj.x, obj.y] for obj in objs]
+
+    def restore_typed(self, obj, cls_def):
+        return Point(*obj)
+
+    def restore_many(self, objs, cls_def):
+        PointHandler.batches.append(len(objs))
+        return [Point(*obj) for obj in objs]
+
+
+class Path(object):
+    points = [Point()]
+
+
+class Schedule(object):
+    stamps = [datetime.datetime(1970, 1, 1)]
+    durations = [datetime.timedelta(0)]
+
+
+class BatchHandlerTests(unittest.TestCase):
+    def setUp(self):
+        PointHandler.handles(Point)
+        PointHandler.batches = []
+
+    def tearDown(self):
+        del handlers.BaseHandler._registry[Point]
+        handlers._resolved.clear()
+
+    def test_homogeneous_list(self):
+        path = Path()
+        path.points = [Point(1, 2), Point(3, 4)]
+        encoded = jsonstruct.encode(path)
+        self.assertEqual('{"points": [[1, 2], [3, 4]]}', encoded)
+        decoded = jsonstruct.decode(encoded, Path)
+        self.assertEqual([(1, 2), (3, 4)],
+                         [(p.x, p.y) for p in decoded.points])
+        self.assertEqual([2, 2], PointHandler.batches)
+
+    def test_mixed_list(self):
+        encoded = jsonstruct.encode([Point(1, 2), 'a', Point(3, 4)])
+        self.assertEqual('[[1, 2], "a", [3, 4]]', encoded)
+        self.assertEqual([], PointHandler.batches)
+
+    def test_max_depth(self):
+        encoded = jsonstruct.encode([Point()], max_depth=1)
+        self.assertTrue('Point object' in encoded)
+        self.assertEqual([], PointHandler.batches)
+
+    def test_unpicklable_not_batched(self):
+        jsonstruct.Pickler().flatten([Point(), Point()])
+        self.assertEqual([], PointHandler.batches)
+
+    def test_datetimes(self):
+        schedule = Schedule()
+        schedule.stamps = [datetime.datetime(2013, 5, i) for i in (1, 2, 3)]
+        schedule.durations = [datetime.timedelta(minutes=i)
+                              for i in (1, 2)]
+        for iso8601 in (False, True):
+            encoded = jsonstruct.encode(schedule, iso8601=iso8601)
+            decoded = jsonstruct.decode(encoded, Schedule)
+            self.assertEqual(schedule.stamps, decoded.stamps)
+            self.assertEqual(schedule.durations, decoded.durations)
+
+    def test_datetimes_type_mismatch(self):
+        decoded = jsonstruct.decode('{"stamps": ["2013-05-01", 1, null]}',
+                                    Schedule)
+        self.assertEqual([datetime.datetime(2013, 5, 1), None, None],
+                         decoded.stamps)
+
+
 def suite():
     suite = unittest.TestSuite()
     suite.addTest(unittest.makeSuite(HandlerTests, 'test_references'))
+    suite.addTest(unittest.makeSuite(HandlerLookupTests))
+    suite.addTest(unittest.makeSuite(BatchHandlerTests))
     return suite
 
 if __name__ == '__main__':
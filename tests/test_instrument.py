@@ -0,0 +1,125 @@
+import unittest
+
+import jsonstruct
+from jsonstruct import instrument
+from jsonstruct.pickler import Pickler
+from jsonstruct.rawjson import RawJSON
+from jsonstruct.unpickler import Unpickler
+
+from samples import Address, Developer, new_developer
+
+
+class Envelope(object):
+    values = [0]
+    payload = RawJSON()
+
+
+def path(cls):
+    return '%s.%s' % (cls.__module__, cls.__name__)
+
+
+class InstrumentTestCase(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        instrument.enable(lambda op, stats: self.calls.append((op, stats)))
+
+    def tearDown(self):
+        instrument.disable()
+
+    def test_disabled_by_default(self):
+        instrument.disable()
+        self.assertEqual(None, jsonstruct.stats())
+        self.assertTrue(type(jsonstruct._unpickler(False)) is Unpickler)
+        jsonstruct.encode(new_developer())
+        self.assertTrue(all(type(j) is Pickler
+                            for j in jsonstruct._picklers.values()))
+        self.assertEqual([], self.calls)
+
+    def test_encode(self):
+        jsonstruct.encode(new_developer())
+        stats = jsonstruct.stats()
+        self.assertEqual({'encode': 1}, stats['calls'])
+        self.assertEqual(1, stats['flatten'][path(Developer)]['count'])
+        # without references, the shared addresses are flattened twice
+        self.assertEqual(4, stats['flatten'][path(Address)]['count'])
+        self.assertEqual(1, stats['handlers'][
+            'jsonstruct._handlers.DatetimeHandler'])
+        # Developer, safe_houses, Address
+        self.assertEqual(3, stats['max_depth'])
+        self.assertTrue(stats['backend_seconds'] > 0)
+        self.assertTrue(stats['traversal_seconds'] >=
+                        stats['flatten'][path(Developer)]['seconds'])
+
+    def test_decode(self):
+        encoded = jsonstruct.encode(new_developer())
+        jsonstruct.stats(reset=True)
+        developer = jsonstruct.decode(encoded, Developer)
+        self.assertEqual('city-0', developer.safe_houses[0].city)
+        stats = jsonstruct.stats()
+        self.assertEqual({'decode': 1}, stats['calls'])
+        self.assertEqual(1, stats['restore'][path(Developer)]['count'])
+        self.assertEqual(4, stats['restore'][path(Address)]['count'])
+        self.assertTrue(stats['max_depth'] >= 3)
+        self.assertTrue(stats['max_refs'] > 0)
+        self.assertEqual({}, stats['flatten'])
+
+    def test_decode_raw(self):
+        string = '{"values": %s, "payload": {"x": [1, 2]}}' % list(
+            range(10000))
+        envelope = jsonstruct.decode(string, Envelope)
+        self.assertEqual('{"x": [1, 2]}', envelope.payload.json)
+        stats = jsonstruct.stats()
+        self.assertEqual({'decode': 1}, stats['calls'])
+        # the values list is parsed by the backend within restore_raw()
+        self.assertTrue(stats['backend_seconds'] > 0)
+        self.assertTrue(stats['traversal_seconds'] >= 0)
+
+    def test_totals_and_reset(self):
+        for i in range(3):
+            jsonstruct.decode(jsonstruct.encode(new_developer()), Developer)
+        stats = jsonstruct.stats(reset=True)
+        self.assertEqual({'encode': 3, 'decode': 3}, stats['calls'])
+        self.assertEqual(12, stats['flatten'][path(Address)]['count'])
+        self.assertEqual({}, jsonstruct.stats()['calls'])
+
+    def test_callback(self):
+        jsonstruct.encode(new_developer())
+        jsonstruct.encode(Address())
+        self.assertEqual(['encode', 'encode'], [op for op, s in self.calls])
+        first, second = [s for op, s in self.calls]
+        self.assertEqual(1, first['flatten'][path(Developer)]['count'])
+        self.assertEqual({path(Address)}, set(second['flatten']))
+
+    def test_direct_calls(self):
+        pickler = instrument.InstrumentedPickler()
+        flat = pickler.flatten(new_developer())
+        instrument.InstrumentedUnpickler().restore(flat)
+        self.assertEqual(['flatten', 'restore'],
+                         [op for op, s in self.calls])
+        self.assertEqual({'flatten': 1, 'restore': 1},
+                         jsonstruct.stats()['calls'])
+        # references of a picklable traversal
+        self.assertTrue(self.calls[0][1]['max_refs'] >= 3)
+
+    def test_codegen(self):
+        developer = new_developer()
+        encoded = jsonstruct.encode(developer, codegen=True)
+        jsonstruct.decode(encoded, Developer, codegen=True)
+        stats = jsonstruct.stats()
+        self.assertEqual({'encode': 1, 'decode': 1}, stats['calls'])
+        self.assertEqual(1, stats['restore'][path(Developer)]['count'])
+
+    def test_failed_call(self):
+        self.assertRaises(Exception, jsonstruct.decode, '{"city": ',
+                          Address)
+        jsonstruct.decode('{"city": "Toronto"}', Address)
+        self.assertEqual(['decode'], [op for op, s in self.calls])
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(InstrumentTestCase))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
@@ -0,0 +1,147 @@
+import datetime
+import unittest
+
+import jsonstruct
+from jsonstruct import isodate
+from jsonstruct.isodate import FixedOffset
+
+
+class Event(object):
+    name = ""
+    start = datetime.datetime(1970, 1, 1)
+    day = datetime.date(1970, 1, 1)
+    alarm = datetime.time(0, 0)
+    duration = datetime.timedelta(0)
+
+
+class IsoFormatTestCase(unittest.TestCase):
+    def test_round_trip(self):
+        values = [
+            datetime.datetime(2013, 5, 1, 12, 30, 15, 1),
+            datetime.datetime(1, 1, 1),
+            datetime.datetime(2013, 5, 1, tzinfo=FixedOffset(-330)),
+            datetime.date(2013, 12, 31),
+            datetime.time(23, 59, 59, 999999),
+            datetime.time(1, 2, tzinfo=isodate.UTC),
+            datetime.timedelta(0),
+            datetime.timedelta(-1, 5),
+            datetime.timedelta(400, 3601, 10),
+            datetime.timedelta(microseconds=-1),
+        ]
+        for value in values:
+            text = isodate.isoformat(value)
+            self.assertEqual(value, isodate.parse(text, type(value)), text)
+
+    def test_same_as_isoformat(self):
+        now = datetime.datetime(2013, 5, 1, 12, 30, 15, 250000,
+                                FixedOffset(90))
+        self.assertEqual(now.isoformat(), isodate.isoformat(now))
+        self.assertEqual(now.date().isoformat(),
+                         isodate.isoformat(now.date()))
+        self.assertEqual(now.time().isoformat(),
+                         isodate.isoformat(now.time()))
+
+    def test_parse_str(self):
+        values = [
+            datetime.datetime(2013, 5, 1, 12, 30, 15, 1),
+            datetime.datetime(2013, 5, 1, tzinfo=FixedOffset(60)),
+            datetime.time(7, 8, 9),
+            datetime.timedelta(3, 7, 9),
+            datetime.timedelta(-1),
+            datetime.timedelta(-2, 86399),
+        ]
+        for value in values:
+            self.assertEqual(value, isodate.parse(str(value), type(value)))
+
+    def test_parse_variants(self):
+        parse = isodate.parse
+        self.assertEqual(datetime.datetime(2013, 5, 1, 12, 30),
+                         parse('2013-05-01t12:30', datetime.datetime))
+        self.assertEqual(datetime.datetime(2013, 5, 1),
+                         parse('2013-05-01', datetime.datetime))
+        self.assertEqual(datetime.time(1, 2, 3, 123456),
+                         parse('01:02:03,1234567', datetime.time))
+        self.assertEqual(FixedOffset(-300),
+                         parse('01:02-05', datetime.time).tzinfo)
+        self.assertEqual(datetime.timedelta(weeks=1, hours=36),
+                         parse('P1WT36H', datetime.timedelta))
+        self.assertEqual(datetime.timedelta(hours=-1.5),
+                         parse('-PT1.5H', datetime.timedelta))
+
+    def test_invalid(self):
+        invalid = [
+            ('2013-5-01', datetime.date),
+            ('2013-05-01X10:00', datetime.datetime),
+            ('2013-05-01T10', datetime.datetime),
+            ('1a:00', datetime.time),
+            ('10:00+5', datetime.time),
+            ('25:00', datetime.time),
+            ('P', datetime.timedelta),
+            ('PT', datetime.timedelta),
+            ('P1', datetime.timedelta),
+            ('P1Y', datetime.timedelta),
+            ('1 week, 0:00:00', datetime.timedelta),
+            (5, datetime.date),
+        ]
+        for text, cls in invalid:
+            self.assertRaises(ValueError, isodate.parse, text, cls)
+
+
+class IsoDecodeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.event = Event()
+        self.event.name = 'launch'
+        self.event.start = datetime.datetime(2013, 5, 1, 12, 30, 15, 250000)
+        self.event.day = datetime.date(2013, 5, 1)
+        self.event.alarm = datetime.time(12, 0)
+        self.event.duration = datetime.timedelta(hours=1, minutes=30)
+
+    def assertEvent(self, decoded):
+        for k in ('name', 'start', 'day', 'alarm', 'duration'):
+            self.assertEqual(getattr(self.event, k), getattr(decoded, k))
+
+    def test_encode_iso8601(self):
+        encoded = jsonstruct.encode(self.event, iso8601=True)
+        self.assertTrue('"start": "2013-05-01T12:30:15.250000"' in encoded)
+        self.assertTrue('"duration": "PT1H30M"' in encoded)
+        self.assertEvent(jsonstruct.decode(encoded, Event))
+
+    def test_decode_default_output(self):
+        self.assertEvent(jsonstruct.decode(jsonstruct.encode(self.event),
+                                           Event))
+
+    def test_type_mismatch(self):
+        decoded = jsonstruct.decode(
+            '{"start": "yesterday", "day": 5, "duration": [1]}', Event)
+        self.assertEqual(None, decoded.start)
+        self.assertEqual(None, decoded.day)
+        self.assertEqual(None, decoded.duration)
+
+    def test_unpicklable_iso8601(self):
+        pickler = jsonstruct.Pickler(iso8601=True)
+        for value in (self.event.start, self.event.duration):
+            flattened = pickler.flatten(value)
+            self.assertEqual(isodate.isoformat(value), flattened['iso8601'])
+            restored = jsonstruct.Unpickler().restore(dict(flattened),
+                                                      type(value))
+            self.assertEqual(value, restored)
+
+    def test_fragment_cache_keeps_forms_apart(self):
+        cache = jsonstruct.FragmentCache()
+        cache.register(Event)
+        plain = jsonstruct.encode(self.event, fragment_cache=cache)
+        iso = jsonstruct.encode(self.event, fragment_cache=cache,
+                                iso8601=True)
+        self.assertTrue('12:30:15.250000' in plain)
+        self.assertFalse('T12:30' in plain)
+        self.assertTrue('T12:30' in iso)
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(IsoFormatTestCase))
+    suite.addTest(unittest.makeSuite(IsoDecodeTestCase))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
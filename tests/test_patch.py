@@ -0,0 +1,104 @@
+import unittest
+
+import jsonstruct
+from jsonstruct import RawJSON
+
+from samples import Developer, make_developer
+
+
+class PatchTestCase(unittest.TestCase):
+    def assertRoundTrip(self, old, new):
+        patch = jsonstruct.diff(old, new)
+        patched = jsonstruct.apply_patch(old, patch, Developer)
+        self.assertEqual(jsonstruct.encode(new), jsonstruct.encode(patched))
+        return patch
+
+    def test_unchanged(self):
+        self.assertEqual([], jsonstruct.diff(make_developer(),
+                                             make_developer()))
+
+    def test_nested_changes(self):
+        old = make_developer()
+        new = make_developer()
+        new.address.city = 'Markham'
+        new.safe_houses.pop()
+        new.scores.append(4)
+        patch = self.assertRoundTrip(old, new)
+        self.assertEqual(3, len(patch))
+
+    def test_attribute_becomes_none(self):
+        old = make_developer()
+        new = make_developer()
+        new.address.province = None
+        patch = self.assertRoundTrip(old, new)
+        self.assertEqual([{'op': 'remove', 'path': '/address/province'}],
+                         patch)
+
+    def test_old_is_untouched(self):
+        old = make_developer()
+        new = make_developer()
+        new.safe_houses[0].city = 'Moved'
+        jsonstruct.apply_patch(old, jsonstruct.diff(old, new))
+        self.assertEqual('Secret', old.safe_houses[0].city)
+
+    def test_bool_is_not_int(self):
+        patch = jsonstruct.diff({'a': 1}, {'a': True})
+        self.assertEqual([{'op': 'replace', 'path': '/a', 'value': True}],
+                         patch)
+
+    def test_pointer_escaping(self):
+        patch = jsonstruct.diff({'a/b': 1}, {'a/b': 2, '~': 3})
+        self.assertEqual(['/a~1b', '/~0'], [op['path'] for op in patch])
+        self.assertEqual({'a/b': 2, '~': 3},
+                         jsonstruct.apply_patch({'a/b': 1}, patch))
+
+    def test_move_copy_test(self):
+        doc = {'a': [1, 2], 'b': {}}
+        patch = [{'op': 'test', 'path': '/a/0', 'value': 1},
+                 {'op': 'move', 'from': '/a/0', 'path': '/b/x'},
+                 {'op': 'copy', 'from': '/b', 'path': '/c'}]
+        self.assertEqual({'a': [2], 'b': {'x': 1}, 'c': {'x': 1}},
+                         jsonstruct.apply_patch(doc, patch))
+        self.assertEqual({'a': [1, 2], 'b': {}}, doc)
+        self.assertRaises(ValueError, jsonstruct.apply_patch, doc,
+                          [{'op': 'test', 'path': '/a/0', 'value': 2}])
+
+    def test_copy_then_modify(self):
+        patch = [{'op': 'add', 'path': '/a/-', 'value': 3},
+                 {'op': 'copy', 'from': '/a', 'path': '/b'},
+                 {'op': 'add', 'path': '/b/-', 'value': 99}]
+        self.assertEqual({'a': [1, 2, 3], 'b': [1, 2, 3, 99]},
+                         jsonstruct.apply_patch({'a': [1, 2]}, patch))
+
+    def test_added_value_is_not_shared(self):
+        value = {'x': [1]}
+        patch = [{'op': 'add', 'path': '/a', 'value': value},
+                 {'op': 'add', 'path': '/a/x/-', 'value': 2},
+                 {'op': 'replace', 'path': '/b', 'value': value},
+                 {'op': 'add', 'path': '/b/y', 'value': 3}]
+        self.assertEqual({'a': {'x': [1, 2]}, 'b': {'x': [1], 'y': 3}},
+                         jsonstruct.apply_patch({'b': 0}, patch))
+        self.assertEqual({'x': [1]}, value)
+
+    def test_test_is_type_aware(self):
+        doc = {'a': True, 'b': [0]}
+        for path, value in (('/a', 1), ('/b', [False]), ('/a', None)):
+            self.assertRaises(ValueError, jsonstruct.apply_patch, doc,
+                              [{'op': 'test', 'path': path, 'value': value}])
+        self.assertEqual(doc, jsonstruct.apply_patch(
+            doc, [{'op': 'test', 'path': '/b', 'value': [0]}]))
+
+    def test_raw_json_compared_by_text(self):
+        self.assertEqual([], jsonstruct.diff([RawJSON('[1]')],
+                                             [RawJSON('[1]')]))
+        patch = jsonstruct.diff([RawJSON('[1]')], [RawJSON('[2]')])
+        self.assertTrue('"value": [2]' in jsonstruct.encode(patch))
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(PatchTestCase))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
@@ -0,0 +1,60 @@
+import gc
+import unittest
+import weakref
+
+import jsonstruct
+from jsonstruct.pickler import ObjDict
+
+
+class Node(object):
+    def __init__(self, name=None, children=None):
+        self.name = name
+        self.children = children
+
+
+class PlainDictsTestCase(unittest.TestCase):
+    def flatten(self, obj, **kwargs):
+        return jsonstruct.Pickler(unpicklable=False, plain_dicts=True,
+                                  **kwargs).flatten(obj)
+
+    def test_plain_dicts(self):
+        flat = self.flatten(Node('root', [Node('leaf')]))
+        self.assertTrue(type(flat) is dict)
+        self.assertTrue(type(flat['children'][0]) is dict)
+        self.assertEqual({'name': 'root', 'children': [{'name': 'leaf'}]},
+                         flat)
+
+    def test_default_obj_dicts(self):
+        flat = jsonstruct.Pickler(unpicklable=False).flatten(Node('root'))
+        self.assertTrue(type(flat) is ObjDict)
+
+    def test_instances_not_kept_alive(self):
+        node = Node('root')
+        ref = weakref.ref(node)
+        flat = self.flatten(node)
+        del node
+        gc.collect()
+        self.assertTrue(ref() is None)
+        self.assertEqual({'name': 'root'}, flat)
+
+    def test_instance_keys(self):
+        key = Node('key')
+        flat = self.flatten({key: 1})
+        flat_key = list(flat)[0]
+        self.assertTrue(type(flat_key) is ObjDict)
+        self.assertEqual({'name': 'key'}, dict(flat_key))
+        self.assertEqual(1, flat[flat_key])
+
+    def test_unpicklable_tags(self):
+        flat = jsonstruct.Pickler(plain_dicts=True).flatten(Node('root'))
+        self.assertTrue(type(flat) is dict)
+        self.assertTrue('py/object' in flat)
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(PlainDictsTestCase))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
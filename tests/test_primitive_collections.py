@@ -0,0 +1,113 @@
+import unittest
+
+import jsonstruct
+
+
+class Profile(object):
+    scores = [0]
+    languages = set([""])
+    point = (0.0,)
+    counts = {"": 0}
+    tags = []
+
+
+class PrimitiveDecodeTestCase(unittest.TestCase):
+    def test_typed_collections(self):
+        profile = jsonstruct.decode(
+            '{"scores": [3, 1, null], "languages": ["en", "fr", "en"],'
+            ' "point": [1.5, 2.5], "counts": {"a": 1, "b": null},'
+            ' "tags": ["x", true]}', Profile)
+        self.assertEqual([3, 1, None], profile.scores)
+        self.assertEqual(set(['en', 'fr']), profile.languages)
+        self.assertEqual((1.5, 2.5), profile.point)
+        self.assertEqual({'a': 1, 'b': None}, profile.counts)
+        self.assertEqual(['x', True], profile.tags)
+
+    def test_nested_values_still_restored(self):
+        profile = jsonstruct.decode('{"scores": [1, [2]], '
+                                    '"counts": {"a": {"py/tuple": [1]}}}',
+                                    Profile)
+        self.assertEqual([1, [2]], profile.scores)
+        self.assertEqual({'a': (1,)}, profile.counts)
+
+    def test_input_not_reused_by_default(self):
+        scores = [1, 2]
+        counts = {'a': 1}
+        unpickler = jsonstruct.Unpickler()
+        self.assertFalse(unpickler.restore(scores) is scores)
+        self.assertFalse(unpickler.restore(counts) is counts)
+
+    def test_reuse_containers(self):
+        scores = [1, 2]
+        counts = {'a': 1}
+        unpickler = jsonstruct.Unpickler(reuse_containers=True)
+        self.assertTrue(unpickler.restore(scores, [0]) is scores)
+        self.assertTrue(unpickler.restore(counts) is counts)
+        restored = unpickler.restore(scores, set([0]))
+        self.assertEqual(set([1, 2]), restored)
+
+    def test_type_mismatch(self):
+        profile = jsonstruct.decode('{"counts": [1, 2], "scores": {"a": 1}}',
+                                    Profile)
+        self.assertEqual([1, 2], profile.counts)
+        self.assertEqual({'a': 1}, profile.scores)
+
+
+class Series(object):
+    def __init__(self, name=None, values=None, labels=None):
+        self.name = name
+        self.values = values
+        self.labels = labels
+
+
+class PrimitiveEncodeTestCase(unittest.TestCase):
+    def test_collections(self):
+        series = Series('cpu', [1.5, 2, None], {'a': 'x', 'b': None})
+        self.assertEqual({'name': 'cpu', 'values': [1.5, 2, None],
+                          'labels': {'a': 'x', 'b': None}},
+                         jsonstruct.decode(jsonstruct.encode(series)))
+
+    def test_filter_none_attributes(self):
+        self.assertEqual('{"name": "cpu"}', jsonstruct.encode(Series('cpu')))
+        self.assertEqual({'name': 'cpu', 'values': None, 'labels': None},
+                         jsonstruct.decode(jsonstruct.encode(
+                             Series('cpu'), is_filter_none_attr=False)))
+
+    def test_not_reused_by_default(self):
+        values = [1, 2, 3]
+        labels = {'a': 1}
+        pickler = jsonstruct.Pickler(unpicklable=False)
+        self.assertFalse(pickler.flatten(values) is values)
+        self.assertFalse(pickler.flatten(labels) is labels)
+        self.assertEqual({'py/tuple': [1, 2]},
+                         jsonstruct.Pickler().flatten((1, 2)))
+
+    def test_reuse_containers(self):
+        values = [1, 2, 3]
+        labels = {'a': 1}
+        pickler = jsonstruct.Pickler(unpicklable=False,
+                                     reuse_containers=True)
+        self.assertTrue(pickler.flatten(values) is values)
+        self.assertTrue(pickler.flatten(labels) is labels)
+        self.assertEqual([1, 2], pickler.flatten((1, 2)))
+
+    def test_reserved_and_non_string_keys(self):
+        self.assertEqual({}, jsonstruct.Pickler().flatten({'py/object': 1}))
+        self.assertEqual({'1': 'a'},
+                         jsonstruct.decode(jsonstruct.encode({1: 'a'})))
+
+    def test_max_depth(self):
+        self.assertEqual('["1", "\'a\'"]',
+                         jsonstruct.encode([1, 'a'], max_depth=1))
+        self.assertEqual('{"a": "1"}',
+                         jsonstruct.encode({'a': 1}, max_depth=1))
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(PrimitiveDecodeTestCase))
+    suite.addTest(unittest.makeSuite(PrimitiveEncodeTestCase))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
@@ -0,0 +1,98 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from six import StringIO
+
+from jsonstruct import profile
+
+from samples import Address, Developer
+
+
+DEVELOPERS = ('[{"name": "Bob", "address": {"city": "Toronto"},'
+              ' "safe_houses": [{"city": "Ottawa"}, {"city": "Montreal"}]},'
+              ' {"name": "Alice", "address": {"city": "Markham"},'
+              ' "safe_houses": []}]')
+
+
+class ProfileTestCase(unittest.TestCase):
+    def test_decode(self):
+        report = profile.profile_decode(DEVELOPERS, [Developer()])
+        self.assertEqual(['backend', 'restore'],
+                         [phase['name'] for phase in report['phases']])
+        self.assertEqual(len(DEVELOPERS), report['sizes']['input'])
+        self.assertTrue(report['sizes']['tree'] > 0)
+        self.assertTrue(report['sizes']['graph'] > 0)
+        # the list, 2 developers, 4 addresses and 2 safe_houses lists
+        self.assertEqual(9, report['tables']['objs'])
+        self.assertTrue(report['tables']['bytes'] > 0)
+        self.assertTrue(all(phase['seconds'] >= 0
+                            for phase in report['phases']))
+
+    def test_counts(self):
+        string = '[%s]' % ', '.join(['{"city": "Toronto"}'] * 100)
+        report = profile.profile_decode(string, [Address()])
+        restore = report['phases'][1]
+        # the restored addresses are left allocated by the restore phase
+        self.assertTrue(restore['blocks'] >= 100)
+        if profile.tracemalloc is None:
+            self.assertEqual(('samples.Address', 100), restore['types'][0])
+            # the peak RSS is only measured on request
+            self.assertFalse('peak_kb' in restore)
+        text = profile.format_report(report)
+        self.assertTrue('\nrestore ' in text)
+
+    def test_encode(self):
+        developer = Developer()
+        developer.name = 'Bob'
+        report = profile.profile_encode(developer)
+        self.assertEqual(['flatten', 'backend'],
+                         [phase['name'] for phase in report['phases']])
+        self.assertEqual(len('{"name": "Bob"}'), report['sizes']['output'])
+
+    def test_deep_size(self):
+        address = Address()
+        address.city = 'Toronto'
+        # the address is counted once
+        self.assertEqual(
+            profile.deep_size([address, address]) -
+            sys.getsizeof([address, address]),
+            profile.deep_size([address]) - sys.getsizeof([address]))
+        self.assertTrue(profile.deep_size(address) >
+                        sys.getsizeof(address) + sys.getsizeof('Toronto'))
+
+    def test_format_report(self):
+        text = profile.format_report(
+            profile.profile_decode(DEVELOPERS, [Developer()]))
+        self.assertTrue(text.startswith('decode: '))
+        self.assertTrue('reference tables: 9 objects' in text)
+        self.assertTrue('\nrestore ' in text)
+
+    def test_main(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'developers.json')
+        stdout = sys.stdout
+        try:
+            with open(path, 'w') as f:
+                f.write('{"name": "Bob", "address": {"city": "Toronto"}}')
+            sys.stdout = StringIO()
+            self.assertEqual(0, profile.main(
+                ['--decode', path, '--cls', 'samples.Developer']))
+            self.assertTrue(sys.stdout.getvalue().startswith('decode: '))
+            sys.stdout = StringIO()
+            self.assertEqual(0, profile.main(['--encode', path]))
+            self.assertTrue(sys.stdout.getvalue().startswith('encode: '))
+        finally:
+            sys.stdout = stdout
+            shutil.rmtree(directory)
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(ProfileTestCase))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
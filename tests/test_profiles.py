@@ -0,0 +1,73 @@
+import unittest
+
+import jsonstruct
+from jsonstruct import EncoderProfile
+from jsonstruct.rawjson import RawJSON
+
+from samples import new_address
+
+
+class EncoderProfileTestCase(unittest.TestCase):
+    def test_separators_and_key_order(self):
+        compact = EncoderProfile('json', separators=(',', ':'),
+                                 sort_keys=True)
+        self.assertEqual('{"city":"Toronto"}',
+                         jsonstruct.encode(new_address('Toronto'),
+                                           profile=compact))
+        indented = EncoderProfile('json', indent=2, sort_keys=True,
+                                  is_filter_none_attr=False)
+        encoded = jsonstruct.encode(new_address('Toronto'), profile=indented)
+        self.assertTrue(encoded.startswith('{\n  "city": "Toronto"'))
+        self.assertTrue(encoded.endswith('\n  "province": null\n}'))
+
+    def test_global_options_do_not_apply(self):
+        profile = EncoderProfile('json', sort_keys=True)
+        args, kwargs = jsonstruct.json._encoder_options['json']
+        jsonstruct.set_encoder_options('json', indent=4)
+        try:
+            self.assertEqual('{"a": 1, "b": 2}',
+                             jsonstruct.encode({'b': 2, 'a': 1},
+                                               profile=profile))
+        finally:
+            jsonstruct.set_encoder_options('json', *args, **kwargs)
+
+    def test_max_depth(self):
+        profile = EncoderProfile(max_depth=1)
+        self.assertEqual({'city': "'Toronto'"}, jsonstruct.decode(
+            jsonstruct.encode(new_address('Toronto'), profile=profile)))
+
+    def test_raw_json(self):
+        profile = EncoderProfile('json', separators=(',', ':'))
+        self.assertEqual('[{"a": 1}]',
+                         jsonstruct.encode([RawJSON('{"a": 1}')],
+                                           profile=profile))
+
+    def test_immutable(self):
+        profile = EncoderProfile('json')
+        self.assertRaises(AttributeError, setattr, profile, 'indent', 2)
+        self.assertRaises(AttributeError, delattr, profile, 'indent')
+        self.assertEqual("EncoderProfile('json', indent=None, "
+                         "separators=None, sort_keys=False, "
+                         "is_filter_none_attr=True, max_depth=None)",
+                         repr(profile))
+
+    def test_unknown_backend(self):
+        self.assertRaises(AssertionError, EncoderProfile, 'nonexistent')
+
+    def test_other_backends(self):
+        jsonstruct.load_backend('os.path', 'split', 'join', AttributeError)
+        try:
+            profile = EncoderProfile('os.path')
+            self.assertEqual(('/hello', 'world'),
+                             profile.encode('/hello/world'))
+        finally:
+            jsonstruct.remove_backend('os.path')
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(EncoderProfileTestCase))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
@@ -0,0 +1,116 @@
+import unittest
+
+import jsonstruct
+from jsonstruct import RawJSON
+from jsonstruct.fragments import FragmentCache
+
+
+class Envelope(object):
+    topic = ""
+    body = None
+
+    def __init__(self, topic=None, body=None):
+        self.topic = topic
+        self.body = body
+
+
+class Message(object):
+    topic = ""
+    sender = ""
+    body = RawJSON()
+
+
+class Batch(object):
+    name = ""
+    messages = [Message()]
+    by_topic = {"": Message()}
+
+
+class RawJSONTestCase(unittest.TestCase):
+    def test_spliced_verbatim(self):
+        body = RawJSON('{"b":[1, 2],"a":"x"}')
+        encoded = jsonstruct.encode(Envelope('news', body))
+        self.assertTrue('"body": {"b":[1, 2],"a":"x"}' in encoded)
+        self.assertEqual({'topic': 'news', 'body': {'a': 'x', 'b': [1, 2]}},
+                         jsonstruct.decode(encoded))
+
+    def test_top_level(self):
+        self.assertEqual('[true]', jsonstruct.encode(RawJSON('[true]')))
+
+    def test_several_fragments(self):
+        encoded = jsonstruct.encode([RawJSON('1'), RawJSON('"two"'),
+                                     RawJSON('null')])
+        self.assertEqual('[1, "two", null]', encoded)
+
+    def test_validate(self):
+        self.assertEqual('[1]', RawJSON('[1]', validate=True).json)
+        self.assertRaises(ValueError, RawJSON, '[1', validate=True)
+
+    def test_dict_key(self):
+        self.assertRaises(TypeError, jsonstruct.encode, {RawJSON('1'): 2})
+        self.assertRaises(TypeError, jsonstruct.encode,
+                          Envelope('news', {RawJSON('[1]'): 'x'}))
+        # the failed calls leave no fragments behind
+        self.assertEqual('[1]', jsonstruct.encode([RawJSON('1')]))
+
+    def test_not_cached_in_fragments(self):
+        cache = FragmentCache()
+        cache.register(Envelope)
+        envelope = Envelope('news', RawJSON('{}'))
+        for i in range(2):
+            encoded = jsonstruct.encode(envelope, fragment_cache=cache)
+            self.assertTrue('"body": {}' in encoded)
+        self.assertEqual(len(cache), 0)
+
+
+class RawDecodeTestCase(unittest.TestCase):
+    def test_raw_attribute(self):
+        body = '{"items": [1, "]}", {"a": null}], "esc": "\\"\\u00e9"}'
+        msg = jsonstruct.decode(
+            '{"topic": "t", "body": %s, "sender": "bob"}' % body, Message)
+        self.assertEqual('t', msg.topic)
+        self.assertEqual('bob', msg.sender)
+        self.assertEqual(body, msg.body.json)
+        self.assertEqual([1, ']}', {'a': None}], msg.body.decode()['items'])
+
+    def test_missing_raw_attribute(self):
+        msg = jsonstruct.decode('{"topic": "t"}', Message)
+        self.assertEqual(None, msg.body)
+        self.assertEqual(None, msg.sender)
+
+    def test_forward_untouched(self):
+        text = '{"body": {"z": 1,  "a": [ ]}, "topic": "t"}'
+        msg = jsonstruct.decode(text, Message)
+        self.assertTrue('"body": {"z": 1,  "a": [ ]}' in
+                        jsonstruct.encode(msg))
+
+    def test_nested(self):
+        text = ('{"name": "b", "messages": [{"body": 1}, {"body": [2]}],'
+                ' "by_topic": {"x": {"topic": "x", "body": "s"}}}')
+        batch = jsonstruct.decode(text, Batch)
+        self.assertEqual('b', batch.name)
+        self.assertEqual(['1', '[2]'], [m.body.json for m in batch.messages])
+        self.assertEqual('"s"', batch.by_topic['x'].body.json)
+        self.assertEqual('x', batch.by_topic['x'].topic)
+
+    def test_type_mismatch(self):
+        self.assertEqual(None, jsonstruct.decode('[1]', Message))
+
+    def test_extra_data(self):
+        self.assertRaises(ValueError, jsonstruct.decode,
+                          '{"body": 1} x', Message)
+
+    def test_restore_from_decoded_value(self):
+        unpickler = jsonstruct.Unpickler()
+        msg = unpickler.restore({'topic': 't', 'body': [1]}, Message)
+        self.assertEqual([1], jsonstruct.decode(msg.body.json))
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(RawJSONTestCase))
+    suite.addTest(unittest.makeSuite(RawDecodeTestCase))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
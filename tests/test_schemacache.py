@@ -0,0 +1,140 @@
+import marshal
+import os
+import shutil
+import tempfile
+import unittest
+
+import jsonstruct
+from jsonstruct import codegen, schemacache
+
+from samples import Address, Developer
+
+
+class Account(object):
+    KIND = 'account'
+    owner = ""
+
+    @property
+    def label(self):
+        return self.KIND + ':' + self.owner
+
+
+class Node(object):
+    name = ""
+
+Node.children = [Node()]
+
+
+class SchemaCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'schemas')
+        self.clear_codegen()
+
+    def tearDown(self):
+        schemacache.use(None)
+        self.clear_codegen()
+        shutil.rmtree(self.directory)
+
+    def clear_codegen(self):
+        codegen.default_decoders.clear()
+        codegen.default_encoders.clear()
+
+    def restart(self):
+        """Simulates a fresh process using the same cache file."""
+        schemacache.use(None)
+        self.clear_codegen()
+        return schemacache.use(self.path)
+
+    def test_warmup(self):
+        cache = jsonstruct.warmup([Developer], self.path)
+        self.assertTrue(os.path.exists(self.path))
+        self.assertEqual(4, len(cache))
+        self.assertEqual(0, cache.hits)
+        self.assertTrue(codegen.decoder_source(Developer))
+        self.assertTrue(codegen.encoder_source(Address))
+
+        cache = self.restart()
+        jsonstruct.warmup([Developer])
+        self.assertEqual(4, cache.hits)
+        self.assertEqual(0, cache.misses)
+        developer = jsonstruct.decode(
+            '{"address": {"city": "Toronto"}}', Developer, codegen=True)
+        self.assertEqual('Toronto', developer.address.city)
+
+    def test_warmed_up_encoders_are_used(self):
+        jsonstruct.warmup([Developer, Account])
+        developer = jsonstruct.decode(
+            '{"name": "Bob", "address": {"city": "Toronto"}}', Developer)
+        account = Account()
+        account.owner = 'Bob'
+        pickler = jsonstruct.Pickler(unpicklable=False, plain_dicts=True)
+        for obj in (developer, account):
+            self.assertEqual(jsonstruct.encode(obj),
+                             jsonstruct.encode(obj, codegen=True))
+            # matches the instance, rather than falling back every time
+            encoder = codegen.default_encoders.get(obj, True, False)
+            self.assertEqual(jsonstruct.json.decode(jsonstruct.encode(obj)),
+                             encoder(obj, {}, pickler))
+
+    def test_warmup_without_path(self):
+        self.assertEqual(None, jsonstruct.warmup([Developer]))
+        self.assertTrue(codegen.decoder_source(Address))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_stale_entries_are_rebuilt(self):
+        jsonstruct.warmup([Address], self.path)
+        key = '%s.Address decoder' % Address.__module__
+        fingerprint = schemacache.SchemaCache(self.path)._entries[key][0]
+        Address.floor = 0
+        try:
+            cache = self.restart()
+            jsonstruct.warmup([Address])
+            self.assertEqual(0, cache.hits)
+            self.assertEqual(2, cache.misses)
+            address = jsonstruct.decode('{"floor": 3}', Address,
+                                        codegen=True)
+            self.assertEqual(3, address.floor)
+            self.assertNotEqual(fingerprint, schemacache.SchemaCache(
+                self.path)._entries[key][0])
+        finally:
+            del Address.floor
+
+    def test_unreadable_files_are_ignored(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not marshal data')
+        self.assertEqual(0, len(schemacache.SchemaCache(self.path)))
+        with open(self.path, 'wb') as f:
+            marshal.dump(((schemacache.FORMAT, b'????'), {'x': ('', None)}),
+                         f)
+        self.assertEqual(0, len(schemacache.SchemaCache(self.path)))
+        jsonstruct.warmup([Address], self.path)
+        self.assertEqual(2, len(schemacache.SchemaCache(self.path)))
+
+    def test_freeze(self):
+        import gc
+        frozen = jsonstruct.freeze([Developer], self.path)
+        try:
+            self.assertEqual(hasattr(gc, 'freeze'), frozen)
+        finally:
+            if frozen:
+                gc.unfreeze()
+        self.assertTrue(codegen.decoder_source(Developer))
+        self.assertTrue(os.path.exists(self.path))
+        self.assertTrue(Developer in jsonstruct.handlers._resolved)
+
+    def test_reachable_classes(self):
+        self.assertEqual([Developer, Address],
+                         schemacache.reachable_classes([Developer]))
+        self.assertEqual([Node], schemacache.reachable_classes([Node]))
+        self.assertEqual([Address],
+                         schemacache.reachable_classes([[Address()], int]))
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(SchemaCacheTestCase))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
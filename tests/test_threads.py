@@ -0,0 +1,159 @@
+import sys
+import threading
+import unittest
+
+import jsonstruct
+from jsonstruct import codegen, fragments
+from jsonstruct.rawjson import RawJSON
+
+from samples import Address, Developer, Leaf, Tree, new_address, new_developer
+
+
+def run_threads(target, count=8):
+    errors = []
+
+    def run(n):
+        try:
+            target(n)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(n,)) for n in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+class SharedInstancesTestCase(unittest.TestCase):
+    def test_shared_pickler_and_unpickler(self):
+        pickler = jsonstruct.Pickler(plain_dicts=True)
+        unpickler = jsonstruct.Unpickler()
+
+        def target(n):
+            for i in range(200):
+                developer = new_developer(n * 1000 + i)
+                flat = pickler.flatten(developer)
+                decoded = unpickler.restore(flat, Developer)
+                self.assertEqual(developer.name, decoded.name)
+                self.assertEqual(developer.address.city,
+                                 decoded.address.city)
+                self.assertTrue(decoded.safe_houses[0] is decoded.address)
+                self.assertEqual(developer.safe_houses[1].city,
+                                 decoded.safe_houses[1].city)
+
+        self.assertEqual([], run_threads(target))
+        self.assertEqual(-1, pickler._depth)
+        self.assertEqual({}, pickler._objs)
+        self.assertEqual(0, unpickler._depth)
+
+    def test_raw_json_is_kept_per_thread(self):
+        pickler = jsonstruct.Pickler(unpicklable=False)
+
+        def target(n):
+            for i in range(100):
+                text = '{"n": %d}' % (n * 1000 + i)
+                flat = pickler.flatten([RawJSON(text)])
+                encoded = jsonstruct.json.encode(flat)
+                self.assertEqual('[%s]' % text,
+                                 pickler.splice_raw_json(encoded))
+
+        self.assertEqual([], run_threads(target))
+
+    def test_encode_registered_fragment_class(self):
+        cache = fragments.default_cache
+        maxsize = cache.maxsize
+        interval = sys.getcheckinterval()
+        addresses = [new_address('city-%d' % i) for i in range(32)]
+        cache.register(Address)
+        cache.maxsize = 8
+        sys.setcheckinterval(1)
+
+        def target(n):
+            for i in range(200):
+                address = addresses[(n * 7 + i) % len(addresses)]
+                self.assertEqual(
+                    {'city': address.city},
+                    jsonstruct.json.decode(jsonstruct.encode(address)))
+
+        try:
+            self.assertEqual([], run_threads(target))
+            self.assertTrue(len(cache) <= 8)
+            self.assertTrue(cache.stats()['hits'] > 0)
+        finally:
+            sys.setcheckinterval(interval)
+            cache.maxsize = maxsize
+            cache.unregister(Address)
+
+    def test_decode_codegen_while_clearing(self):
+        interval = sys.getcheckinterval()
+        strings = ['{"name": "t", "leaves": [{"name": "a"}]}',
+                   '{"name": "a", "tree": {"name": "t"}}']
+        done = []
+        sys.setcheckinterval(1)
+
+        def target(n):
+            if n == 0:
+                for i in range(200):
+                    codegen.default_decoders.clear()
+                done.append(True)
+                return
+            while not done:
+                # the decoders of Tree and Leaf call each other
+                tree = jsonstruct.decode(strings[0], Tree, codegen=True)
+                self.assertEqual('a', tree.leaves[0].name)
+                leaf = jsonstruct.decode(strings[1], Leaf, codegen=True)
+                self.assertEqual('t', leaf.tree.name)
+
+        try:
+            self.assertEqual([], run_threads(target))
+        finally:
+            sys.setcheckinterval(interval)
+            codegen.default_decoders.clear()
+
+    def test_encode_while_switching_backends(self):
+        names = list(jsonstruct.json._backend_names)
+        options = jsonstruct.json._encoder_options['json']
+        done = []
+
+        def target(n):
+            if n == 0:
+                for i in range(200):
+                    jsonstruct.set_preferred_backend(
+                        'simplejson' if i % 2 and 'simplejson' in
+                        jsonstruct.json._backend_names else 'json')
+                    jsonstruct.set_encoder_options('json', sort_keys=True)
+                done.append(True)
+                return
+            while not done:
+                developer = new_developer(n)
+                self.assertEqual('city-%d' % n, jsonstruct.decode(
+                    jsonstruct.encode(developer), Developer).address.city)
+
+        try:
+            self.assertEqual([], run_threads(target, 4))
+        finally:
+            for name in reversed(names):
+                jsonstruct.set_preferred_backend(name)
+            jsonstruct.set_encoder_options('json', *options[0], **options[1])
+
+    def test_backend_snapshot(self):
+        backends = jsonstruct.json._backends
+        jsonstruct.load_backend('os.path', 'split', 'join', AttributeError)
+        try:
+            self.assertTrue(backends is not jsonstruct.json._backends)
+            self.assertEqual('os.path', jsonstruct.json._backends[-1][0])
+        finally:
+            jsonstruct.remove_backend('os.path')
+        self.assertFalse('os.path' in
+                         [b[0] for b in jsonstruct.json._backends])
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(SharedInstancesTestCase))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
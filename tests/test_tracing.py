@@ -0,0 +1,205 @@
+import unittest
+
+import jsonstruct
+from jsonstruct import instrument, tracing
+from jsonstruct.rawjson import RawJSON
+
+from samples import Address, new_address
+
+
+class Envelope(object):
+    kind = ""
+    payload = RawJSON()
+
+
+class RecordingTracer(tracing.Tracer):
+    def __init__(self):
+        self.events = []
+
+    def start(self, op, cls):
+        self.events.append(('start', op, cls))
+
+    def end(self, op, cls, bytes, duration, error=None):
+        if error is None:
+            self.events.append(('end', op, cls, bytes))
+        else:
+            self.events.append(('end', op, cls, bytes, type(error)))
+
+
+class TracingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tracer = RecordingTracer()
+        tracing.set_tracer(self.tracer)
+
+    def tearDown(self):
+        tracing.set_tracer(None)
+        instrument.disable()
+
+    def test_encode_spans(self):
+        encoded = jsonstruct.encode(new_address('Toronto'))
+        n = len(encoded)
+        self.assertEqual([
+            ('start', 'encode', Address),
+            ('start', 'encode.flatten', Address),
+            ('end', 'encode.flatten', Address, None),
+            ('start', 'encode.backend', Address),
+            ('end', 'encode.backend', Address, n),
+            ('end', 'encode', Address, n),
+        ], self.tracer.events)
+
+    def test_decode_spans(self):
+        string = '{"city": "Toronto"}'
+        address = jsonstruct.decode(string, Address)
+        self.assertEqual('Toronto', address.city)
+        n = len(string)
+        self.assertEqual([
+            ('start', 'decode', Address),
+            ('start', 'decode.backend', Address),
+            ('end', 'decode.backend', Address, n),
+            ('start', 'decode.restore', Address),
+            ('end', 'decode.restore', Address, n),
+            ('end', 'decode', Address, n),
+        ], self.tracer.events)
+
+    def test_decode_without_class(self):
+        jsonstruct.decode('[1, 2]')
+        self.assertEqual(('start', 'decode', None), self.tracer.events[0])
+        self.assertEqual(('end', 'decode', list, 6), self.tracer.events[-1])
+
+    def test_decode_raw(self):
+        string = '{"kind": "a", "payload": {"x": [1, 2]}}'
+        envelope = jsonstruct.decode(string, Envelope)
+        self.assertEqual('{"x": [1, 2]}', envelope.payload.json)
+        n = len(string)
+        # the value of kind is handed to the backend while restoring
+        self.assertEqual([
+            ('start', 'decode', Envelope),
+            ('start', 'decode.restore', Envelope),
+            ('start', 'decode.backend', Envelope),
+            ('end', 'decode.backend', Envelope, len('"a"')),
+            ('end', 'decode.restore', Envelope, n),
+            ('end', 'decode', Envelope, n),
+        ], self.tracer.events)
+
+    def test_failed_call(self):
+        string = '{"city": '
+        try:
+            jsonstruct.decode(string, Address)
+        except Exception as error:
+            pass
+        else:
+            self.fail('decoded %r' % string)
+        n = len(string)
+        self.assertEqual([('start', 'decode', Address),
+                          ('start', 'decode.backend', Address),
+                          ('end', 'decode.backend', Address, n, type(error)),
+                          ('end', 'decode', Address, n, type(error))],
+                         self.tracer.events)
+
+    def test_failed_encode(self):
+        class Broken(object):
+            pass
+
+        class BrokenHandler(jsonstruct.handlers.BaseHandler):
+            def flatten(self, obj, data):
+                raise RuntimeError('broken')
+
+        BrokenHandler.handles(Broken)
+        self.assertRaises(RuntimeError, jsonstruct.encode, Broken())
+        self.assertEqual([('start', 'encode', Broken),
+                          ('start', 'encode.flatten', Broken),
+                          ('end', 'encode.flatten', Broken, None,
+                           RuntimeError),
+                          ('end', 'encode', Broken, None, RuntimeError)],
+                         self.tracer.events)
+
+    def test_failed_raw_decode(self):
+        string = '{"kind": "a", "payload": {"x": [1, 2]}, "bad": }'
+        self.assertRaises(Exception, jsonstruct.decode, string, Envelope)
+        ends = [e for e in self.tracer.events if e[0] == 'end']
+        self.assertEqual(['decode.restore', 'decode'],
+                         [e[1] for e in ends[-2:]])
+        self.assertTrue(all(len(e) == 5 for e in ends[-2:]))
+
+    def test_slow_payload(self):
+        slow = []
+        tracing.set_tracer(self.tracer, slow_seconds=0,
+                           on_slow=lambda *args: slow.append(args))
+        encoded = jsonstruct.encode(new_address('Toronto'))
+        jsonstruct.decode(encoded, Address)
+        path = 'samples.Address'
+        self.assertEqual([('encode', path, len(encoded)),
+                          ('decode', path, len(encoded))],
+                         [args[:3] for args in slow])
+        self.assertTrue(all(args[3] >= 0 for args in slow))
+
+        del slow[:]
+        tracing.set_tracer(self.tracer, slow_seconds=60,
+                           on_slow=lambda *args: slow.append(args))
+        jsonstruct.encode(new_address('Toronto'))
+        self.assertEqual([], slow)
+
+    def test_slow_payload_alone(self):
+        slow = []
+        tracing.set_tracer(on_slow=lambda *args: slow.append(args),
+                           slow_seconds=0)
+        self.assertEqual(tracing.Tracer, type(tracing.active.tracer))
+        jsonstruct.encode([1])
+        self.assertEqual([('encode', '__builtin__.list', 3)],
+                         [args[:3] for args in slow])
+
+    def test_off(self):
+        tracing.set_tracer(None)
+        self.assertEqual(None, tracing.active)
+        jsonstruct.decode(jsonstruct.encode(new_address('Toronto')), Address)
+        self.assertEqual([], self.tracer.events)
+
+    def test_with_instrumentation(self):
+        instrument.enable()
+        jsonstruct.decode(jsonstruct.encode(new_address('Toronto')), Address)
+        self.assertEqual({'encode': 1, 'decode': 1},
+                         jsonstruct.stats()['calls'])
+        self.assertEqual(12, len(self.tracer.events))
+
+
+class CollectorTestCase(unittest.TestCase):
+    def tearDown(self):
+        tracing.set_tracer(None)
+
+    def test_summary(self):
+        collector = tracing.Collector()
+        tracing.set_tracer(collector)
+        for city in ('Toronto', 'Ottawa'):
+            jsonstruct.decode(jsonstruct.encode(new_address(city)), Address)
+        summary = collector.summary()
+        self.assertEqual(set(['encode', 'encode.flatten', 'encode.backend',
+                              'decode', 'decode.backend', 'decode.restore']),
+                         set(summary))
+        self.assertEqual(2, summary['decode']['count'])
+        self.assertEqual(0, summary['decode']['errors'])
+        self.assertEqual(0, summary['encode.flatten']['bytes'])
+        self.assertEqual(summary['encode']['bytes'],
+                         summary['decode']['bytes'])
+        self.assertTrue(summary['encode']['seconds'] >=
+                        summary['encode']['max_seconds'])
+        collector.clear()
+        self.assertEqual({}, collector.summary())
+
+    def test_limit(self):
+        collector = tracing.Collector(limit=3)
+        tracing.set_tracer(collector)
+        jsonstruct.encode(1)
+        jsonstruct.encode(2)
+        # the spans of the second call
+        self.assertEqual(['encode.flatten', 'encode.backend', 'encode'],
+                         [span.op for span in collector.spans])
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TracingTestCase))
+    suite.addTest(unittest.makeSuite(CollectorTestCase))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""Stress test of a Pickler and an Unpickler shared by a pool of threads,
+compared with creating them per call.
+
+Every round trip is checked: a mixup of the traversal state between
+threads shows up as a wrong value or a broken shared reference.
+
+    python tests/thread_benchmark.py [threads] [round trips per thread]
+"""
+from __future__ import print_function
+
+import sys
+import threading
+import time
+
+import jsonstruct
+
+from samples import Developer, new_developer
+
+
+def check(developer, decoded):
+    assert decoded.name == developer.name
+    assert decoded.address.city == developer.address.city
+    assert decoded.safe_houses[0] is decoded.address
+    assert decoded.work_locations['Company'] is decoded.safe_houses[1]
+    assert decoded.safe_houses[1].city == developer.safe_houses[1].city
+
+
+def shared(count, pickler=jsonstruct.Pickler(plain_dicts=True),
+           unpickler=jsonstruct.Unpickler()):
+    for i in range(count):
+        developer = new_developer(i)
+        flat = pickler.flatten(developer)
+        check(developer, unpickler.restore(flat, Developer))
+
+
+def per_call(count):
+    for i in range(count):
+        developer = new_developer(i)
+        flat = jsonstruct.Pickler(plain_dicts=True).flatten(developer)
+        check(developer, jsonstruct.Unpickler().restore(flat, Developer))
+
+
+def stress(func, threads, count):
+    errors = []
+
+    def run():
+        try:
+            func(count)
+        except Exception as e:
+            errors.append(e)
+
+    pool = [threading.Thread(target=run) for i in range(threads)]
+    start = time.time()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return time.time() - start, errors
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    # switch threads often to provoke interleavings
+    if hasattr(sys, 'setswitchinterval'):
+        sys.setswitchinterval(1e-6)
+    else:
+        sys.setcheckinterval(1)
+    print('%d threads x %d round trips' % (threads, count))
+    failed = False
+    for func in (per_call, shared):
+        seconds, errors = stress(func, threads, count)
+        failed = failed or bool(errors)
+        print('%-10s %8.1f ms  %8.0f round trips/s  %d errors' % (
+            func.__name__, seconds * 1000, threads * count / seconds,
+            len(errors)))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()